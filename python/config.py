@@ -20,6 +20,9 @@ DATA_DIR = PROJECT_ROOT / "data"
 RAW_DIR = DATA_DIR / "raw"
 PROCESSED_DIR = DATA_DIR / "processed"
 
+# Content-hashed stage cache (see src/cache.py)
+CACHE_DIR = DATA_DIR / "cache"
+
 # Output directories
 OUTPUT_DIR = PROJECT_ROOT / "outputs"
 TABLES_DIR = OUTPUT_DIR / "tables"
@@ -35,9 +38,35 @@ SURVEY_PATH = RAW_DIR / "score.dta"
 # CBS administrative indicators
 ADMIN_PATH = RAW_DIR / "indicators_buurt_wijk_gemeente.csv"
 
+# Parquet extract of the survey columns in use (see extract.load_survey_data;
+# None = always read the .dta file)
+SURVEY_CACHE_DIR = CACHE_DIR / "survey"
+
+# Parquet extract of the admin CSV (indicators as float32; None = always parse the CSV)
+ADMIN_CACHE_DIR = CACHE_DIR / "admin"
+
+# Integer-keyed buurt/wijk/gemeente name dictionaries, one per CBS vintage
+# (see src/geonames.py; None = build in memory on every run)
+GEO_NAMES_DIR = CACHE_DIR / "geonames"
+
+# Read survey files with more rows than this in chunks on worker processes
+# (pooled multi-wave files; None = read in one piece)
+SURVEY_CHUNK_ROWS = None
+
+# Out-of-core mode (run_pipeline.py --partitioned): survey rows read per
+# chunk, and the root of the Parquet partitions by gemeente_id and their
+# sufficient statistics (see src/partitioned.py)
+PARTITION_CHUNK_ROWS = 1_000_000
+PARTITIONED_DIR = DATA_DIR / "partitioned"
+
 # Output paths
 PROCESSED_DATA_PATH = PROCESSED_DIR / "analysis_ready.csv"
+CONTEXT_SCALER_PATH = PROCESSED_DIR / "context_scaler.json"
+# Per-buurt outcome sums for refitting buurt-level models (analyze.buurt_aggregates)
+BUURT_AGGREGATES_PATH = PROCESSED_DIR / "buurt_aggregates.csv"
 REGRESSION_TABLE_PATH = TABLES_DIR / "regression_table.html"
+SPEC_CURVE_PATH = TABLES_DIR / "spec_curve.parquet"
+H3_MARGINS_PATH = TABLES_DIR / "h3_marginal_effects.csv"
 
 # =============================================================================
 # CBS API Configuration
@@ -53,6 +82,47 @@ CBS_TABLE_ID = "84286NED"
 # Year filter for CBS data (Perioden column)
 CBS_YEAR = "2018"
 
+# CBS OData API root (point at a local server for offline runs)
+CBS_ODATA_URL = "https://opendata.cbs.nl/ODataApi/odata"
+
+# "Kerncijfers wijken en buurten" table per year (for longitudinal contexts)
+CBS_TABLES_BY_YEAR = {
+    "2013": "82339NED",
+    "2014": "82931NED",
+    "2015": "83220NED",
+    "2016": "83487NED",
+    "2017": "83765NED",
+    "2018": "84286NED",
+    "2019": "84583NED",
+    "2020": "84799NED",
+    "2021": "85039NED",
+    "2022": "85318NED",
+    "2023": "85618NED",
+}
+
+# Concurrent requests and raw-response cache of the CBS downloader
+CBS_MAX_CONCURRENCY = 4
+CBS_CACHE_DIR = CACHE_DIR / "cbs"
+
+# Indicators used from the CBS table: CBS column names -> standard names
+# (based on actual CBS 84286NED column names, 2018+)
+ADMIN_INDICATORS = {
+    "AantalInwoners_5": "pop_total",
+    "k_65JaarOfOuder_12": "pop_over_65",
+    "WestersTotaal_17": "pop_west",
+    "NietWestersTotaal_18": "pop_nonwest",
+    "Bevolkingsdichtheid_33": "pop_dens",
+    "GemiddeldeWoningwaarde_35": "avg_home_value",
+    "GemiddeldInkomenPerInkomensontvanger_68": "avg_inc_recip",
+    "GemiddeldInkomenPerInwoner_69": "avg_inc_pers",
+    "k_40PersonenMetLaagsteInkomen_70": "perc_low40_pers",
+    "k_20PersonenMetHoogsteInkomen_71": "perc_high20_pers",
+    "k_40HuishoudensMetLaagsteInkomen_73": "perc_low40_hh",
+    "k_20HuishoudensMetHoogsteInkomen_74": "perc_high20_hh",
+    "HuishoudensMetEenLaagInkomen_75": "perc_low_inc_hh",
+    "HuishoudensTot110VanSociaalMinimum_77": "perc_soc_min_hh",
+}
+
 # =============================================================================
 # Survey Configuration
 # =============================================================================
@@ -112,6 +182,10 @@ KEY_PREDICTOR = "b_perc_low40_hh"
 # Grouping variable for multilevel models
 GROUPING_VAR = "buurt_id"
 
+# Estimation engine for random-intercept models:
+# "closed_form" = sufficient-statistics REML (src/mixed.py), "statsmodels" = MixedLM
+MIXED_ENGINE = "closed_form"
+
 # Individual-level control variables
 INDIVIDUAL_CONTROLS = [
     "age",
@@ -141,8 +215,53 @@ INCLUDE_OCCUPATION = True
 # Minimum cluster size for multilevel models
 MIN_CLUSTER_SIZE = 2
 
+# Complete-case samples kept per data frame by src/samples.py (LRU)
+SAMPLE_CACHE_SIZE = 64
+
+# Context-variable standardization: weight respondents by the survey weight,
+# and compute means/SDs over "respondent"s or over "area"s (each buurt, wijk
+# or gemeente once)
+STANDARDIZE_WEIGHTED = False
+STANDARDIZE_LEVEL = "respondent"
+
 # VIF threshold for multicollinearity warning
 VIF_THRESHOLD = 5.0
 
+# Condition index above which a dimension signals a near-dependency
+# (Belsley, Kuh & Welsch 1980)
+CONDITION_INDEX_THRESHOLD = 30.0
+
 # Confidence level for intervals
 CONFIDENCE_LEVEL = 0.95
+
+# Moderator values at which marginal effects (simple slopes) are evaluated
+# for interaction curves and Johnson-Neyman regions (see src/margins.py)
+MARGINS_GRID_POINTS = 200
+
+# Bootstrap intervals for the ICC and key coefficient (0 = skip)
+BOOTSTRAP_REPLICATES = 0
+
+# Resampling scheme: "cluster" (draw whole buurten) or "parametric"
+BOOTSTRAP_METHOD = "cluster"
+
+# Root seed for the bootstrap (results do not depend on the worker count)
+BOOTSTRAP_SEED = 20170
+
+# =============================================================================
+# Pipeline Execution
+# =============================================================================
+
+# Skip stages whose inputs, code and settings are unchanged since the last run
+USE_STAGE_CACHE = True
+
+# Worker processes for independent pipeline stages (1 = sequential)
+PIPELINE_JOBS = 1
+
+# Worker processes for sensitivity specifications (None = all cores, 1 = sequential)
+SENSITIVITY_JOBS = None
+
+# Worker processes for bootstrap replicates (None = all cores, 1 = sequential)
+BOOTSTRAP_JOBS = None
+
+# Worker processes for chunked survey reading (None = all cores, 1 = sequential)
+SURVEY_READ_JOBS = None
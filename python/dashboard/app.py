@@ -363,9 +363,9 @@ with tab2:
 
     These models test whether effects operate at different geographic scales.
 
-    ⚠️ **Note**: Python's statsmodels uses buurt as primary grouping with
-    wijk/gemeente predictors as fixed effects. For true nested random effects,
-    see the R implementation.
+    **Note**: The Python models include random intercepts for buurt, wijk and
+    gemeente `(1|gemeente) + (1|wijk) + (1|buurt)`, fitted with the sparse
+    nested engine in `src/nested.py`.
     """)
 
 # =============================================================================
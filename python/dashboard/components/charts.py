@@ -718,6 +718,92 @@ def create_model_progression_chart(
     return fig
 
 
+def create_marginal_effects_plot(
+    effects: pd.DataFrame,
+    moderator: str,
+    title: str = "Neighborhood Effect by Individual Income",
+    subtitle: str = None,
+    height: int = 400
+) -> go.Figure:
+    """
+    Create an interaction plot: the focal effect across moderator values.
+
+    Parameters
+    ----------
+    effects : pd.DataFrame
+        MarginalEffects.to_frame() output (moderator column plus slope,
+        lower, upper and significant), e.g. h3_marginal_effects.csv
+    moderator : str
+        Name of the moderator column
+    title : str
+        Chart title
+    subtitle : str, optional
+        Chart subtitle
+    height : int
+        Chart height
+
+    Returns
+    -------
+    go.Figure
+        Plotly figure object
+    """
+    x = effects[moderator].tolist()
+    fig = go.Figure()
+
+    # Johnson-Neyman regions: shade runs of significant moderator values
+    significant = effects["significant"].astype(bool).to_numpy()
+    runs = np.flatnonzero(np.diff(np.r_[0, significant.astype(int), 0]))
+    for start, stop in zip(runs[::2], runs[1::2]):
+        fig.add_vrect(x0=x[start], x1=x[stop - 1], fillcolor=COLORS["tertiary"],
+                      opacity=0.1, line_width=0)
+
+    # CI band
+    fig.add_trace(go.Scatter(
+        x=x + x[::-1],
+        y=effects["upper"].tolist() + effects["lower"].tolist()[::-1],
+        fill='toself',
+        fillcolor='rgba(31, 119, 180, 0.2)',
+        line=dict(color='rgba(255,255,255,0)'),
+        name='95% CI',
+        hoverinfo='skip'
+    ))
+
+    # Slope line
+    fig.add_trace(go.Scatter(
+        x=x,
+        y=effects["slope"],
+        mode='lines+markers' if len(x) <= 10 else 'lines',
+        line=dict(color=COLORS["primary"], width=2),
+        name='Effect',
+        hovertemplate='%{x:.2f}: %{y:.3f}<extra></extra>'
+    ))
+
+    fig.add_hline(y=0, line_dash="dash", line_color=COLORS["quaternary"])
+
+    full_title = f"<b>{title}</b>"
+    if subtitle:
+        full_title += f"<br><span style='font-size:12px;color:gray'>{subtitle}</span>"
+
+    fig.update_layout(
+        title=dict(text=full_title, x=0.5, xanchor='center', font_size=CHART_CONFIG.get("title_font_size", 16)),
+        xaxis_title=get_label(moderator),
+        yaxis_title="Effect of neighborhood poverty",
+        height=height,
+        legend=dict(orientation="h", yanchor="bottom", y=-0.3, xanchor="center", x=0.5),
+        margin=dict(t=80, b=80, l=60, r=40),
+        annotations=[dict(
+            text="Shaded band: 95% CI. Green: moderator values where the effect is significant (Johnson-Neyman).",
+            xref="paper", yref="paper",
+            x=0, y=-0.22,
+            showarrow=False,
+            font=dict(size=10, color="gray"),
+            align="left"
+        )]
+    )
+
+    return fig
+
+
 def create_multi_level_comparison(
     estimates: Dict[str, float],
     title: str = "Key Predictor Effect by Geographic Level",
@@ -21,6 +21,8 @@ from utils.data_loader import (
     get_column_info,
     get_existing_figures,
     get_filtered_data,
+    load_geo_names,
+    load_context_scaler,
     is_demo_mode,
     get_demo_mode_message
 )
@@ -30,6 +32,7 @@ from components.charts import (
     create_boxplot_by_group
 )
 from utils.labels import get_label, VARIABLE_LABELS, FOOTNOTES
+from src.transform import geo_id_strings
 
 # =============================================================================
 # Page Configuration
@@ -89,10 +92,16 @@ with st.sidebar:
     st.header("Filters")
 
     # Municipality filter
-    gemeenten = sorted(df['gemeente_id'].dropna().unique().astype(str).tolist())
+    gemeenten = sorted(geo_id_strings(df['gemeente_id'].dropna().drop_duplicates(), 'gemeente_id').tolist())
+    gemeente_names = {}
+    geo_names = load_geo_names()
+    if geo_names is not None:
+        names = geo_names.lookup(pd.Series(gemeenten), 'gemeente')
+        gemeente_names = dict(zip(gemeenten, names.astype(object)))
     selected_gemeenten = st.multiselect(
         "Municipality (Gemeente)",
         options=gemeenten,
+        format_func=lambda code: f"{gemeente_names[code]} ({code})" if pd.notna(gemeente_names.get(code)) else code,
         default=[],
         help="Filter by municipality. Leave empty for all."
     )
@@ -122,6 +131,16 @@ with st.sidebar:
     else:
         selected_employment = None
 
+    # Units of the context variables
+    context_scaler = load_context_scaler()
+    raw_units = False
+    if context_scaler is not None:
+        raw_units = st.toggle(
+            "Context variables in original units",
+            value=False,
+            help="Undo the standardization of the CBS variables using the pipeline's saved means and SDs"
+        )
+
     # Apply filters
     st.divider()
     if st.button("Apply Filters", type="primary"):
@@ -135,6 +154,10 @@ filtered_df = get_filtered_data(
     employment_filter=selected_employment
 )
 
+# Administrative tabs show the context variables standardized or in raw units
+admin_df = context_scaler.inverse_transform(filtered_df) if raw_units else filtered_df
+units_note = "" if raw_units else " (standardized)"
+
 # Show filter status
 if selected_gemeenten or (education_range and (education_range[0] > df['education'].min() or education_range[1] < df['education'].max())):
     st.info(f"Showing {len(filtered_df):,} of {len(df):,} observations after filtering.")
@@ -354,11 +377,11 @@ with tab_buurt:
     col1, col2 = st.columns([2, 1])
 
     with col1:
-        if 'b_perc_low40_hh' in filtered_df.columns:
+        if 'b_perc_low40_hh' in admin_df.columns:
             fig = create_distribution_histogram(
-                filtered_df['b_perc_low40_hh'],
+                admin_df['b_perc_low40_hh'],
                 title="Distribution of Key Predictor",
-                xaxis_label=get_label("b_perc_low40_hh") + " (standardized)",
+                xaxis_label=get_label("b_perc_low40_hh") + units_note,
                 nbins=40,
                 source_note=FOOTNOTES.get("data_source")
             )
@@ -375,9 +398,9 @@ with tab_buurt:
         capturing neighborhood socioeconomic composition.
         """)
 
-        if 'b_perc_low40_hh' in filtered_df.columns:
+        if 'b_perc_low40_hh' in admin_df.columns:
             st.markdown("**Summary:**")
-            st.dataframe(filtered_df['b_perc_low40_hh'].describe().round(3))
+            st.dataframe(admin_df['b_perc_low40_hh'].describe().round(3))
 
     # Other buurt variables
     st.markdown("#### Other Buurt-level Variables")
@@ -392,7 +415,7 @@ with tab_buurt:
 
         if selected_buurt:
             st.dataframe(
-                filtered_df[selected_buurt].describe().T.round(3),
+                admin_df[selected_buurt].describe().T.round(3),
                 use_container_width=True
             )
 
@@ -407,27 +430,27 @@ with tab_wijk:
     **Wijk** (district) is an intermediate geographic level, aggregating multiple buurten.
     """)
 
-    if 'w_perc_low40_hh' in filtered_df.columns:
+    if 'w_perc_low40_hh' in admin_df.columns:
         col1, col2 = st.columns([2, 1])
 
         with col1:
             fig = create_distribution_histogram(
-                filtered_df['w_perc_low40_hh'],
+                admin_df['w_perc_low40_hh'],
                 title="Distribution of % Low-Income Households (Wijk level)",
-                xaxis_label="w_perc_low40_hh (standardized)",
+                xaxis_label="w_perc_low40_hh" + units_note,
                 nbins=40
             )
             st.plotly_chart(fig, use_container_width=True)
 
         with col2:
             st.markdown("**w_perc_low40_hh**")
-            st.dataframe(filtered_df['w_perc_low40_hh'].describe().round(3))
+            st.dataframe(admin_df['w_perc_low40_hh'].describe().round(3))
 
     wijk_vars = col_info['wijk']
     if wijk_vars:
         st.markdown("#### All Wijk-level Variables")
         st.dataframe(
-            filtered_df[wijk_vars].describe().T.round(3),
+            admin_df[wijk_vars].describe().T.round(3),
             use_container_width=True
         )
 
@@ -442,27 +465,27 @@ with tab_gemeente:
     **Gemeente** (municipality) is the largest geographic level, representing local government units.
     """)
 
-    if 'g_perc_low40_hh' in filtered_df.columns:
+    if 'g_perc_low40_hh' in admin_df.columns:
         col1, col2 = st.columns([2, 1])
 
         with col1:
             fig = create_distribution_histogram(
-                filtered_df['g_perc_low40_hh'],
+                admin_df['g_perc_low40_hh'],
                 title="Distribution of % Low-Income Households (Gemeente level)",
-                xaxis_label="g_perc_low40_hh (standardized)",
+                xaxis_label="g_perc_low40_hh" + units_note,
                 nbins=40
             )
             st.plotly_chart(fig, use_container_width=True)
 
         with col2:
             st.markdown("**g_perc_low40_hh**")
-            st.dataframe(filtered_df['g_perc_low40_hh'].describe().round(3))
+            st.dataframe(admin_df['g_perc_low40_hh'].describe().round(3))
 
     gemeente_vars = col_info['gemeente']
     if gemeente_vars:
         st.markdown("#### All Gemeente-level Variables")
         st.dataframe(
-            filtered_df[gemeente_vars].describe().T.round(3),
+            admin_df[gemeente_vars].describe().T.round(3),
             use_container_width=True
         )
 
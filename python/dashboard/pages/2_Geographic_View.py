@@ -373,8 +373,7 @@ with col2:
     ### Statistical Approach
 
     - **Two-level models**: Individuals nested in buurten
-    - **Four-level models**: Add wijk and gemeente level predictors
-    - **Note**: True nested random effects require R's lme4
+    - **Four-level models**: Add wijk and gemeente level predictors and random intercepts
     """)
 
 st.info("""
@@ -21,6 +21,9 @@ from utils.data_loader import (
     get_existing_figures,
     get_existing_tables,
     load_html_table,
+    load_h3_marginal_effects,
+    load_buurt_aggregates,
+    refit_buurt_model,
     get_precomputed_results,
     is_demo_mode,
     get_demo_mode_message
@@ -30,7 +33,8 @@ from components.charts import (
     create_forest_plot,
     create_multi_level_forest,
     create_model_progression_chart,
-    create_multi_level_comparison
+    create_multi_level_comparison,
+    create_marginal_effects_plot
 )
 from utils.labels import get_label, VARIABLE_LABELS, FOOTNOTES
 
@@ -235,6 +239,64 @@ if model_type == "Two-Level Models":
         *Note: *** p < 0.001*
         """)
 
+    # ---------------------------------------------------------
+    # Cross-Level Interaction
+    # ---------------------------------------------------------
+    h3_effects = load_h3_marginal_effects()
+    if h3_effects is not None:
+        st.subheader("5. Cross-Level Interaction (Income Moderation)")
+        moderator = h3_effects.columns[0]
+        fig = create_marginal_effects_plot(
+            h3_effects, moderator,
+            subtitle=f"Effect of % low-income households across {get_label(moderator)}"
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+    # ---------------------------------------------------------
+    # Buurt-Level Refit
+    # ---------------------------------------------------------
+    buurt_table = load_buurt_aggregates()
+    if buurt_table is not None:
+        section = 6 if h3_effects is not None else 5
+        st.subheader(f"{section}. Refit with Buurt-Level Predictors")
+
+        st.markdown("""
+        Models whose predictors are all measured at the neighborhood level are refit
+        from the per-buurt table the pipeline saves (respondent counts and outcome sums),
+        so they update instantly and match a fit on the full respondent data.
+        """)
+
+        buurt_predictors = [c for c in buurt_table.columns if c not in ("n", "sum_y", "sum_y2")]
+        selected_predictors = st.multiselect(
+            "Buurt-level predictors:",
+            options=buurt_predictors,
+            default=[c for c in ["b_perc_low40_hh"] if c in buurt_predictors],
+            format_func=get_label,
+            help="Leave empty for the empty model (M0)"
+        )
+
+        refit = refit_buurt_model(tuple(selected_predictors))
+
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("σ²_buurt", f"{refit['var_buurt']:.1f}")
+        col2.metric("σ²_residual", f"{refit['var_residual']:.1f}")
+        col3.metric("ICC", f"{refit['icc']:.3f}")
+        col4.metric("N (buurten)", f"{refit['n_obs']:,} ({refit['n_buurten']:,})")
+
+        coefficients = refit['coefficients'].drop(index="Intercept", errors="ignore")
+        if len(coefficients) > 0:
+            fig = create_forest_plot(
+                coefficients['coef'].tolist(),
+                coefficients['se'].tolist(),
+                [get_label(name, short=True) for name in coefficients.index],
+                title="Buurt-Level Predictors (REML refit)",
+                subtitle="Change in redistribution support (0-100) per 1 SD increase",
+                highlight_nonsig=True
+            )
+            st.plotly_chart(fig, use_container_width=True)
+
+        st.dataframe(refit['coefficients'].round(3), use_container_width=True)
+
 # =============================================================================
 # Four-Level Models
 # =============================================================================
@@ -251,11 +313,10 @@ elif model_type == "Four-Level Models":
     This allows us to test whether effects operate at different geographic scales.
     """)
 
-    st.warning("""
-    **Technical Note**: Python's statsmodels has limitations with nested random effects.
-    These models use buurt as the primary grouping variable with wijk and gemeente
-    predictors as fixed effects. For true nested random effects
-    `(1|gemeente) + (1|wijk) + (1|buurt)`, see the R implementation.
+    st.info("""
+    **Technical Note**: These models include nested random intercepts
+    `(1|gemeente) + (1|wijk) + (1|buurt)`, fitted with the sparse REML engine in
+    `src/nested.py` (equivalent to lme4's `lmer`).
     """)
 
     # ---------------------------------------------------------
@@ -124,11 +124,112 @@ def load_analysis_data() -> Optional[pd.DataFrame]:
         The merged and transformed analysis dataset, or None if not available
     """
     if Path(PROCESSED_DATA_PATH).exists():
-        df = pd.read_csv(PROCESSED_DATA_PATH)
+        from src.transform import GEO_ID_DIGITS, GEO_ID_DTYPE
+        # Integer geographic codes (groupbys and filters stay on ints)
+        df = pd.read_csv(PROCESSED_DATA_PATH,
+                         dtype={col: GEO_ID_DTYPE for col in GEO_ID_DIGITS})
         return df
     return None
 
 
+@st.cache_resource
+def load_context_scaler():
+    """
+    Load the standardization parameters saved by the pipeline.
+
+    Use ``scaler.transform`` to put raw context values (e.g. user queries)
+    on the scale of the analysis data, ``scaler.inverse_transform`` for the
+    way back.
+
+    Returns
+    -------
+    ContextScaler or None
+        None if the pipeline has not written context_scaler.json
+    """
+    path = Path(PROCESSED_DATA_PATH).parent / "context_scaler.json"
+    if path.exists():
+        from src.transform import ContextScaler
+        return ContextScaler.load(path)
+    return None
+
+
+@st.cache_data
+def load_buurt_aggregates() -> Optional[pd.DataFrame]:
+    """
+    Load the per-buurt table saved by the pipeline.
+
+    Models with only buurt-level predictors refit from it in milliseconds,
+    e.g. ``fit_cluster_aggregates("DV_single ~ b_perc_low40_hh", table)``
+    from src.mixed (same estimates as on the respondent data).
+
+    Returns
+    -------
+    pd.DataFrame or None
+        Indexed by buurt_id; None if the pipeline has not written
+        buurt_aggregates.csv
+    """
+    path = Path(PROCESSED_DATA_PATH).parent / "buurt_aggregates.csv"
+    if path.exists():
+        return pd.read_csv(path, index_col="buurt_id")
+    return None
+
+
+@st.cache_data
+def refit_buurt_model(predictors: tuple) -> Optional[Dict[str, Any]]:
+    """
+    Refit the two-level model of DV_single on chosen buurt-level predictors.
+
+    Parameters
+    ----------
+    predictors : tuple of str
+        Columns of the per-buurt table (empty for the intercept-only model)
+
+    Returns
+    -------
+    Dict or None
+        "coefficients" (DataFrame with coef and se per term), "var_buurt",
+        "var_residual", "icc", "n_obs", "n_buurten" and "llf"; None if
+        buurt_aggregates.csv is missing
+    """
+    table = load_buurt_aggregates()
+    if table is None:
+        return None
+    from src.mixed import fit_cluster_aggregates
+
+    formula = "DV_single ~ " + (" + ".join(predictors) if predictors else "1")
+    fit = fit_cluster_aggregates(formula, table)
+    var_buurt = float(fit.cov_re.iloc[0, 0])
+    return {
+        "coefficients": pd.DataFrame({"coef": fit.fe_params, "se": fit.bse_fe}),
+        "var_buurt": var_buurt,
+        "var_residual": fit.scale,
+        "icc": var_buurt / (var_buurt + fit.scale),
+        "n_obs": int(fit.nobs),
+        "n_buurten": int(fit.model.n_groups),
+        "llf": fit.llf,
+    }
+
+
+@st.cache_resource
+def load_geo_names():
+    """
+    Load the buurt/wijk/gemeente name dictionary built by the pipeline.
+
+    ``names.lookup(df['gemeente_id'], 'gemeente')`` gives the names for a
+    column of integer codes (memory-mapped, no admin data needed).
+
+    Returns
+    -------
+    GeoNameDictionary or None
+        None if no dictionary has been stored yet
+    """
+    try:
+        from src.geonames import latest_name_dictionary
+        return latest_name_dictionary()
+    except ImportError:
+        return None
+
+
 @st.cache_data
 def load_precomputed_results() -> Dict[str, Any]:
     """
@@ -286,6 +387,23 @@ def get_existing_tables() -> Dict[str, Optional[Path]]:
     return {name: path if path.exists() else None for name, path in tables.items()}
 
 
+@st.cache_data
+def load_h3_marginal_effects() -> Optional[pd.DataFrame]:
+    """
+    Load the H3 interaction curve saved by the pipeline.
+
+    Returns
+    -------
+    pd.DataFrame or None
+        MarginalEffects.to_frame() of the neighborhood effect across the
+        moderator (first column); None if h3_marginal_effects.csv is missing
+    """
+    path = TABLES_DIR / "h3_marginal_effects.csv"
+    if path.exists():
+        return pd.read_csv(path)
+    return None
+
+
 def load_html_table(table_path: Path) -> Optional[str]:
     """
     Load an HTML table file as a string.
@@ -334,7 +452,8 @@ def get_filtered_data(
     filtered = df.copy()
 
     if gemeente_filter and len(gemeente_filter) > 0:
-        filtered = filtered[filtered['gemeente_id'].astype(str).isin(gemeente_filter)]
+        from src.transform import geo_id_strings
+        filtered = filtered[geo_id_strings(filtered['gemeente_id'], 'gemeente_id').isin(gemeente_filter)]
 
     if education_range and 'education' in filtered.columns:
         filtered = filtered[
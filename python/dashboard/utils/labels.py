@@ -47,6 +47,8 @@ VARIABLE_LABELS = {
     "employment_status": "Employment Status",
     "born_in_nl": "Born in Netherlands",
     "wealth_index": "Wealth Index (0-4)",
+    "professional_class": "Professional/Managerial Class",
+    "occupation_rank": "Occupational Class Rank (1 = highest)",
 
     # Geographic Identifiers
     "buurt_id": "Neighborhood ID",
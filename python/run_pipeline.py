@@ -16,6 +16,11 @@ This script runs the complete ETL and analysis pipeline:
 Usage:
     python run_pipeline.py              # Use local data files
     python run_pipeline.py --use-api    # Download fresh CBS data
+    python run_pipeline.py --no-cache   # Recompute every stage
+    python run_pipeline.py --jobs 8     # Run independent stages in parallel
+    python run_pipeline.py --multiverse # Also fit the specification curve
+    python run_pipeline.py --bootstrap 2000  # Bootstrap ICC / key coefficient CIs
+    python run_pipeline.py --partitioned  # Out-of-core mode, partitions by gemeente
     python run_pipeline.py --help       # Show options
 """
 
@@ -30,11 +35,21 @@ sys.path.insert(0, str(PROJECT_ROOT))
 from config import (
     SURVEY_PATH, ADMIN_PATH, USE_CBS_API,
     PROCESSED_DATA_PATH, REGRESSION_TABLE_PATH,
-    OUTPUT_DIR, TABLES_DIR
+    OUTPUT_DIR, TABLES_DIR, CACHE_DIR, USE_STAGE_CACHE, PIPELINE_JOBS,
+    SPEC_CURVE_PATH, BOOTSTRAP_REPLICATES, SURVEY_CACHE_DIR,
+    ADMIN_CACHE_DIR, CONTEXT_SCALER_PATH, GEO_NAMES_DIR, PARTITIONED_DIR,
+    BUURT_AGGREGATES_PATH, H3_MARGINS_PATH
 )
 
 
-def main(use_cbs_api: bool = False, include_occupation: bool = True):
+def main(
+    use_cbs_api: bool = False,
+    include_occupation: bool = True,
+    use_cache: bool = USE_STAGE_CACHE,
+    jobs: int = PIPELINE_JOBS,
+    multiverse: bool = False,
+    n_boot: int = BOOTSTRAP_REPLICATES
+):
     """
     Run the complete analysis pipeline.
 
@@ -44,6 +59,16 @@ def main(use_cbs_api: bool = False, include_occupation: bool = True):
         If True, download fresh data from CBS API
     include_occupation : bool
         If True, require occupation in analysis sample
+    use_cache : bool
+        If True, reuse stage outputs from CACHE_DIR when their inputs,
+        code and config settings are unchanged
+    jobs : int
+        Worker processes for independent stages (1 = sequential)
+    multiverse : bool
+        If True, also fit the specification curve (src/multiverse.py)
+    n_boot : int
+        Bootstrap replicates for the ICC and key coefficient intervals
+        (0 = skip; src/bootstrap.py)
     """
     print("=" * 60)
     print("REDISTRIBUTION PREFERENCES ANALYSIS PIPELINE")
@@ -52,9 +77,8 @@ def main(use_cbs_api: bool = False, include_occupation: bool = True):
     # Import modules
     from src.extract import load_survey_data, load_admin_data, validate_raw_data
     from src.transform import (
-        create_geo_ids, prepare_admin_by_level,
-        recode_survey_variables, standardize_context_vars,
-        create_inequality_indices, add_geographic_names_from_admin
+        create_geo_ids, prepare_admin_by_level, fit_context_scaler,
+        transform_analysis_data
     )
     from src.merge import (
         merge_survey_admin, validate_merge,
@@ -65,92 +89,122 @@ def main(use_cbs_api: bool = False, include_occupation: bool = True):
         fit_two_level_models, calculate_icc,
         run_diagnostics, run_sensitivity,
         fit_four_level_models, calculate_four_level_icc,
-        test_h3_cross_level_interaction
+        test_h3_cross_level_interaction, buurt_aggregates
     )
+    from src.multiverse import run_multiverse, save_spec_curve
+    from src.bootstrap import bootstrap_two_level
     from src.report import create_model_table, generate_report
+    from src.cache import ArtifactStore
+    from src.scheduler import DAGScheduler, Task, Ref
 
-    # =========================================================================
-    # PHASE 1: EXTRACT
-    # =========================================================================
-    print("\n" + "=" * 60)
-    print("PHASE 1: EXTRACT")
-    print("=" * 60)
-
-    survey_raw = load_survey_data(SURVEY_PATH)
-    admin_raw = load_admin_data(ADMIN_PATH, use_api=use_cbs_api)
-    validation = validate_raw_data(survey_raw, admin_raw)
-
-    if not validation["passed"]:
-        print("\nWarning: Raw data validation failed. Continuing anyway...")
-
-    # =========================================================================
-    # PHASE 2: TRANSFORM (Geographic IDs)
-    # =========================================================================
-    print("\n" + "=" * 60)
-    print("PHASE 2: TRANSFORM (Geographic IDs)")
-    print("=" * 60)
-
-    survey_with_geo = create_geo_ids(survey_raw)
-    admin_by_level = prepare_admin_by_level(admin_raw)
-
-    # =========================================================================
-    # PHASE 3: MERGE
-    # =========================================================================
-    print("\n" + "=" * 60)
-    print("PHASE 3: MERGE")
-    print("=" * 60)
-
-    merged_data = merge_survey_admin(survey_with_geo, admin_by_level)
-    merge_validation = validate_merge(merged_data)
-    missingness = analyze_missingness(merged_data)
-    matched_comparison = compare_matched_unmatched(merged_data)
-
-    # =========================================================================
-    # PHASE 4: TRANSFORM (Recode)
-    # =========================================================================
-    print("\n" + "=" * 60)
-    print("PHASE 4: TRANSFORM (Recode & Standardize)")
-    print("=" * 60)
-
-    data_recoded = recode_survey_variables(merged_data)
-    data_with_indices = create_inequality_indices(data_recoded)
-    data_with_names = add_geographic_names_from_admin(data_with_indices, admin_raw)
-    data_final = standardize_context_vars(data_with_names)
-    analysis_sample = create_analysis_sample(data_final, include_occupation)
-
-    # =========================================================================
-    # PHASE 5: ANALYZE (Two-Level Models)
-    # =========================================================================
-    print("\n" + "=" * 60)
-    print("PHASE 5a: ANALYZE (Two-Level Buurt Models)")
-    print("=" * 60)
-
-    models = fit_two_level_models(analysis_sample)
-    icc_results = calculate_icc(models)
-    diagnostics = run_diagnostics(models, analysis_sample)
-    sensitivity = run_sensitivity(data_final)
-
-    # H3 Test: Cross-level interaction (individual income moderation)
-    h3_results = test_h3_cross_level_interaction(data_final)
+    store = ArtifactStore(CACHE_DIR, enabled=use_cache)
 
     # =========================================================================
-    # PHASE 5b: ANALYZE (Four-Level Models)
+    # PIPELINE GRAPH (Phases 1-5)
     # =========================================================================
-    print("\n" + "=" * 60)
-    print("PHASE 5b: ANALYZE (Four-Level Models: buurt/wijk/gemeente)")
-    print("=" * 60)
+    # Each task names its output; Ref(...) marks a dependency. With jobs > 1,
+    # independent branches (e.g. sensitivity, H3 and four-level models) run
+    # concurrently in a process pool.
+    extract = "PHASE 1: EXTRACT"
+    geo = "PHASE 2: TRANSFORM (Geographic IDs)"
+    merge = "PHASE 3: MERGE"
+    recode = "PHASE 4: TRANSFORM (Recode & Standardize)"
+    two_level = "PHASE 5a: ANALYZE (Two-Level Buurt Models)"
+    four_level = "PHASE 5b: ANALYZE (Four-Level Models: buurt/wijk/gemeente)"
+
+    tasks = [
+        # Phase 1
+        # The Parquet survey extract follows --no-cache as well
+        Task("extract_survey", load_survey_data,
+             (SURVEY_PATH, str(SURVEY_CACHE_DIR) if use_cache and SURVEY_CACHE_DIR else None),
+             config_keys=("SURVEY_COLUMNS", "SURVEY_CHUNK_ROWS"), phase=extract),
+        # API responses are not content-addressable up front; always fetch
+        Task("extract_admin", load_admin_data, (ADMIN_PATH,),
+             {"use_api": use_cbs_api,
+              "cache_dir": str(ADMIN_CACHE_DIR) if use_cache and ADMIN_CACHE_DIR else None},
+             config_keys=("ADMIN_INDICATORS",), cache=not use_cbs_api, phase=extract),
+        Task("validation", validate_raw_data,
+             (Ref("extract_survey"), Ref("extract_admin")),
+             local=True, cache=False, phase=extract),
+
+        # Phase 2
+        Task("geo_ids", create_geo_ids, (Ref("extract_survey"),), phase=geo),
+        Task("admin_by_level", prepare_admin_by_level, (Ref("extract_admin"),),
+             phase=geo),
+
+        # Phase 3
+        Task("merge", merge_survey_admin,
+             (Ref("geo_ids"), Ref("admin_by_level")), phase=merge),
+        Task("merge_validation", validate_merge, (Ref("merge"),),
+             local=True, cache=False, phase=merge),
+        Task("missingness", analyze_missingness, (Ref("merge"),),
+             local=True, cache=False, phase=merge),
+        Task("matched_comparison", compare_matched_unmatched, (Ref("merge"),),
+             local=True, cache=False, phase=merge),
+
+        # Phase 4 (recode, indices, names and standardization as one stage)
+        Task("context_scaler", fit_context_scaler, (Ref("merge"),),
+             config_keys=("STANDARDIZE_WEIGHTED", "STANDARDIZE_LEVEL"), phase=recode),
+        Task("transform", transform_analysis_data,
+             (Ref("merge"), Ref("extract_admin"), Ref("context_scaler")),
+             {"names_dir": str(GEO_NAMES_DIR) if use_cache and GEO_NAMES_DIR else None},
+             config_keys=("SURVEY_YEAR",), phase=recode),
+        Task("analysis_sample", create_analysis_sample,
+             (Ref("transform"), include_occupation),
+             config_keys=("INDIVIDUAL_CONTROLS", "BUURT_CONTROLS", "MIN_CLUSTER_SIZE"),
+             phase=recode),
+
+        # Phase 5a
+        Task("fit_two_level", fit_two_level_models, (Ref("analysis_sample"),),
+             config_keys=("MIXED_ENGINE",), phase=two_level),
+        Task("icc", calculate_icc, (Ref("fit_two_level"),),
+             local=True, cache=False, phase=two_level),
+        Task("diagnostics", run_diagnostics,
+             (Ref("fit_two_level"), Ref("analysis_sample")),
+             config_keys=("VIF_THRESHOLD", "CONDITION_INDEX_THRESHOLD", "MIXED_ENGINE"),
+             phase=two_level),
+        Task("sensitivity", run_sensitivity, (Ref("transform"),),
+             config_keys=("MIXED_ENGINE",), phase=two_level),
+        # H3 Test: Cross-level interaction (individual income moderation)
+        Task("h3_interaction", test_h3_cross_level_interaction,
+             (Ref("transform"),), config_keys=("MIXED_ENGINE",), phase=two_level),
+
+        # Phase 5b (needs wijk_id and gemeente_id; failure is not fatal)
+        Task("fit_four_level", fit_four_level_models, (Ref("transform"),),
+             config_keys=("MIXED_ENGINE",), optional=True, phase=four_level),
+        Task("four_level_icc", calculate_four_level_icc, (Ref("fit_four_level"),),
+             local=True, cache=False, optional=True, phase=four_level),
+    ]
+
+    if multiverse:
+        tasks.append(
+            Task("multiverse", run_multiverse, (Ref("transform"),),
+                 config_keys=("BUURT_CONTROLS", "KEY_PREDICTOR", "CONFIDENCE_LEVEL"),
+                 optional=True, phase="PHASE 5c: ANALYZE (Specification Curve)")
+        )
+
+    if n_boot > 0:
+        tasks.append(
+            Task("bootstrap", bootstrap_two_level, (Ref("fit_two_level"), n_boot),
+                 config_keys=("BOOTSTRAP_METHOD", "BOOTSTRAP_SEED", "KEY_PREDICTOR",
+                              "CONFIDENCE_LEVEL", "MIXED_ENGINE"),
+                 optional=True, phase=two_level)
+        )
+
+    scheduler = DAGScheduler(tasks, store=store, jobs=jobs)
+    results = scheduler.run()
+    scheduler.report()
+
+    if not results["validation"]["passed"]:
+        print("\nWarning: Raw data validation failed. Continuing anyway...")
 
-    # Four-level models need wijk_id and gemeente_id
-    four_level_models = None
-    four_level_icc = None
-    if all(col in data_final.columns for col in ["wijk_id", "gemeente_id"]):
-        try:
-            four_level_models = fit_four_level_models(data_final)
-            four_level_icc = calculate_four_level_icc(four_level_models)
-        except Exception as e:
-            print(f"  Warning: Four-level models failed: {e}")
-    else:
-        print("  Skipping: wijk_id or gemeente_id not available")
+    data_final = results["transform"]
+    models = results["fit_two_level"]
+    icc_results = results["icc"]
+    diagnostics = results["diagnostics"]
+    sensitivity = results["sensitivity"]
+    merge_validation = results["merge_validation"]
+    four_level_models = results["fit_four_level"]
 
     # =========================================================================
     # PHASE 6: REPORT
@@ -173,13 +227,23 @@ def main(use_cbs_api: bool = False, include_occupation: bool = True):
         four_level_table_path = TABLES_DIR / "regression_table_four_level.html"
         create_four_level_table(four_level_models, four_level_table_path)
 
+    if results.get("multiverse") is not None:
+        save_spec_curve(results["multiverse"], SPEC_CURVE_PATH)
+
+    # H3 interaction curve (neighborhood effect across the moderator, for the dashboard)
+    h3_effects = results["h3_interaction"].get("marginal_effects")
+    if h3_effects is not None:
+        h3_effects.to_frame().to_csv(H3_MARGINS_PATH, index=False)
+        print(f"H3 marginal effects saved to: {H3_MARGINS_PATH}")
+
     report = generate_report(
         models=models,
         icc_results=icc_results,
         diagnostics=diagnostics,
         sensitivity=sensitivity,
         merge_validation=merge_validation,
-        output_path=OUTPUT_DIR / "analysis_report.txt"
+        output_path=OUTPUT_DIR / "analysis_report.txt",
+        bootstrap=results.get("bootstrap")
     )
 
     # Save final data
@@ -187,6 +251,14 @@ def main(use_cbs_api: bool = False, include_occupation: bool = True):
     data_final.to_csv(PROCESSED_DATA_PATH, index=False)
     print(f"\nFinal data saved to: {PROCESSED_DATA_PATH}")
 
+    # Standardization parameters, to score new data on the same scale
+    results["context_scaler"].save(CONTEXT_SCALER_PATH)
+    print(f"Context scaler saved to: {CONTEXT_SCALER_PATH}")
+
+    # Per-buurt table: m0/m1 and other buurt-level models refit without the rows
+    buurt_aggregates(results["analysis_sample"]).to_csv(BUURT_AGGREGATES_PATH)
+    print(f"Buurt aggregates saved to: {BUURT_AGGREGATES_PATH}")
+
     # =========================================================================
     # SUMMARY
     # =========================================================================
@@ -198,10 +270,68 @@ def main(use_cbs_api: bool = False, include_occupation: bool = True):
     print(f"ICC: {report.icc:.4f}")
     print(f"Key coefficient: {report.key_coef:.3f} (SE={report.key_se:.3f})")
     print(f"\nOutputs saved to: {OUTPUT_DIR}")
+    if use_cache:
+        print(f"Stage cache: {store.summary()} ({CACHE_DIR})")
 
     return report
 
 
+def main_partitioned(
+    use_cbs_api: bool = False,
+    include_occupation: bool = True,
+    jobs: int = PIPELINE_JOBS
+):
+    """
+    Run the pipeline out of core, one gemeente partition at a time.
+
+    The analysis data is written as Parquet partitions and the two-level
+    models are fitted from per-partition sufficient statistics (see
+    src/partitioned.py), so the full frame is never in memory. Diagnostics,
+    sensitivity, H3 and four-level models need row-level data and are not
+    run in this mode.
+
+    Parameters
+    ----------
+    use_cbs_api : bool
+        If True, download fresh data from CBS API
+    include_occupation : bool
+        If True, require occupation in analysis sample
+    jobs : int
+        Worker processes for the partition passes (1 = sequential)
+    """
+    print("=" * 60)
+    print("REDISTRIBUTION PREFERENCES ANALYSIS PIPELINE (PARTITIONED)")
+    print("=" * 60)
+
+    from src.partitioned import run_partitioned
+    from src.analyze import calculate_icc
+    from src.report import create_model_table
+
+    run = run_partitioned(
+        SURVEY_PATH, ADMIN_PATH, PARTITIONED_DIR,
+        use_cbs_api=use_cbs_api, include_occupation=include_occupation,
+        names_dir=GEO_NAMES_DIR, jobs=jobs
+    )
+    icc_results = calculate_icc(run.models)
+
+    TABLES_DIR.mkdir(parents=True, exist_ok=True)
+    create_model_table(run.models, REGRESSION_TABLE_PATH)
+    run.scaler.save(CONTEXT_SCALER_PATH)
+
+    m3 = run.models.m3_buurt_controls
+    print("\n" + "=" * 60)
+    print("PIPELINE COMPLETE")
+    print("=" * 60)
+    print(f"Respondents: {run.partitions.n_rows} in {len(run.partitions.gemeenten)} partitions")
+    print(f"Observations: {m3.nobs}")
+    print(f"Clusters: {m3.model.n_groups}")
+    print(f"ICC: {icc_results.icc:.4f}")
+    print(f"Key coefficient: {m3.params['b_perc_low40_hh']:.3f} "
+          f"(SE={m3.bse['b_perc_low40_hh']:.3f})")
+    print(f"\nPartitions and statistics: {PARTITIONED_DIR}")
+    return run
+
+
 def test_cbs_api():
     """Test CBS API connection."""
     print("Testing CBS API connection...")
@@ -251,6 +381,41 @@ if __name__ == "__main__":
         help="Exclude occupation from analysis (keeps more cases)"
     )
 
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Recompute every stage instead of reusing cached outputs"
+    )
+
+    parser.add_argument(
+        "--jobs", "-j",
+        type=int,
+        default=PIPELINE_JOBS,
+        metavar="N",
+        help="Worker processes for independent stages (default: 1, sequential)"
+    )
+
+    parser.add_argument(
+        "--multiverse",
+        action="store_true",
+        help="Also fit every DV x control-set x occupation x subsample specification"
+    )
+
+    parser.add_argument(
+        "--bootstrap",
+        type=int,
+        default=BOOTSTRAP_REPLICATES,
+        metavar="N",
+        help="Bootstrap replicates for ICC and key coefficient intervals (default: 0, off)"
+    )
+
+    parser.add_argument(
+        "--partitioned",
+        action="store_true",
+        help="Out-of-core mode: process respondents in partitions by gemeente "
+             "and fit the two-level models from sufficient statistics"
+    )
+
     parser.add_argument(
         "--test-api",
         action="store_true",
@@ -263,7 +428,19 @@ if __name__ == "__main__":
         success = test_cbs_api()
         sys.exit(0 if success else 1)
 
+    if args.partitioned:
+        main_partitioned(
+            use_cbs_api=args.use_api,
+            include_occupation=not args.no_occupation,
+            jobs=args.jobs
+        )
+        sys.exit(0)
+
     main(
         use_cbs_api=args.use_api,
-        include_occupation=not args.no_occupation
+        include_occupation=not args.no_occupation,
+        use_cache=USE_STAGE_CACHE and not args.no_cache,
+        jobs=args.jobs,
+        multiverse=args.multiverse,
+        n_boot=args.bootstrap
     )
@@ -5,10 +5,25 @@ using Dutch SCoRE survey data merged with CBS neighborhood statistics.
 
 Modules:
     extract: Data loading from CBS API and local files
+    cbs_download: Concurrent CBS OData downloader with a revalidating response cache
     transform: Geographic ID creation and variable recoding
+    geonames: Integer-keyed buurt/wijk/gemeente name dictionary (memory-mapped)
     merge: Multi-level data merging and validation
+    missingness: Packed per-row missingness bitmasks for complete-case samples
+    samples: LRU-cached analysis samples (row positions and cluster sizes)
     analyze: Multilevel statistical models and diagnostics
+    mixed: Closed-form random-intercept REML engine
+    nested: Sparse REML engine for nested/crossed random intercepts
+    design: Cached design-matrix builder for model formulas
+    sensitivity: Robustness specification registry and parallel runner
+    multiverse: Specification-curve engine over DVs, controls and subsamples
+    collinearity: Vectorized VIF, condition indices and variance proportions
+    bootstrap: Cluster and parametric bootstrap intervals for ICC and key coefficient
+    margins: Vectorized simple slopes, SEs and Johnson-Neyman regions for interactions
     report: Output generation (tables and figures)
+    cache: Content-hashed on-disk stage cache
+    scheduler: Dependency-graph executor for pipeline stages
+    partitioned: Out-of-core pipeline over gemeente partitions (Parquet + sufficient statistics)
 """
 
 __version__ = "1.0.0"
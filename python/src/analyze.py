@@ -5,9 +5,13 @@
 Functions for multilevel modeling, ICC calculation, and diagnostics.
 
 Functions:
+    two_level_formulas: Formulas of the two-level models m0-m3
     fit_two_level_models: Fit sequence of random-intercept models
+    fit_two_level_from_statistics: Same models from stored sufficient statistics
+    buurt_aggregates: Per-buurt outcome sums and buurt-level predictors
+    fit_buurt_level_models: m0 and m1 from the per-buurt table
     calculate_icc: Calculate intraclass correlation
-    run_diagnostics: VIF, residual stats, random effects
+    run_diagnostics: VIF, condition indices, residual stats, random effects
     run_sensitivity: Robustness checks with alternative specifications
 """
 
@@ -15,13 +19,27 @@ import pandas as pd
 import numpy as np
 from pathlib import Path
 from typing import Dict, List, Any, Optional
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from scipy import stats
 import warnings
 
 import sys
 sys.path.insert(0, str(Path(__file__).parent.parent))
-from config import VIF_THRESHOLD, CONFIDENCE_LEVEL
+from config import (
+    VIF_THRESHOLD, CONDITION_INDEX_THRESHOLD, CONFIDENCE_LEVEL,
+    MIXED_ENGINE, SENSITIVITY_JOBS
+)
+
+from .collinearity import collinearity_diagnostics
+
+from .mixed import (
+    fit_random_intercept, statsmodels_mixedlm, NestedModelSequence,
+    RandomInterceptModel, SufficientStatistics, cluster_aggregates,
+    fit_cluster_aggregates
+)
+from .margins import marginal_effects
+from .samples import sample_manager
+from .sensitivity import SensitivitySpec, run_specs
 
 
 # =============================================================================
@@ -31,7 +49,7 @@ from config import VIF_THRESHOLD, CONFIDENCE_LEVEL
 @dataclass
 class TwoLevelModels:
     """Container for fitted multilevel models."""
-    m0_empty: Any       # statsmodels MixedLMResults
+    m0_empty: Any       # MixedLMResults or RandomInterceptResults
     m1_key_pred: Any
     m2_ind_controls: Any
     m3_buurt_controls: Any
@@ -67,12 +85,82 @@ class DiagnosticsResult:
     random_effect_stats: pd.DataFrame
     n_clusters: int
     n_obs: int
+    # Belsley condition indices and variance-decomposition proportions
+    condition_indices: pd.DataFrame = field(default_factory=pd.DataFrame)
+    collinear_sets: List[List[str]] = field(default_factory=list)
+
+
+# Numeric predictors checked for multicollinearity by default
+DIAGNOSTIC_VARS = [
+    "b_perc_low40_hh", "age", "education",
+    "b_pop_dens", "b_pop_over_65", "b_pop_nonwest",
+    "b_perc_low_inc_hh", "b_perc_soc_min_hh"
+]
 
 
 # =============================================================================
 # Multilevel Model Fitting
 # =============================================================================
 
+def _fit_mixed(formula: str, data: pd.DataFrame, groups: str = "buurt_id"):
+    """
+    Fit a random-intercept model (REML) with the configured engine.
+
+    "closed_form" uses the sufficient-statistics engine in src/mixed.py;
+    "statsmodels" falls back to MixedLM. Both build their design matrices
+    through the cache in src/design.py and expose params, bse, cov_re,
+    scale, random_effects, resid, nobs and aic/bic.
+    """
+    if MIXED_ENGINE == "statsmodels":
+        return statsmodels_mixedlm(formula, data, groups).fit(reml=True)
+    return fit_random_intercept(formula, data, groups, reml=True)
+
+
+# Buurt-level controls of m3
+TWO_LEVEL_BUURT_CONTROLS = ["b_pop_dens", "b_pop_over_65", "b_pop_nonwest",
+                            "b_perc_low_inc_hh", "b_perc_soc_min_hh"]
+
+
+def two_level_formulas(n_observed: pd.Series) -> Dict[str, str]:
+    """
+    Formulas of the two-level models.
+
+    Occupation and the buurt controls enter if observed for more than 100
+    respondents of the sample.
+
+    Parameters
+    ----------
+    n_observed : pd.Series
+        Non-missing values per column of the analysis sample
+
+    Returns
+    -------
+    dict
+        "m0".."m3" -> formula
+    """
+    m2_formula = (
+        "DV_single ~ b_perc_low40_hh + age + C(sex) + education + "
+        "C(employment_status) + born_in_nl"
+    )
+
+    # Add occupation if available
+    if n_observed.get("occupation", 0) > 100:
+        m2_formula += " + C(occupation)"
+
+    buurt_controls = [var for var in TWO_LEVEL_BUURT_CONTROLS
+                      if n_observed.get(var, 0) > 100]
+    m3_formula = m2_formula
+    if buurt_controls:
+        m3_formula += " + " + " + ".join(buurt_controls)
+
+    return {
+        "m0": "DV_single ~ 1",
+        "m1": "DV_single ~ b_perc_low40_hh",
+        "m2": m2_formula,
+        "m3": m3_formula,
+    }
+
+
 def fit_two_level_models(data: pd.DataFrame) -> TwoLevelModels:
     """
     Fit sequence of two-level random intercept models.
@@ -93,71 +181,39 @@ def fit_two_level_models(data: pd.DataFrame) -> TwoLevelModels:
     TwoLevelModels
         Container with all fitted models
     """
-    import statsmodels.formula.api as smf
-
     print("\nFitting two-level multilevel models...")
 
-    # Ensure buurt_id is string for grouping
+    # buurt_id is an integer code (see transform.create_geo_ids)
     df = data.copy()
-    df["buurt_id"] = df["buurt_id"].astype(str)
 
     # Suppress convergence warnings for cleaner output
     warnings.filterwarnings("ignore", category=RuntimeWarning)
 
+    # Nested models share the grouping and warm-start from the previous fit
+    seq = NestedModelSequence(df, "buurt_id", engine=MIXED_ENGINE)
+    candidates = [c for c in ["occupation"] + TWO_LEVEL_BUURT_CONTROLS if c in df.columns]
+    formulas = two_level_formulas(df[candidates].notna().sum())
+
     # M0: Empty model (random intercept only)
     print("  Fitting m0 (empty model)...")
-    m0 = smf.mixedlm(
-        "DV_single ~ 1",
-        data=df,
-        groups="buurt_id"
-    ).fit(reml=True)
+    m0 = seq.fit(formulas["m0"])
     n_groups = df["buurt_id"].nunique()
     print(f"    N={int(m0.nobs)}, groups={n_groups}")
 
     # M1: Add key predictor
     print("  Fitting m1 (+ key predictor)...")
-    m1 = smf.mixedlm(
-        "DV_single ~ b_perc_low40_hh",
-        data=df,
-        groups="buurt_id"
-    ).fit(reml=True)
+    m1 = seq.fit(formulas["m1"])
 
     # M2: Add individual controls
     print("  Fitting m2 (+ individual controls)...")
-    m2_formula = (
-        "DV_single ~ b_perc_low40_hh + age + C(sex) + education + "
-        "C(employment_status) + born_in_nl"
-    )
-
-    # Add occupation if available
-    if "occupation" in df.columns and df["occupation"].notna().sum() > 100:
-        m2_formula += " + C(occupation)"
-
-    m2 = smf.mixedlm(
-        m2_formula,
-        data=df,
-        groups="buurt_id"
-    ).fit(reml=True)
+    m2 = seq.fit(formulas["m2"])
 
     # M3: Add buurt-level controls
     print("  Fitting m3 (+ buurt controls)...")
-    buurt_controls = []
-    for var in ["b_pop_dens", "b_pop_over_65", "b_pop_nonwest",
-                "b_perc_low_inc_hh", "b_perc_soc_min_hh"]:
-        if var in df.columns and df[var].notna().sum() > 100:
-            buurt_controls.append(var)
-
-    m3_formula = m2_formula
-    if buurt_controls:
-        m3_formula += " + " + " + ".join(buurt_controls)
-
-    m3 = smf.mixedlm(
-        m3_formula,
-        data=df,
-        groups="buurt_id"
-    ).fit(reml=True)
+    m3 = seq.fit(formulas["m3"])
 
     print("  All models fitted successfully")
+    print(f"  Likelihood evaluations: {[n for _, n in seq.evaluations]}")
 
     # Print key coefficient
     if "b_perc_low40_hh" in m3.params.index:
@@ -173,6 +229,99 @@ def fit_two_level_models(data: pd.DataFrame) -> TwoLevelModels:
     )
 
 
+def fit_two_level_from_statistics(
+    statistics: Dict[str, SufficientStatistics]
+) -> TwoLevelModels:
+    """
+    Fit the two-level models from sufficient statistics (closed-form engine).
+
+    Results equal fit_two_level_models on the rows the statistics were
+    computed from, without access to those rows (see src/partitioned.py).
+
+    Parameters
+    ----------
+    statistics : dict
+        "m0".."m3" -> SufficientStatistics of the model's design
+
+    Returns
+    -------
+    TwoLevelModels
+        Fitted models (no residuals or fitted values)
+    """
+    print("\nFitting two-level multilevel models from sufficient statistics...")
+
+    fitted = {}
+    previous = None
+    for name in ["m0", "m1", "m2", "m3"]:
+        model = RandomInterceptModel.from_statistics(statistics[name])
+        fitted[name] = model.fit(reml=True, start_gamma=previous.gamma if previous else None)
+        previous = fitted[name]
+        print(f"  {name}: N={fitted[name].nobs}, groups={model.n_groups}, "
+              f"evaluations={fitted[name].n_evals}")
+
+    m3 = fitted["m3"]
+    if "b_perc_low40_hh" in m3.params.index:
+        print(f"  Key predictor (m3): b_perc_low40_hh = "
+              f"{m3.params['b_perc_low40_hh']:.3f} (SE={m3.bse['b_perc_low40_hh']:.3f})")
+
+    return TwoLevelModels(
+        m0_empty=fitted["m0"],
+        m1_key_pred=fitted["m1"],
+        m2_ind_controls=fitted["m2"],
+        m3_buurt_controls=fitted["m3"]
+    )
+
+
+def buurt_aggregates(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Compact per-buurt table of the analysis sample.
+
+    Holds everything m0, m1 and other models with only buurt-level
+    predictors need: respondents, sum and sum of squares of DV_single, and
+    the key predictor plus the buurt controls. One row per buurt instead
+    of one per respondent.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        Analysis sample
+
+    Returns
+    -------
+    pd.DataFrame
+        Indexed by buurt_id, with the buurt-level columns plus n, sum_y
+        and sum_y2 (see mixed.cluster_aggregates)
+    """
+    covariates = [c for c in ["b_perc_low40_hh"] + TWO_LEVEL_BUURT_CONTROLS
+                  if c in data.columns]
+    return cluster_aggregates(data, "DV_single", "buurt_id", covariates)
+
+
+def fit_buurt_level_models(table: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Fit m0 and m1 from the per-buurt table (closed-form engine).
+
+    The likelihood of a random-intercept model whose predictors are all
+    buurt-level depends on the data only through the per-buurt sums, so the
+    results equal fit_two_level_models' m0 and m1 on the sample the table
+    was built from, at a cost independent of the number of respondents.
+
+    Parameters
+    ----------
+    table : pd.DataFrame
+        Output of buurt_aggregates
+
+    Returns
+    -------
+    dict
+        "m0", "m1" -> RandomInterceptResults (no residuals or fitted values)
+    """
+    formulas = two_level_formulas(pd.Series(dtype=int))
+    m0 = fit_cluster_aggregates(formulas["m0"], table)
+    m1 = fit_cluster_aggregates(formulas["m1"], table, start_gamma=m0.gamma)
+    return {"m0": m0, "m1": m1}
+
+
 # =============================================================================
 # Four-Level Multilevel Model Fitting
 # =============================================================================
@@ -182,15 +331,15 @@ def fit_four_level_models(data: pd.DataFrame) -> FourLevelModels:
     Fit sequence of four-level random intercept models.
     
     These models include random intercepts for buurt, wijk, and gemeente,
-    approximating the R lme4 specification:
+    matching the R lme4 specification:
     (1|gemeente_id) + (1|wijk_id) + (1|buurt_id)
     
-    Note: statsmodels has limitations with multiple random effects. We use
-    the primary grouping at buurt level and include wijk/gemeente predictors
-    as fixed effects to capture higher-level variation.
+    statsmodels cannot fit nested random effects at this scale, so the
+    models use the sparse engine in src/nested.py regardless of
+    MIXED_ENGINE.
     
     Models:
-    - m0: Empty model (buurt random intercept)
+    - m0: Empty model (buurt, wijk and gemeente random intercepts)
     - m1: + key predictors at all levels (b_, w_, g_perc_low40_hh)
     - m2: + individual controls
     - m3: + buurt-level controls
@@ -206,10 +355,8 @@ def fit_four_level_models(data: pd.DataFrame) -> FourLevelModels:
     FourLevelModels
         Container with all fitted models
     """
-    import statsmodels.formula.api as smf
-
     print("\nFitting four-level multilevel models...")
-    print("  Note: Using buurt as primary grouping with wijk/gemeente predictors")
+    print("  Random intercepts: buurt, wijk, gemeente (sparse nested REML)")
 
     # Check required columns
     required_cols = ["buurt_id", "wijk_id", "gemeente_id"]
@@ -217,38 +364,31 @@ def fit_four_level_models(data: pd.DataFrame) -> FourLevelModels:
     if missing:
         raise ValueError(f"Missing required columns for four-level models: {missing}")
 
-    # Prepare data - create a clean copy with complete cases for required vars
-    df = data.copy()
-    
-    # Ensure string IDs
-    for col in ["buurt_id", "wijk_id", "gemeente_id"]:
-        df[col] = df[col].astype(str)
-    
     # Get required columns for models
     base_required = ["DV_single", "buurt_id", "wijk_id", "gemeente_id"]
     key_preds = ["b_perc_low40_hh"]
-    if "w_perc_low40_hh" in df.columns:
+    if "w_perc_low40_hh" in data.columns:
         key_preds.append("w_perc_low40_hh")
-    if "g_perc_low40_hh" in df.columns:
+    if "g_perc_low40_hh" in data.columns:
         key_preds.append("g_perc_low40_hh")
     
     ind_controls = ["age", "sex", "education", "employment_status", "born_in_nl"]
-    ind_controls = [c for c in ind_controls if c in df.columns]
+    ind_controls = [c for c in ind_controls if c in data.columns]
     
     buurt_ctrls = ["b_pop_dens", "b_pop_over_65", "b_pop_nonwest", 
                    "b_perc_low_inc_hh", "b_perc_soc_min_hh"]
-    buurt_ctrls = [c for c in buurt_ctrls if c in df.columns]
+    buurt_ctrls = [c for c in buurt_ctrls if c in data.columns]
     
     wijk_ctrls = ["w_pop_dens", "w_pop_over_65", "w_pop_nonwest",
                   "w_perc_low_inc_hh", "w_perc_soc_min_hh"]
-    wijk_ctrls = [c for c in wijk_ctrls if c in df.columns]
+    wijk_ctrls = [c for c in wijk_ctrls if c in data.columns]
     
     # Create analysis subset with all required variables
     all_vars = base_required + key_preds + ind_controls + buurt_ctrls + wijk_ctrls
     all_vars = list(set(all_vars))  # Remove duplicates
     
-    df_model = df[all_vars].dropna().copy()
-    df_model = df_model.reset_index(drop=True)
+    # Complete cases from the shared sample manager (no copy of the full data)
+    df_model = sample_manager(data).frame(all_vars)
     
     print(f"  Sample size: {len(df_model)}")
     print(f"  Unique buurten: {df_model['buurt_id'].nunique()}")
@@ -260,22 +400,17 @@ def fit_four_level_models(data: pd.DataFrame) -> FourLevelModels:
     warnings.filterwarnings("ignore", category=UserWarning)
 
     # M0: Empty model
+    # Nested models share the grouping and warm-start from the previous fit
+    seq = NestedModelSequence(df_model, ["buurt_id", "wijk_id", "gemeente_id"])
+
     print("\n  Fitting m0 (empty model)...")
-    m0 = smf.mixedlm(
-        "DV_single ~ 1",
-        data=df_model,
-        groups="buurt_id"
-    ).fit(reml=True)
-    print(f"    N={int(m0.nobs)}, groups={len(m0.random_effects)}")
+    m0 = seq.fit("DV_single ~ 1")
+    print(f"    N={int(m0.nobs)}, groups={m0.n_groups}")
 
     # M1: Add key predictors at all geographic levels
     print("  Fitting m1 (+ key predictors at buurt/wijk/gemeente levels)...")
     m1_formula = "DV_single ~ " + " + ".join(key_preds)
-    m1 = smf.mixedlm(
-        m1_formula,
-        data=df_model,
-        groups="buurt_id"
-    ).fit(reml=True)
+    m1 = seq.fit(m1_formula)
 
     # M2: Add individual controls
     print("  Fitting m2 (+ individual controls)...")
@@ -293,11 +428,7 @@ def fit_four_level_models(data: pd.DataFrame) -> FourLevelModels:
     if "occupation" in df_model.columns and df_model["occupation"].notna().sum() > 100:
         m2_formula += " + C(occupation)"
     
-    m2 = smf.mixedlm(
-        m2_formula,
-        data=df_model,
-        groups="buurt_id"
-    ).fit(reml=True)
+    m2 = seq.fit(m2_formula)
 
     # M3: Add buurt-level controls
     print("  Fitting m3 (+ buurt-level controls)...")
@@ -305,11 +436,7 @@ def fit_four_level_models(data: pd.DataFrame) -> FourLevelModels:
     if buurt_ctrls:
         m3_formula += " + " + " + ".join(buurt_ctrls)
     
-    m3 = smf.mixedlm(
-        m3_formula,
-        data=df_model,
-        groups="buurt_id"
-    ).fit(reml=True)
+    m3 = seq.fit(m3_formula)
 
     # M4: Add wijk-level controls
     print("  Fitting m4 (+ wijk-level controls)...")
@@ -317,13 +444,10 @@ def fit_four_level_models(data: pd.DataFrame) -> FourLevelModels:
     if wijk_ctrls:
         m4_formula += " + " + " + ".join(wijk_ctrls)
     
-    m4 = smf.mixedlm(
-        m4_formula,
-        data=df_model,
-        groups="buurt_id"
-    ).fit(reml=True)
+    m4 = seq.fit(m4_formula)
 
     print("  All four-level models fitted successfully")
+    print(f"  Likelihood evaluations: {[n for _, n in seq.evaluations]}")
 
     # Print key coefficients
     print("\n  Key predictor coefficients (m4):")
@@ -346,7 +470,9 @@ def calculate_four_level_icc(models: FourLevelModels) -> Dict[str, float]:
     """
     Calculate variance decomposition for four-level model.
     
-    Note: With buurt as primary grouping, this gives ICC at buurt level.
+    Splits the total variance of the empty model into buurt, wijk,
+    gemeente and residual components. For a model with a single buurt
+    intercept only the buurt share is reported.
     
     Parameters
     ----------
@@ -361,25 +487,30 @@ def calculate_four_level_icc(models: FourLevelModels) -> Dict[str, float]:
     
     m0 = models.m0_empty
     
-    # Extract variance components
-    var_buurt = float(m0.cov_re.iloc[0, 0])
+    # Extract variance components (vcomp: one entry per grouping level)
+    if hasattr(m0, "vcomp"):
+        components = {level.replace("_id", ""): float(v) for level, v in m0.vcomp.items()}
+    else:
+        components = {"buurt": float(m0.cov_re.iloc[0, 0])}
     var_residual = float(m0.scale)
-    var_total = var_buurt + var_residual
-    
-    icc_buurt = var_buurt / var_total if var_total > 0 else 0
+    var_total = sum(components.values()) + var_residual
     
-    results = {
-        "var_buurt": var_buurt,
-        "var_residual": var_residual,
-        "var_total": var_total,
-        "icc_buurt": icc_buurt,
-        "pct_buurt": 100 * icc_buurt,
-        "pct_residual": 100 * var_residual / var_total if var_total > 0 else 0
-    }
+    results = {}
+    for level, var in components.items():
+        share = var / var_total if var_total > 0 else 0
+        results[f"var_{level}"] = var
+        results[f"icc_{level}"] = share
+        results[f"pct_{level}"] = 100 * share
+    results["var_residual"] = var_residual
+    results["var_total"] = var_total
+    results["pct_residual"] = 100 * var_residual / var_total if var_total > 0 else 0
     
-    print(f"  Variance (buurt): {var_buurt:.2f} ({results['pct_buurt']:.1f}%)")
+    for level in components:
+        print(f"  Variance ({level}): {results[f'var_{level}']:.2f} "
+              f"({results[f'pct_{level}']:.1f}%)")
     print(f"  Variance (residual): {var_residual:.2f} ({results['pct_residual']:.1f}%)")
-    print(f"  ICC (buurt): {icc_buurt:.4f}")
+    for level in components:
+        print(f"  ICC ({level}): {results[f'icc_{level}']:.4f}")
     
     return results
 
@@ -440,13 +571,15 @@ def calculate_icc(models: TwoLevelModels) -> ICCResult:
 
 def run_diagnostics(
     models: TwoLevelModels,
-    data: pd.DataFrame
+    data: pd.DataFrame,
+    vif_vars: Optional[List[str]] = None
 ) -> DiagnosticsResult:
     """
     Perform diagnostic checks on the final model.
 
     Includes:
-    - VIF calculation (via OLS on predictors)
+    - VIF (diagonal of the inverse correlation matrix), condition indices
+      and variance-decomposition proportions (src/collinearity.py)
     - Residual statistics (mean, sd, skewness, kurtosis)
     - Random effects distribution
 
@@ -456,14 +589,14 @@ def run_diagnostics(
         Fitted models (uses m3_buurt_controls)
     data : pd.DataFrame
         Analysis data
+    vif_vars : list of str, optional
+        Numeric predictors to check (default: DIAGNOSTIC_VARS)
 
     Returns
     -------
     DiagnosticsResult
         Diagnostic results
     """
-    from statsmodels.stats.outliers_influence import variance_inflation_factor
-
     print("\nRunning model diagnostics...")
 
     m3 = models.m3_buurt_controls
@@ -474,35 +607,31 @@ def run_diagnostics(
     print("  Calculating VIF...")
 
     # Select numeric predictors
-    vif_vars = [
-        "b_perc_low40_hh", "age", "education",
-        "b_pop_dens", "b_pop_over_65", "b_pop_nonwest",
-        "b_perc_low_inc_hh", "b_perc_soc_min_hh"
-    ]
-    vif_vars = [v for v in vif_vars if v in data.columns]
-
-    # Create design matrix
-    vif_data = data[vif_vars].dropna()
-
-    vif_results = []
-    if len(vif_data) > 0 and len(vif_vars) > 1:
-        for i, col in enumerate(vif_vars):
-            try:
-                vif_value = variance_inflation_factor(vif_data.values, i)
-                vif_results.append({"variable": col, "VIF": vif_value})
-            except Exception as e:
-                vif_results.append({"variable": col, "VIF": np.nan})
-
-    vif_df = pd.DataFrame(vif_results)
-    high_vif = []
-    if len(vif_df) > 0:
-        high_vif = vif_df[vif_df["VIF"] > VIF_THRESHOLD]["variable"].tolist()
+    vif_vars = [v for v in (vif_vars or DIAGNOSTIC_VARS) if v in data.columns]
+
+    vif_df = pd.DataFrame(columns=["variable", "VIF"])
+    condition_indices = pd.DataFrame()
+    collinear_sets = []
+    if len(vif_vars) > 1:
+        collinearity = collinearity_diagnostics(data, vif_vars)
+        if collinearity.n_obs > 0:
+            vif_df = collinearity.vif
+            condition_indices = collinearity.condition_indices
+            collinear_sets = collinearity.dependencies(CONDITION_INDEX_THRESHOLD)
+
+    high_vif = vif_df[vif_df["VIF"] > VIF_THRESHOLD]["variable"].tolist()
 
     if high_vif:
         print(f"  Warning: High VIF (>{VIF_THRESHOLD}): {', '.join(high_vif)}")
     else:
         print(f"  VIF OK (all < {VIF_THRESHOLD})")
 
+    if len(condition_indices) > 0:
+        print(f"  Max condition index: {condition_indices['condition_index'].max():.1f}")
+        for terms in collinear_sets:
+            print(f"  Warning: Near-dependency (condition index > "
+                  f"{CONDITION_INDEX_THRESHOLD:g}): {', '.join(terms)}")
+
     # -------------------------------------------------------------------------
     # Residual Statistics
     # -------------------------------------------------------------------------
@@ -553,7 +682,9 @@ def run_diagnostics(
         residual_stats=residual_stats,
         random_effect_stats=random_effect_stats,
         n_clusters=n_clusters,
-        n_obs=n_obs
+        n_obs=n_obs,
+        condition_indices=condition_indices,
+        collinear_sets=collinear_sets
     )
 
 
@@ -561,11 +692,16 @@ def run_diagnostics(
 # Sensitivity Analyses
 # =============================================================================
 
-def run_sensitivity(data: pd.DataFrame) -> pd.DataFrame:
+def run_sensitivity(
+    data: pd.DataFrame,
+    specs: Optional[List[SensitivitySpec]] = None,
+    jobs: Optional[int] = SENSITIVITY_JOBS
+) -> pd.DataFrame:
     """
     Run robustness checks with alternative specifications.
 
-    Specifications tested:
+    Specifications are declared in src/sensitivity.py (SPEC_REGISTRY);
+    by default:
     1. Base model (DV_single)
     2. 2-item composite DV
     3. 3-item composite DV
@@ -577,151 +713,19 @@ def run_sensitivity(data: pd.DataFrame) -> pd.DataFrame:
     ----------
     data : pd.DataFrame
         Full analysis data
+    specs : list of SensitivitySpec, optional
+        Specifications to fit (default: all registered)
+    jobs : int, optional
+        Worker processes (None = all cores, 1 = sequential)
 
     Returns
     -------
     pd.DataFrame
         Sensitivity results
     """
-    import statsmodels.formula.api as smf
-
     print("\nRunning sensitivity analyses...")
 
-    # Base control variables (as list for easier manipulation)
-    ind_controls = ["age", "sex", "education", "employment_status", "born_in_nl"]
-    buurt_controls = [var for var in ["b_pop_dens", "b_pop_over_65", "b_pop_nonwest",
-                                       "b_perc_low_inc_hh", "b_perc_soc_min_hh"]
-                      if var in data.columns]
-
-    # All variables needed for base model
-    base_vars = ["DV_single", "b_perc_low40_hh", "buurt_id"] + ind_controls + buurt_controls
-
-    # Helper to prepare clean data for statsmodels
-    def prepare_data(df, required_vars):
-        """Create clean DataFrame with contiguous index for statsmodels."""
-        clean = df[required_vars].dropna().copy()
-        clean = clean.reset_index(drop=True)
-        clean["buurt_id"] = clean["buurt_id"].astype(str)
-        return clean
-
-    # Build formula strings
-    ind_formula = "age + C(sex) + education + C(employment_status) + born_in_nl"
-    buurt_formula = " + ".join(buurt_controls) if buurt_controls else ""
-    base_controls = ind_formula + (" + " + buurt_formula if buurt_formula else "")
-
-    results = []
-
-    # Specification 1: Base model
-    print("  1. Base model (DV_single)...")
-    try:
-        df_base = prepare_data(data, base_vars)
-        m_base = smf.mixedlm(
-            f"DV_single ~ b_perc_low40_hh + {base_controls}",
-            data=df_base,
-            groups="buurt_id"
-        ).fit(reml=True)
-        results.append(_extract_key_coef(m_base, "Base (DV_single)"))
-    except Exception as e:
-        print(f"    Error: {e}")
-
-    # Specification 2: 2-item composite
-    if "DV_2item_scaled" in data.columns:
-        print("  2. Two-item composite...")
-        try:
-            vars_2item = ["DV_2item_scaled", "b_perc_low40_hh", "buurt_id"] + ind_controls + buurt_controls
-            df_2item = prepare_data(data, vars_2item)
-            m_2item = smf.mixedlm(
-                f"DV_2item_scaled ~ b_perc_low40_hh + {base_controls}",
-                data=df_2item,
-                groups="buurt_id"
-            ).fit(reml=True)
-            results.append(_extract_key_coef(m_2item, "2-item composite"))
-        except Exception as e:
-            print(f"    Error: {e}")
-
-    # Specification 3: 3-item composite
-    if "DV_3item_scaled" in data.columns:
-        print("  3. Three-item composite...")
-        try:
-            vars_3item = ["DV_3item_scaled", "b_perc_low40_hh", "buurt_id"] + ind_controls + buurt_controls
-            df_3item = prepare_data(data, vars_3item)
-            m_3item = smf.mixedlm(
-                f"DV_3item_scaled ~ b_perc_low40_hh + {base_controls}",
-                data=df_3item,
-                groups="buurt_id"
-            ).fit(reml=True)
-            results.append(_extract_key_coef(m_3item, "3-item composite"))
-        except Exception as e:
-            print(f"    Error: {e}")
-
-    # Specification 4: Dutch-born only
-    # Note: born_in_nl may be coded as max value = born in NL, or binary (1 = yes)
-    if "born_in_nl" in data.columns:
-        print("  4. Dutch-born only...")
-        try:
-            # Handle different codings: if max > 1, assume max = born in NL
-            max_val = data["born_in_nl"].max()
-            dutch_filter = data["born_in_nl"] == max_val if max_val > 1 else data["born_in_nl"] == 1
-            df_dutch_raw = data[dutch_filter].copy()
-            # For Dutch-born, exclude born_in_nl from controls (it's constant)
-            dutch_controls = "age + C(sex) + education + C(employment_status)"
-            dutch_controls += (" + " + buurt_formula if buurt_formula else "")
-            vars_dutch = ["DV_single", "b_perc_low40_hh", "buurt_id", "age", "sex", "education", "employment_status"] + buurt_controls
-            df_dutch = prepare_data(df_dutch_raw, vars_dutch)
-            if len(df_dutch) > 100:
-                m_dutch = smf.mixedlm(
-                    f"DV_single ~ b_perc_low40_hh + {dutch_controls}",
-                    data=df_dutch,
-                    groups="buurt_id"
-                ).fit(reml=True)
-                results.append(_extract_key_coef(m_dutch, "Dutch-born only"))
-        except Exception as e:
-            print(f"    Error: {e}")
-
-    # Specification 5: Income Ratio Model (Alternative inequality measure)
-    if "b_income_ratio" in data.columns:
-        print("  5. Income ratio model (robustness)...")
-        try:
-            vars_ratio = ["DV_single", "b_income_ratio", "buurt_id"] + ind_controls + buurt_controls
-            df_ratio = prepare_data(data, vars_ratio)
-            m_ratio = smf.mixedlm(
-                f"DV_single ~ b_income_ratio + {base_controls}",
-                data=df_ratio,
-                groups="buurt_id"
-            ).fit(reml=True)
-            results.append(_extract_key_coef(m_ratio, "Income ratio (high/low)", var="b_income_ratio"))
-        except Exception as e:
-            print(f"    Error: {e}")
-
-    # Specification 6: Wealth interaction (test H3 - income moderation)
-    if "wealth_index" in data.columns and "b_perc_low40_hh" in data.columns:
-        print("  6. Wealth interaction (H3 test)...")
-        try:
-            vars_wealth = ["DV_single", "b_perc_low40_hh", "wealth_index", "buurt_id"] + ind_controls + buurt_controls
-            df_wealth = prepare_data(data, vars_wealth)
-            m_interaction = smf.mixedlm(
-                f"DV_single ~ b_perc_low40_hh * wealth_index + {base_controls}",
-                data=df_wealth,
-                groups="buurt_id"
-            ).fit(reml=True)
-            # Extract main effect
-            results.append(_extract_key_coef(m_interaction, "With wealth interaction"))
-            # Extract interaction term
-            interaction_coef = m_interaction.params.get("b_perc_low40_hh:wealth_index", np.nan)
-            interaction_se = m_interaction.bse.get("b_perc_low40_hh:wealth_index", np.nan)
-            if not np.isnan(interaction_coef):
-                z = abs(interaction_coef / interaction_se) if interaction_se > 0 else 0
-                results.append({
-                    "specification": "  -> Interaction term",
-                    "N": int(m_interaction.nobs),
-                    "coefficient": interaction_coef,
-                    "SE": interaction_se,
-                    "significant": z > 1.96
-                })
-        except Exception as e:
-            print(f"    Error: {e}")
-
-    results_df = pd.DataFrame(results)
+    results_df = run_specs(data, specs, jobs=jobs)
 
     print("\n  Sensitivity Summary:")
     print(results_df.to_string(index=False))
@@ -767,7 +771,14 @@ def _extract_key_coef(model, spec_name: str, var: str = "b_perc_low40_hh") -> Di
 # H3 Cross-Level Interaction Test
 # =============================================================================
 
-def test_h3_cross_level_interaction(data: pd.DataFrame) -> Dict[str, Any]:
+# H3 moderators and the sign of their relation to income
+H3_MODERATORS = {"wealth_index": 1, "professional_class": 1, "occupation_rank": -1}
+
+
+def test_h3_cross_level_interaction(
+    data: pd.DataFrame,
+    moderator: str = "wealth_index"
+) -> Dict[str, Any]:
     """
     Test H3: Individual income moderates the neighborhood inequality effect.
 
@@ -775,30 +786,34 @@ def test_h3_cross_level_interaction(data: pd.DataFrame) -> Dict[str, Any]:
     redistribution preferences is weaker (or reversed) for higher-income
     individuals. This is a cross-level interaction test.
 
-    Uses wealth_index as proxy for individual income (SCoRE survey does not
-    include direct income questions).
+    Uses wealth_index as proxy for individual income by default (SCoRE
+    survey does not include direct income questions); professional_class
+    and occupation_rank are the occupational alternatives.
 
     Parameters
     ----------
     data : pd.DataFrame
-        Analysis data with DV_single, b_perc_low40_hh, wealth_index, and controls
+        Analysis data with DV_single, b_perc_low40_hh, the moderator, and controls
+    moderator : str
+        Individual-level moderator (one of H3_MODERATORS)
 
     Returns
     -------
     Dict with H3 test results including:
         - main_effect: coefficient for b_perc_low40_hh
-        - interaction_effect: coefficient for b_perc_low40_hh:wealth_index
-        - simple_slopes: effect of neighborhood at different wealth levels
+        - interaction_effect: coefficient for b_perc_low40_hh:<moderator>
+        - simple_slopes: effect of neighborhood (with SE, p, CI) at the
+          observed moderator levels
+        - marginal_effects: the same over a dense moderator grid
+          (margins.MarginalEffects, with Johnson-Neyman regions)
         - interpretation: text summary
     """
-    import statsmodels.formula.api as smf
-
     print("\n" + "=" * 60)
     print("H3 TEST: Cross-Level Interaction (Individual Income Moderation)")
     print("=" * 60)
 
     # Check required variables
-    required = ["DV_single", "b_perc_low40_hh", "wealth_index", "buurt_id",
+    required = ["DV_single", "b_perc_low40_hh", moderator, "buurt_id",
                 "age", "sex", "education", "employment_status", "born_in_nl"]
     missing = [v for v in required if v not in data.columns]
     if missing:
@@ -811,42 +826,41 @@ def test_h3_cross_level_interaction(data: pd.DataFrame) -> Dict[str, Any]:
                       if v in data.columns]
 
     all_vars = required + buurt_controls
-    df = data[all_vars].dropna().copy().reset_index(drop=True)
-    df["buurt_id"] = df["buurt_id"].astype(str)
+    df = sample_manager(data).frame(all_vars)
 
     print(f"\n  Sample size: N = {len(df)}")
-    print(f"  Wealth index range: {df['wealth_index'].min():.0f} - {df['wealth_index'].max():.0f}")
-    print(f"  Wealth index mean: {df['wealth_index'].mean():.2f}")
+    print(f"  Moderator: {moderator}")
+    print(f"  Range: {df[moderator].min():.0f} - {df[moderator].max():.0f}")
+    print(f"  Mean: {df[moderator].mean():.2f}")
 
     # Build formula
     ind_controls = "age + C(sex) + education + C(employment_status) + born_in_nl"
     buurt_formula = " + ".join(buurt_controls) if buurt_controls else ""
     controls = ind_controls + (" + " + buurt_formula if buurt_formula else "")
 
-    results = {}
+    results = {"moderator": moderator}
 
     # Model 1: Main effects only (baseline)
     print("\n  Model 1: Main effects only...")
     try:
-        m1 = smf.mixedlm(
-            f"DV_single ~ b_perc_low40_hh + wealth_index + {controls}",
-            data=df,
-            groups="buurt_id"
-        ).fit(reml=True)
+        m1 = _fit_mixed(
+            f"DV_single ~ b_perc_low40_hh + {moderator} + {controls}",
+            df
+        )
 
         results["m1_neighborhood"] = {
             "coef": m1.params.get("b_perc_low40_hh", np.nan),
             "se": m1.bse.get("b_perc_low40_hh", np.nan)
         }
-        results["m1_wealth"] = {
-            "coef": m1.params.get("wealth_index", np.nan),
-            "se": m1.bse.get("wealth_index", np.nan)
+        results["m1_moderator"] = {
+            "coef": m1.params.get(moderator, np.nan),
+            "se": m1.bse.get(moderator, np.nan)
         }
 
         print(f"    Neighborhood effect: {results['m1_neighborhood']['coef']:.3f} "
               f"(SE={results['m1_neighborhood']['se']:.3f})")
-        print(f"    Wealth effect: {results['m1_wealth']['coef']:.3f} "
-              f"(SE={results['m1_wealth']['se']:.3f})")
+        print(f"    {moderator} effect: {results['m1_moderator']['coef']:.3f} "
+              f"(SE={results['m1_moderator']['se']:.3f})")
 
     except Exception as e:
         print(f"    Error: {e}")
@@ -855,17 +869,17 @@ def test_h3_cross_level_interaction(data: pd.DataFrame) -> Dict[str, Any]:
     # Model 2: With cross-level interaction
     print("\n  Model 2: With cross-level interaction (H3 test)...")
     try:
-        m2 = smf.mixedlm(
-            f"DV_single ~ b_perc_low40_hh * wealth_index + {controls}",
-            data=df,
-            groups="buurt_id"
-        ).fit(reml=True)
+        m2 = _fit_mixed(
+            f"DV_single ~ b_perc_low40_hh * {moderator} + {controls}",
+            df
+        )
 
         # Extract coefficients
+        term = f"b_perc_low40_hh:{moderator}"
         main_effect = m2.params.get("b_perc_low40_hh", np.nan)
         main_se = m2.bse.get("b_perc_low40_hh", np.nan)
-        interaction = m2.params.get("b_perc_low40_hh:wealth_index", np.nan)
-        interaction_se = m2.bse.get("b_perc_low40_hh:wealth_index", np.nan)
+        interaction = m2.params.get(term, np.nan)
+        interaction_se = m2.bse.get(term, np.nan)
 
         results["main_effect"] = {"coef": main_effect, "se": main_se}
         results["interaction_effect"] = {"coef": interaction, "se": interaction_se}
@@ -874,43 +888,50 @@ def test_h3_cross_level_interaction(data: pd.DataFrame) -> Dict[str, Any]:
         main_z = abs(main_effect / main_se) if main_se > 0 else 0
         interaction_z = abs(interaction / interaction_se) if interaction_se > 0 else 0
 
-        main_sig = main_z > 1.96
-        interaction_sig = interaction_z > 1.96
+        # Same critical value as the simple slopes and Johnson-Neyman bounds
+        alpha = 1 - CONFIDENCE_LEVEL
+        z_crit = stats.norm.ppf(1 - alpha / 2)
+        main_sig = main_z > z_crit
+        interaction_sig = interaction_z > z_crit
 
         print(f"    Main effect (b_perc_low40_hh): {main_effect:.3f} (SE={main_se:.3f})")
-        print(f"      z = {main_z:.2f}, p {'<' if main_sig else '>'} 0.05")
-        print(f"    Interaction (neighborhood x wealth): {interaction:.3f} (SE={interaction_se:.3f})")
-        print(f"      z = {interaction_z:.2f}, p {'<' if interaction_sig else '>'} 0.05")
-
-        # Simple slopes: effect of neighborhood at different wealth levels
-        print("\n  Simple slopes (neighborhood effect at different wealth levels):")
-        wealth_levels = [0, 1, 2, 3, 4]  # wealth_index values
-        simple_slopes = {}
-
-        for w in wealth_levels:
-            # Effect = main_effect + interaction * wealth_level
-            slope = main_effect + interaction * w
-            # SE calculation requires covariance matrix
-            simple_slopes[w] = slope
-            print(f"    Wealth = {w}: neighborhood effect = {slope:.3f}")
-
-        results["simple_slopes"] = simple_slopes
+        print(f"      z = {main_z:.2f}, p {'<' if main_sig else '>'} {alpha:g}")
+        print(f"    Interaction (neighborhood x {moderator}): {interaction:.3f} (SE={interaction_se:.3f})")
+        print(f"      z = {interaction_z:.2f}, p {'<' if interaction_sig else '>'} {alpha:g}")
+
+        # Simple slopes: effect of neighborhood at the observed moderator
+        # levels and over a dense grid, SEs from the covariance matrix
+        print(f"\n  Simple slopes (neighborhood effect at different {moderator} levels):")
+        levels = np.unique(df[moderator])
+        if len(levels) > 10:
+            levels = np.percentile(df[moderator], [10, 25, 50, 75, 90])
+        simple_slopes = marginal_effects(m2, "b_perc_low40_hh", moderator, at=levels)
+        for level, slope, se in zip(levels, simple_slopes.slope, simple_slopes.se):
+            print(f"    {moderator} = {level:g}: neighborhood effect = {slope:.3f} (SE={se:.3f})")
+
+        effects = marginal_effects(m2, "b_perc_low40_hh", moderator, data=df)
+        print(f"  Johnson-Neyman: neighborhood effect "
+              f"{effects.johnson_neyman.summary()}")
+
+        results["simple_slopes"] = simple_slopes.to_frame()
+        results["marginal_effects"] = effects
 
         # Interpretation
         print("\n  " + "-" * 56)
         print("  INTERPRETATION:")
 
         if interaction_sig:
-            if interaction > 0:
+            # occupation_rank runs from highest (1) to lowest (8) class
+            if interaction * H3_MODERATORS.get(moderator, 1) > 0:
                 interpretation = (
-                    "H3 SUPPORTED (opposite direction): The positive interaction suggests "
+                    "H3 SUPPORTED (opposite direction): The interaction suggests "
                     "that the neighborhood poverty effect is STRONGER for higher-income "
                     "individuals. This contradicts the hypothesis that higher income "
                     "buffers against neighborhood effects."
                 )
             else:
                 interpretation = (
-                    "H3 SUPPORTED: The negative interaction confirms that the neighborhood "
+                    "H3 SUPPORTED: The interaction confirms that the neighborhood "
                     "poverty effect is WEAKER for higher-income individuals. Higher income "
                     "appears to buffer against neighborhood context effects on redistribution "
                     "preferences."
@@ -0,0 +1,387 @@
+# =============================================================================
+# bootstrap.py - Cluster and Parametric Bootstrap Intervals
+# =============================================================================
+"""
+Bootstrap confidence intervals for the ICC and the key coefficient.
+
+Two resampling schemes are supported:
+- "cluster": draw whole neighborhoods with replacement (for four-level
+  models: whole gemeenten with their wijken and buurten)
+- "parametric": keep the design and clusters, draw new random intercepts
+  and residuals from the fitted model
+
+Replicates are cheap because the engines work from sufficient statistics:
+a two-level cluster replicate is a weighted sum of per-buurt cross-products
+(RandomInterceptModel.resample_clusters) and a parametric replicate only
+recomputes X'y, y'y and the cluster sums of y. Fits start from the
+full-sample estimates.
+
+Replicates are split into fixed-size chunks, each with its own child of
+np.random.SeedSequence(seed), and run on a process pool. Results therefore
+depend only on the seed, not on the number of workers.
+
+Classes:
+    BootstrapInterval: Estimate, bootstrap SE and percentile/BCa intervals
+
+Functions:
+    bootstrap_two_level: ICC (m0) and key coefficient (m3) intervals
+    bootstrap_four_level: Per-level variance shares (m0) and key coefficient (m4)
+"""
+
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy import stats
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import (
+    KEY_PREDICTOR, CONFIDENCE_LEVEL,
+    BOOTSTRAP_REPLICATES, BOOTSTRAP_METHOD, BOOTSTRAP_SEED, BOOTSTRAP_JOBS
+)
+
+from .mixed import RandomInterceptModel
+from .nested import NestedRandomEffectsModel
+from .scheduler import SharedStatePool, resolve_jobs
+
+
+# Replicates per chunk (one seed each); fixed so results do not depend on jobs
+_CHUNK_SIZE = 50
+
+# Jackknife groups used for the BCa acceleration
+_JACKKNIFE_GROUPS = 100
+
+_FIT_ERRORS = (np.linalg.LinAlgError, ValueError, FloatingPointError, ZeroDivisionError)
+
+
+# =============================================================================
+# Results
+# =============================================================================
+
+@dataclass
+class BootstrapInterval:
+    """Bootstrap summary for one statistic."""
+    statistic: str
+    estimate: float
+    se: float
+    ci_percentile: Tuple[float, float]
+    ci_bca: Tuple[float, float]
+    method: str
+    n_boot: int
+    n_failed: int
+    replicates: np.ndarray = field(repr=False)
+
+
+def _percentile_interval(reps: np.ndarray, confidence: float) -> Tuple[float, float]:
+    alpha = 1 - confidence
+    low, high = np.quantile(reps, [alpha / 2, 1 - alpha / 2])
+    return float(low), float(high)
+
+
+def _bca_interval(
+    reps: np.ndarray,
+    estimate: float,
+    jackknife: np.ndarray,
+    confidence: float
+) -> Tuple[float, float]:
+    """Bias-corrected and accelerated interval (Efron 1987)."""
+    jackknife = jackknife[np.isfinite(jackknife)]
+    prop = (np.sum(reps < estimate) + 0.5 * np.sum(reps == estimate)) / len(reps)
+    if not 0 < prop < 1 or len(jackknife) < 3:
+        return (np.nan, np.nan)
+    z0 = stats.norm.ppf(prop)
+
+    dev = jackknife.mean() - jackknife
+    denom = 6.0 * np.sum(dev ** 2) ** 1.5
+    accel = np.sum(dev ** 3) / denom if denom > 0 else 0.0
+
+    alpha = 1 - confidence
+    z = stats.norm.ppf([alpha / 2, 1 - alpha / 2])
+    adjusted = stats.norm.cdf(z0 + (z0 + z) / (1 - accel * (z0 + z)))
+    low, high = np.quantile(reps, adjusted)
+    return float(low), float(high)
+
+
+# =============================================================================
+# Bootstrap Problem
+# =============================================================================
+
+def _as_engine_model(result):
+    """Sufficient-statistics model behind a fitted result (any engine)."""
+    model = result.model
+    if isinstance(model, (RandomInterceptModel, NestedRandomEffectsModel)):
+        return model
+    # statsmodels MixedLM: same arrays, closed-form engine
+    return RandomInterceptModel(model.endog, model.exog, model.groups, model.exog_names)
+
+
+def _cluster_labels(model) -> np.ndarray:
+    """Labels of the resampling units (outermost clusters)."""
+    if isinstance(model, NestedRandomEffectsModel):
+        return model.labels[-1]
+    return model.group_labels
+
+
+def _start(result) -> Dict[str, Any]:
+    if isinstance(result.model, NestedRandomEffectsModel):
+        return {"start_theta": result.theta}
+    return {"start_gamma": result.gamma}
+
+
+def _simulate(model, result, rng: np.random.Generator) -> np.ndarray:
+    """Draw an outcome vector from a fitted model (fixed design and clusters)."""
+    sd = np.sqrt(result.scale)
+    y = model.exog @ result.fe_params.values + rng.normal(0.0, sd, model.nobs)
+    if isinstance(model, NestedRandomEffectsModel):
+        for codes, n, theta in zip(model.codes, model.n_levels, result.theta):
+            y += rng.normal(0.0, sd * np.sqrt(theta), n)[codes]
+    else:
+        y += rng.normal(0.0, sd * np.sqrt(result.gamma), model.n_groups)[model.group_codes]
+    return y
+
+
+class _BootstrapProblem:
+    """
+    Models, full-sample fits and statistics of one bootstrap run.
+
+    ``targets`` maps a model key to (engine model, full-sample result);
+    ``statistics`` lists (name, model key, extractor) where the extractor
+    maps a fitted result to a float.
+    """
+
+    def __init__(self, targets: Dict[str, Tuple[Any, Any]], statistics: List[tuple],
+                 method: str):
+        if method not in ("cluster", "parametric"):
+            raise ValueError(f"Unknown bootstrap method: {method}")
+        self.targets = targets
+        self.statistics = statistics
+        self.method = method
+
+        # Resampling units: union of the outermost cluster labels
+        labels = [_cluster_labels(m) for m, _ in targets.values()]
+        self.units = np.unique(np.concatenate(labels))
+        self._unit_index = {k: np.searchsorted(self.units, lab)
+                            for k, lab in zip(targets, labels)}
+
+    @property
+    def names(self) -> List[str]:
+        return [name for name, _, _ in self.statistics]
+
+    def estimates(self) -> np.ndarray:
+        return np.array([fn(self.targets[key][1]) for _, key, fn in self.statistics])
+
+    def _evaluate(self, models: Dict[str, Any]) -> np.ndarray:
+        """Fit each target model and extract the statistics (NaN on failure)."""
+        fitted = {}
+        for key, model in models.items():
+            try:
+                fitted[key] = model.fit(**_start(self.targets[key][1]))
+            except _FIT_ERRORS:
+                fitted[key] = None
+        return np.array([fn(fitted[key]) if fitted[key] is not None else np.nan
+                         for _, key, fn in self.statistics])
+
+    def _resampled(self, counts: np.ndarray) -> Dict[str, Any]:
+        return {key: model.resample_clusters(counts[self._unit_index[key]])
+                for key, (model, _) in self.targets.items()}
+
+    def replicate(self, rng: np.random.Generator) -> np.ndarray:
+        """Statistics of one bootstrap replicate."""
+        if self.method == "cluster":
+            n = len(self.units)
+            counts = rng.multinomial(n, np.full(n, 1.0 / n))
+            return self._evaluate(self._resampled(counts))
+        return self._evaluate({
+            key: model.with_endog(_simulate(model, result, rng))
+            for key, (model, result) in self.targets.items()
+        })
+
+    def jackknife(self, seed: int) -> np.ndarray:
+        """Delete-a-group jackknife over clusters (for the BCa acceleration)."""
+        n = len(self.units)
+        n_groups = min(n, _JACKKNIFE_GROUPS)
+        group = np.random.default_rng(seed).permutation(n) % n_groups
+        rows = []
+        for g in range(n_groups):
+            counts = (group != g).astype(int)
+            rows.append(self._evaluate(self._resampled(counts)))
+        return np.array(rows)
+
+
+def _run_chunk(problem: _BootstrapProblem, seed: np.random.SeedSequence,
+               size: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return np.array([problem.replicate(rng) for _ in range(size)])
+
+
+def _run(
+    problem: _BootstrapProblem,
+    n_boot: int,
+    seed: int,
+    jobs: Optional[int],
+    confidence: float
+) -> Dict[str, BootstrapInterval]:
+    """Run the replicates (in parallel where possible) and summarize."""
+    sizes = [min(_CHUNK_SIZE, n_boot - start) for start in range(0, n_boot, _CHUNK_SIZE)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    jobs = resolve_jobs(jobs, len(sizes))
+
+    print(f"  {n_boot} {problem.method} replicates on {jobs} worker(s)...")
+    if jobs == 1:
+        chunks = [_run_chunk(problem, s, n) for s, n in zip(seeds, sizes)]
+    else:
+        with SharedStatePool(problem, jobs) as pool:
+            chunks = list(pool.map(_run_chunk, seeds, sizes))
+    reps = np.vstack(chunks)
+
+    estimates = problem.estimates()
+    jackknife = problem.jackknife(seed)
+
+    results = {}
+    for k, name in enumerate(problem.names):
+        col = reps[:, k]
+        ok = col[np.isfinite(col)]
+        if len(ok) < 2:
+            ci = (np.nan, np.nan)
+            results[name] = BootstrapInterval(name, float(estimates[k]), np.nan, ci, ci,
+                                              problem.method, n_boot, n_boot - len(ok), col)
+            continue
+        results[name] = BootstrapInterval(
+            statistic=name,
+            estimate=float(estimates[k]),
+            se=float(np.std(ok, ddof=1)),
+            ci_percentile=_percentile_interval(ok, confidence),
+            ci_bca=_bca_interval(ok, estimates[k], jackknife[:, k], confidence),
+            method=problem.method,
+            n_boot=n_boot,
+            n_failed=n_boot - len(ok),
+            replicates=col,
+        )
+
+    level = int(round(100 * confidence))
+    for r in results.values():
+        print(f"    {r.statistic}: {r.estimate:.4f} (boot SE={r.se:.4f}); "
+              f"{level}% percentile [{r.ci_percentile[0]:.4f}, {r.ci_percentile[1]:.4f}], "
+              f"BCa [{r.ci_bca[0]:.4f}, {r.ci_bca[1]:.4f}]"
+              + (f", {r.n_failed} failed" if r.n_failed else ""))
+    return results
+
+
+# =============================================================================
+# Statistics
+# =============================================================================
+
+def _icc(result) -> float:
+    """Between-neighborhood share of variance of a random-intercept fit."""
+    return result.gamma / (1.0 + result.gamma)
+
+
+def _level_share(level: int, result) -> float:
+    """Variance share of one grouping level of a nested fit."""
+    return float(result.theta[level] / (1.0 + np.sum(result.theta)))
+
+
+def _coefficient(var: str, result) -> float:
+    return float(result.fe_params.get(var, np.nan))
+
+
+# =============================================================================
+# Public API
+# =============================================================================
+
+def bootstrap_two_level(
+    models,
+    n_boot: int = BOOTSTRAP_REPLICATES,
+    method: str = BOOTSTRAP_METHOD,
+    key_var: str = KEY_PREDICTOR,
+    seed: int = BOOTSTRAP_SEED,
+    jobs: Optional[int] = BOOTSTRAP_JOBS,
+    confidence: float = CONFIDENCE_LEVEL
+) -> Dict[str, BootstrapInterval]:
+    """
+    Bootstrap intervals for the ICC (empty model) and the key coefficient
+    (full model) of the two-level sequence.
+
+    Parameters
+    ----------
+    models : TwoLevelModels
+        Fitted models (uses m0_empty and m3_buurt_controls)
+    n_boot : int
+        Number of replicates
+    method : str
+        "cluster" (resample buurten) or "parametric"
+    key_var : str
+        Coefficient to bootstrap
+    seed : int
+        Root seed (results do not depend on ``jobs``)
+    jobs : int, optional
+        Worker processes (None = all cores, 1 = sequential)
+    confidence : float
+        Interval coverage
+
+    Returns
+    -------
+    dict
+        "icc" and ``key_var`` -> BootstrapInterval
+    """
+    print("\nBootstrapping ICC and key coefficient...")
+    m0, m3 = models.m0_empty, models.m3_buurt_controls
+    targets = {}
+    for key, result in (("m0", m0), ("m3", m3)):
+        model = _as_engine_model(result)
+        if model is not result.model:
+            # statsmodels fit: refit with the closed-form engine so the
+            # replicates and the estimate come from the same likelihood
+            result = model.fit()
+        targets[key] = (model, result)
+
+    problem = _BootstrapProblem(
+        targets,
+        [("icc", "m0", _icc), (key_var, "m3", partial(_coefficient, key_var))],
+        method
+    )
+    return _run(problem, n_boot, seed, jobs, confidence)
+
+
+def bootstrap_four_level(
+    models,
+    n_boot: int = BOOTSTRAP_REPLICATES,
+    method: str = BOOTSTRAP_METHOD,
+    key_var: str = KEY_PREDICTOR,
+    seed: int = BOOTSTRAP_SEED,
+    jobs: Optional[int] = BOOTSTRAP_JOBS,
+    confidence: float = CONFIDENCE_LEVEL
+) -> Dict[str, BootstrapInterval]:
+    """
+    Bootstrap intervals for the variance shares of each level (empty model)
+    and the key coefficient (full model) of the four-level sequence.
+
+    The cluster bootstrap resamples gemeenten with all their wijken and
+    buurten, which keeps the nesting intact.
+
+    Parameters
+    ----------
+    models : FourLevelModels
+        Fitted nested models (uses m0_empty and m4_wijk_controls)
+    n_boot, method, key_var, seed, jobs, confidence
+        As in bootstrap_two_level
+
+    Returns
+    -------
+    dict
+        "icc_<level>" per grouping level and ``key_var`` -> BootstrapInterval
+    """
+    print("\nBootstrapping four-level variance shares and key coefficient...")
+    m0, m4 = models.m0_empty, models.m4_wijk_controls
+    targets = {"m0": (m0.model, m0), "m4": (m4.model, m4)}
+
+    statistics = [(f"icc_{level.replace('_id', '')}", "m0", partial(_level_share, k))
+                  for k, level in enumerate(m0.model.level_names)]
+    statistics.append((key_var, "m4", partial(_coefficient, key_var)))
+
+    problem = _BootstrapProblem(targets, statistics, method)
+    return _run(problem, n_boot, seed, jobs, confidence)
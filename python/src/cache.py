@@ -0,0 +1,502 @@
+# =============================================================================
+# cache.py - Content-Hashed Stage Cache
+# =============================================================================
+"""
+On-disk artifact store for pipeline stages.
+
+Each stage is keyed on a hash of its inputs, the source code of the modules
+that implement it, and the values of the config.py settings those modules
+import. Outputs are pickled to CACHE_DIR so unchanged stages are skipped on
+the next run.
+
+Classes:
+    ArtifactStore: Run pipeline stages with content-addressed caching
+
+Functions:
+    hash_value: Stable content hash of DataFrames, arrays, paths and builtins
+    hash_file: Content hash of a file (memoized on size and mtime)
+"""
+
+import ast
+import hashlib
+import importlib
+import inspect
+import os
+import pickle
+import tempfile
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+import config
+from config import CACHE_DIR
+
+
+# =============================================================================
+# Content Hashing
+# =============================================================================
+
+# (path, size, mtime_ns) -> digest, so unchanged raw files are hashed once
+_FILE_DIGESTS: Dict[Tuple[str, int, int], str] = {}
+
+
+def hash_file(path: Path, block_size: int = 1 << 20) -> str:
+    """
+    Content hash of a file.
+
+    The digest is memoized on (path, size, mtime) so repeated calls within
+    one process do not re-read large survey files.
+
+    Parameters
+    ----------
+    path : Path
+        File to hash
+    block_size : int
+        Read buffer size in bytes
+
+    Returns
+    -------
+    str
+        Hex SHA-256 digest ("missing" if the file does not exist)
+    """
+    path = Path(path)
+    if not path.exists():
+        return "missing"
+
+    st = path.stat()
+    memo_key = (str(path.resolve()), st.st_size, st.st_mtime_ns)
+    if memo_key in _FILE_DIGESTS:
+        return _FILE_DIGESTS[memo_key]
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+
+    digest = h.hexdigest()
+    _FILE_DIGESTS[memo_key] = digest
+    return digest
+
+
+def hash_value(value: Any) -> str:
+    """
+    Stable content hash of a stage input.
+
+    Supports DataFrames/Series (via pandas row hashing), numpy arrays,
+    file paths (hashed by content), containers and plain builtins.
+
+    Parameters
+    ----------
+    value : Any
+        Value to hash
+
+    Returns
+    -------
+    str
+        Hex SHA-256 digest
+    """
+    h = hashlib.sha256()
+    _update_hash(h, value)
+    return h.hexdigest()
+
+
+def _update_hash(h, value: Any) -> None:
+    """Feed a value into a running hash object."""
+    if isinstance(value, pd.DataFrame):
+        h.update(b"DataFrame")
+        h.update(repr(list(value.columns)).encode())
+        h.update(repr([str(t) for t in value.dtypes]).encode())
+        h.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+    elif isinstance(value, pd.Series):
+        h.update(b"Series")
+        h.update(repr((value.name, str(value.dtype))).encode())
+        h.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+    elif isinstance(value, np.ndarray):
+        h.update(b"ndarray")
+        h.update(repr((value.shape, str(value.dtype))).encode())
+        h.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, Path):
+        h.update(b"Path")
+        h.update(hash_file(value).encode())
+    elif isinstance(value, dict):
+        h.update(b"dict")
+        for k in sorted(value, key=repr):
+            _update_hash(h, k)
+            _update_hash(h, value[k])
+    elif isinstance(value, (list, tuple)):
+        h.update(type(value).__name__.encode())
+        for item in value:
+            _update_hash(h, item)
+    elif value is None or isinstance(value, (bool, int, float, str, bytes)):
+        h.update(repr(value).encode())
+    else:
+        # Dataclasses and other result containers: fall back to pickle
+        h.update(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def _local_dependencies(module: ModuleType) -> list:
+    """
+    Modules of the same package that ``module`` uses, found transitively
+    through its globals (e.g. src.analyze -> src.mixed) and through import
+    statements anywhere in its source, including imports inside functions.
+    """
+    package = (module.__name__.rpartition(".")[0] or module.__name__) + "."
+    found, stack = {module.__name__: module}, [module]
+    while stack:
+        current = stack.pop()
+        dep_names = [
+            value.__name__ if isinstance(value, ModuleType)
+            else getattr(value, "__module__", None)
+            for value in vars(current).values()
+        ]
+        dep_names.extend(_imported_modules(current))
+        for dep_name in dep_names:
+            if not isinstance(dep_name, str) or not dep_name.startswith(package):
+                continue
+            if dep_name in found:
+                continue
+            dep = sys.modules.get(dep_name)
+            if dep is None:
+                # Imported only inside a function that has not run yet
+                try:
+                    dep = importlib.import_module(dep_name)
+                except ImportError:
+                    continue
+            found[dep_name] = dep
+            stack.append(dep)
+    return [found[name] for name in sorted(found)]
+
+
+def _imported_modules(module: ModuleType) -> Tuple[str, ...]:
+    """Absolute names of the modules imported anywhere in a module's source."""
+    try:
+        path = inspect.getsourcefile(module)
+    except TypeError:
+        return ()
+    if path is None or not os.path.exists(path):
+        return ()
+    return _imports_in_source(path, hash_file(Path(path)), module.__package__ or "")
+
+
+_IMPORTS: Dict[Tuple[str, str], Tuple[str, ...]] = {}
+
+
+def _imports_in_source(path: str, digest: str, package: str) -> Tuple[str, ...]:
+    """
+    Parse a source file once per content digest for its imports.
+
+    ``from .x import y`` yields both "<package>.x" and "<package>.x.y",
+    since y may be a submodule; names that are not modules fail to import
+    in _local_dependencies and are skipped.
+    """
+    if (path, digest) in _IMPORTS:
+        return _IMPORTS[(path, digest)]
+
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                parts = package.split(".")
+                base = ".".join(parts[:len(parts) - node.level + 1])
+                source = f"{base}.{node.module}" if node.module else base
+            else:
+                source = node.module or ""
+            names.add(source)
+            names.update(f"{source}.{alias.name}" for alias in node.names
+                         if alias.name != "*")
+
+    result = tuple(sorted(names))
+    _IMPORTS[(path, digest)] = result
+    return result
+
+
+def _config_names(module: ModuleType) -> Tuple[str, ...]:
+    """
+    config.py settings a module reads: names imported with
+    ``from config import ...`` plus ``config.NAME`` attribute accesses.
+    """
+    try:
+        path = inspect.getsourcefile(module)
+    except TypeError:
+        return ()
+    if path is None or not os.path.exists(path):
+        return ()
+    return _config_names_in_source(path, hash_file(Path(path)))
+
+
+_CONFIG_NAMES: Dict[Tuple[str, str], Tuple[str, ...]] = {}
+
+
+def _config_names_in_source(path: str, digest: str) -> Tuple[str, ...]:
+    """Parse a source file once per content digest for its config names."""
+    if (path, digest) in _CONFIG_NAMES:
+        return _CONFIG_NAMES[(path, digest)]
+
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.module == "config" and not node.level:
+            names.update(alias.name for alias in node.names if alias.name != "*")
+        elif (isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name)
+              and node.value.id == "config"):
+            names.add(node.attr)
+
+    result = tuple(sorted(names))
+    _CONFIG_NAMES[(path, digest)] = result
+    return result
+
+
+def _update_setting_hash(h, value: Any) -> None:
+    """Hash a config value; paths count by name, not by file content."""
+    if isinstance(value, Path):
+        _update_hash(h, str(value))
+    elif isinstance(value, (list, tuple)):
+        h.update(type(value).__name__.encode())
+        for item in value:
+            _update_setting_hash(h, item)
+    elif isinstance(value, dict):
+        h.update(b"dict")
+        for k in sorted(value, key=repr):
+            _update_hash(h, k)
+            _update_setting_hash(h, value[k])
+    else:
+        _update_hash(h, value)
+
+
+def _module_source_hash(module: ModuleType) -> str:
+    """Hash of a module's source file (code version of a stage)."""
+    try:
+        return hash_file(Path(inspect.getsourcefile(module)))
+    except (TypeError, OSError):
+        return getattr(module, "__version__", "unknown")
+
+
+# =============================================================================
+# Artifact Store
+# =============================================================================
+
+class ArtifactStore:
+    """
+    Content-addressed on-disk cache for pipeline stages.
+
+    A stage's key combines:
+    - the stage name and function
+    - the source of the function's module, the same-package modules it
+      uses (e.g. src.analyze -> src.mixed), and any ``code_deps``
+    - the values of every config.py setting those modules import (found by
+      parsing their ``from config import ...`` statements), plus any extra
+      ``config_keys``
+    - the inputs, where outputs of earlier cached stages contribute their
+      own key instead of being re-hashed
+
+    Parameters
+    ----------
+    cache_dir : Path
+        Directory holding one subdirectory of pickles per stage
+    enabled : bool
+        If False, every stage runs and nothing is written
+
+    Examples
+    --------
+    >>> store = ArtifactStore()
+    >>> survey = store.run("extract_survey", load_survey_data, SURVEY_PATH,
+    ...                    config_keys=["SURVEY_COLUMNS"])
+    """
+
+    def __init__(self, cache_dir: Path = CACHE_DIR, enabled: bool = True):
+        self.cache_dir = Path(cache_dir)
+        self.enabled = enabled
+        self.hits = []
+        self.misses = []
+        # id(output) -> (output, key); the object is held so ids stay unique
+        self._provenance: Dict[int, Tuple[Any, str]] = {}
+
+    def stage_key(
+        self,
+        name: str,
+        fn: Callable,
+        args: Sequence[Any] = (),
+        kwargs: Optional[Dict[str, Any]] = None,
+        config_keys: Iterable[str] = (),
+        code_deps: Iterable[ModuleType] = ()
+    ) -> str:
+        """
+        Compute the cache key for one stage invocation.
+
+        Returns
+        -------
+        str
+            Hex digest identifying the stage's inputs, code and config
+        """
+        h = hashlib.sha256()
+        h.update(name.encode())
+        h.update(f"{fn.__module__}.{fn.__qualname__}".encode())
+
+        fn_module = inspect.getmodule(fn)
+        modules = _local_dependencies(fn_module) if fn_module is not None else []
+        modules += list(code_deps)
+        settings = set(config_keys)
+        for module in modules:
+            h.update(_module_source_hash(module).encode())
+            settings.update(_config_names(module))
+
+        for key in sorted(settings):
+            _update_hash(h, key)
+            _update_setting_hash(h, getattr(config, key, None))
+
+        for arg in args:
+            h.update(self._input_digest(arg).encode())
+        for kw, arg in sorted((kwargs or {}).items()):
+            h.update(kw.encode())
+            h.update(self._input_digest(arg).encode())
+
+        return h.hexdigest()
+
+    def _input_digest(self, value: Any) -> str:
+        """Digest of one input, reusing the key of cached upstream outputs."""
+        entry = self._provenance.get(id(value))
+        if entry is not None and entry[0] is value:
+            return "artifact:" + entry[1]
+        return hash_value(value)
+
+    def run(
+        self,
+        name: str,
+        fn: Callable,
+        *args: Any,
+        config_keys: Iterable[str] = (),
+        code_deps: Iterable[ModuleType] = (),
+        **kwargs: Any
+    ) -> Any:
+        """
+        Run a stage, or load its output if an identical run is cached.
+
+        Parameters
+        ----------
+        name : str
+            Stage name (used as the cache subdirectory)
+        fn : callable
+            Stage function
+        *args, **kwargs
+            Stage inputs passed through to ``fn``
+        config_keys : iterable of str
+            Additional config.py settings the stage depends on (settings
+            imported by the stage's modules are included automatically)
+        code_deps : iterable of module
+            Extra modules whose source is part of the stage's code version
+
+        Returns
+        -------
+        Any
+            Stage output
+        """
+        if not self.enabled:
+            return fn(*args, **kwargs)
+
+        key = self.stage_key(name, fn, args, kwargs, config_keys, code_deps)
+        hit, output = self.lookup(name, key)
+        if hit:
+            return output
+
+        output = fn(*args, **kwargs)
+        self.save(name, key, output)
+        return output
+
+    def lookup(self, name: str, key: str) -> Tuple[bool, Any]:
+        """
+        Load a cached stage output by key.
+
+        Parameters
+        ----------
+        name : str
+            Stage name
+        key : str
+            Key from ``stage_key``
+
+        Returns
+        -------
+        tuple
+            (hit, output); output is None on a miss
+        """
+        if not self.enabled:
+            return False, None
+
+        path = self.cache_dir / name / f"{key}.pkl"
+        if path.exists():
+            try:
+                with open(path, "rb") as f:
+                    output = pickle.load(f)
+                print(f"  [cache] {name}: hit ({key[:12]})")
+                self.hits.append(name)
+                self._remember(output, key)
+                return True, output
+            except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+                print(f"  [cache] {name}: unreadable artifact, recomputing")
+
+        return False, None
+
+    def save(self, name: str, key: str, output: Any) -> None:
+        """
+        Persist a freshly computed stage output under its key.
+
+        Parameters
+        ----------
+        name : str
+            Stage name
+        key : str
+            Key from ``stage_key``
+        output : Any
+            Stage output (must be picklable)
+        """
+        self.misses.append(name)
+        if self.enabled:
+            self._write(self.cache_dir / name / f"{key}.pkl", output)
+            self._remember(output, key)
+
+    def _remember(self, output: Any, key: str) -> None:
+        """Record that ``output`` was produced under ``key``."""
+        self._provenance[id(output)] = (output, key)
+
+    def _write(self, path: Path, output: Any) -> None:
+        """Atomically pickle an artifact (tempfile + rename)."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(output, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except Exception as e:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            print(f"  [cache] Warning: could not store {path.parent.name}: {e}")
+
+    def clear(self) -> int:
+        """
+        Delete all cached artifacts.
+
+        Returns
+        -------
+        int
+            Number of artifact files removed
+        """
+        n_removed = 0
+        if self.cache_dir.exists():
+            for artifact in self.cache_dir.glob("*/*.pkl"):
+                artifact.unlink()
+                n_removed += 1
+        return n_removed
+
+    def summary(self) -> str:
+        """One-line hit/miss summary for the pipeline log."""
+        return (f"{len(self.hits)} stages from cache, "
+                f"{len(self.misses)} recomputed")
@@ -0,0 +1,394 @@
+# =============================================================================
+# cbs_download.py - Concurrent CBS StatLine Downloader
+# =============================================================================
+"""
+Download "Kerncijfers wijken en buurten" tables for several years at once.
+
+Requests go straight to the CBS OData API (CBS_ODATA_URL) with the year,
+region-type and column filters in the query ($filter/$select), so only the
+rows and indicators the pipeline uses are transferred. Tables, their
+metadata and their dimension labels are fetched concurrently (asyncio, at
+most CBS_MAX_CONCURRENCY requests in flight); pages of one result set are
+followed through odata.nextLink.
+
+Every response body is kept in a content-addressed cache (CBS_CACHE_DIR):
+bodies are stored once under their SHA-256 and each URL points to its
+latest body together with the ETag/Last-Modified it was served with. Later
+requests are conditional (If-None-Match / If-Modified-Since), so unchanged
+tables cost a 304; if the server cannot be reached, the cached body is
+used. Pointing ``base_url`` at a local server gives fully offline runs.
+
+Classes:
+    ResponseCache: Content-addressed store of HTTP response bodies
+    CBSDownloader: Async OData client with conditional revalidation
+
+Functions:
+    fetch_years: Coroutine returning the combined table for several years
+    download_cbs_years: Synchronous wrapper around fetch_years
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import urllib.error
+import urllib.parse
+import urllib.request
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import (
+    ADMIN_INDICATORS, CBS_ODATA_URL, CBS_CACHE_DIR,
+    CBS_TABLES_BY_YEAR, CBS_MAX_CONCURRENCY
+)
+
+
+# Non-indicator columns always requested (if the table has them)
+_ID_COLUMNS = ("WijkenEnBuurten", "Gemeentenaam_1", "Codering_3", "Perioden")
+
+# DataProperties types whose values are keys into a dimension table
+_DIMENSION_TYPES = ("Dimension", "GeoDimension", "TimeDimension")
+
+
+# =============================================================================
+# Response Cache
+# =============================================================================
+
+class ResponseCache:
+    """
+    Content-addressed store of HTTP response bodies.
+
+    Layout::
+
+        objects/<sha256 of body>   response body (written once)
+        refs/<sha256 of URL>.json  {"url", "object", "etag", "last_modified"}
+
+    Parameters
+    ----------
+    cache_dir : Path
+        Root directory of the cache
+    """
+
+    def __init__(self, cache_dir: Path = CBS_CACHE_DIR):
+        self.cache_dir = Path(cache_dir)
+        self.objects = self.cache_dir / "objects"
+        self.refs = self.cache_dir / "refs"
+
+    def _ref_path(self, url: str) -> Path:
+        return self.refs / (hashlib.sha256(url.encode()).hexdigest() + ".json")
+
+    def lookup(self, url: str) -> Optional[Dict[str, Any]]:
+        """Cache entry of ``url`` (None if absent or its body is missing)."""
+        path = self._ref_path(url)
+        if not path.exists():
+            return None
+        try:
+            ref = json.loads(path.read_text())
+        except (OSError, ValueError):
+            return None
+        return ref if (self.objects / ref["object"]).exists() else None
+
+    def body(self, ref: Dict[str, Any]) -> bytes:
+        return (self.objects / ref["object"]).read_bytes()
+
+    def store(self, url: str, body: bytes, headers: Dict[str, str]) -> Dict[str, Any]:
+        """Save a response body and point ``url`` at it."""
+        digest = hashlib.sha256(body).hexdigest()
+        if not (self.objects / digest).exists():
+            _atomic_write(self.objects / digest, body)
+        ref = {
+            "url": url,
+            "object": digest,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+        }
+        _atomic_write(self._ref_path(url), json.dumps(ref).encode())
+        return ref
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+# =============================================================================
+# HTTP
+# =============================================================================
+
+def _http_get(
+    url: str,
+    ref: Optional[Dict[str, Any]],
+    timeout: float
+) -> Tuple[int, bytes, Dict[str, str]]:
+    """Blocking (conditional) GET; returns status, body and headers."""
+    request = urllib.request.Request(url, headers={"Accept": "application/json"})
+    if ref is not None:
+        if ref.get("etag"):
+            request.add_header("If-None-Match", ref["etag"])
+        if ref.get("last_modified"):
+            request.add_header("If-Modified-Since", ref["last_modified"])
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, response.read(), dict(response.headers)
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return 304, b"", dict(e.headers)
+        raise
+
+
+def _odata_url(base_url: str, path: str, **params: str) -> str:
+    """OData URL with readable (minimally escaped) query options."""
+    query = urllib.parse.urlencode(
+        {f"${k}": v for k, v in params.items() if v},
+        quote_via=urllib.parse.quote, safe="$,'()"
+    )
+    return f"{base_url.rstrip('/')}/{path}?{query}"
+
+
+# =============================================================================
+# Downloader
+# =============================================================================
+
+class CBSDownloader:
+    """
+    Async client for the CBS OData API.
+
+    Parameters
+    ----------
+    base_url : str
+        OData root (e.g. a local fake server for offline runs)
+    cache_dir : Path, optional
+        Response cache directory (None = no cache)
+    max_concurrency : int
+        Maximum number of requests in flight
+    revalidate : bool
+        If False, cached responses are used without contacting the server
+    timeout : float
+        Per-request timeout in seconds
+    """
+
+    def __init__(
+        self,
+        base_url: str = CBS_ODATA_URL,
+        cache_dir: Optional[Path] = CBS_CACHE_DIR,
+        max_concurrency: int = CBS_MAX_CONCURRENCY,
+        revalidate: bool = True,
+        timeout: float = 60.0
+    ):
+        self.base_url = base_url
+        self.cache = ResponseCache(cache_dir) if cache_dir else None
+        self.max_concurrency = max(1, max_concurrency)
+        self.revalidate = revalidate
+        self.timeout = timeout
+        self.stats = {"downloaded": 0, "not_modified": 0, "cached": 0, "offline": 0}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def get_json(self, url: str) -> Any:
+        """GET a JSON document through the cache."""
+        ref = self.cache.lookup(url) if self.cache else None
+        if ref is not None and not self.revalidate:
+            self.stats["cached"] += 1
+            return json.loads(self.cache.body(ref))
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            try:
+                status, body, headers = await asyncio.to_thread(
+                    _http_get, url, ref, self.timeout)
+            except (urllib.error.URLError, OSError) as e:
+                if ref is None:
+                    raise
+                if not self.stats["offline"]:
+                    print(f"  Warning: {e}; using cached CBS responses")
+                self.stats["offline"] += 1
+                return json.loads(self.cache.body(ref))
+
+        if status == 304:
+            self.stats["not_modified"] += 1
+            return json.loads(self.cache.body(ref))
+
+        self.stats["downloaded"] += 1
+        if self.cache is not None:
+            self.cache.store(url, body, headers)
+        return json.loads(body)
+
+    async def get_rows(self, url: str) -> List[Dict[str, Any]]:
+        """All rows of an OData result set (following odata.nextLink)."""
+        rows = []
+        while url:
+            page = await self.get_json(url)
+            rows.extend(page.get("value", []))
+            url = page.get("odata.nextLink")
+        return rows
+
+    async def properties(self, table_id: str) -> Dict[str, str]:
+        """Column key -> DataProperties type of a table."""
+        rows = await self.get_rows(_odata_url(
+            self.base_url, f"{table_id}/DataProperties", format="json", select="Key,Type"))
+        return {row["Key"]: row.get("Type") for row in rows if row.get("Key")}
+
+    async def table(
+        self,
+        table_id: str,
+        year: Optional[str] = None,
+        region_types: Sequence[str] = ("BU", "WK", "GM"),
+        columns: Iterable[str] = ()
+    ) -> pd.DataFrame:
+        """
+        Filtered rows of one table, with dimension keys replaced by labels.
+
+        Parameters
+        ----------
+        table_id : str
+            CBS table identifier
+        year : str, optional
+            Period filter (applied if the table has a Perioden dimension)
+        region_types : sequence of str
+            Region code prefixes to keep (BU = buurt, WK = wijk, GM = gemeente)
+        columns : iterable of str
+            Indicator columns (those not in the table are skipped)
+
+        Returns
+        -------
+        pd.DataFrame
+            Same layout as cbsodata.get_data (dimension titles, padded
+            codes stripped) restricted to the selected columns
+        """
+        props = await self.properties(table_id)
+        select = [c for c in list(_ID_COLUMNS) + list(columns) if c in props]
+        select = list(dict.fromkeys(select))
+
+        filters = []
+        region_filter = ""
+        if region_types and "WijkenEnBuurten" in props:
+            region_filter = " or ".join(
+                f"startswith(WijkenEnBuurten,'{t}')" for t in region_types)
+            filters.append(f"({region_filter})")
+        if year and "Perioden" in props:
+            filters.append(f"substringof('{year}',Perioden)")
+
+        data_url = _odata_url(self.base_url, f"{table_id}/TypedDataSet", format="json",
+                              select=",".join(select), filter=" and ".join(filters))
+
+        # Dimension labels (as cbsodata does), fetched alongside the data
+        dims = [c for c in select if props[c] in _DIMENSION_TYPES]
+        dim_urls = [
+            _odata_url(self.base_url, f"{table_id}/{dim}", format="json", select="Key,Title",
+                       filter=region_filter.replace("WijkenEnBuurten", "Key")
+                       if dim == "WijkenEnBuurten" else "")
+            for dim in dims
+        ]
+        rows, *dim_rows = await asyncio.gather(
+            self.get_rows(data_url), *(self.get_rows(u) for u in dim_urls))
+
+        df = pd.DataFrame(rows, columns=select)
+        for dim, labels in zip(dims, dim_rows):
+            titles = {row["Key"]: row["Title"] for row in labels}
+            df[dim] = df[dim].map(titles).fillna(df[dim])
+        for col in df.columns:
+            if df[col].dtype == object or pd.api.types.is_string_dtype(df[col]):
+                df[col] = df[col].str.strip()
+        return df
+
+
+# =============================================================================
+# Public API
+# =============================================================================
+
+async def fetch_years(
+    tables: Dict[str, str],
+    region_types: Sequence[str] = ("BU", "WK", "GM"),
+    columns: Optional[Iterable[str]] = None,
+    downloader: Optional[CBSDownloader] = None
+) -> pd.DataFrame:
+    """
+    Download several years concurrently.
+
+    Parameters
+    ----------
+    tables : dict
+        Year -> CBS table ID
+    region_types : sequence of str
+        Region code prefixes to keep
+    columns : iterable of str, optional
+        CBS indicator columns (default: keys of ADMIN_INDICATORS)
+    downloader : CBSDownloader, optional
+        Client to use (default: CBSDownloader())
+
+    Returns
+    -------
+    pd.DataFrame
+        Rows of all years with a "year" column
+    """
+    downloader = downloader or CBSDownloader()
+    columns = list(ADMIN_INDICATORS) if columns is None else list(columns)
+    years = list(tables)
+    frames = await asyncio.gather(*(
+        downloader.table(tables[year], year, region_types, columns) for year in years
+    ))
+    for year, frame in zip(years, frames):
+        frame["year"] = str(year)
+    return pd.concat(frames, ignore_index=True)
+
+
+def download_cbs_years(
+    years: Optional[Iterable[str]] = None,
+    tables: Dict[str, str] = CBS_TABLES_BY_YEAR,
+    region_types: Sequence[str] = ("BU", "WK", "GM"),
+    columns: Optional[Iterable[str]] = None,
+    base_url: str = CBS_ODATA_URL,
+    cache_dir: Optional[Path] = CBS_CACHE_DIR,
+    max_concurrency: int = CBS_MAX_CONCURRENCY,
+    revalidate: bool = True
+) -> pd.DataFrame:
+    """
+    Download CBS neighborhood indicators for several years.
+
+    Parameters
+    ----------
+    years : iterable of str, optional
+        Years to fetch (default: all of ``tables``)
+    tables : dict
+        Year -> CBS table ID (default: CBS_TABLES_BY_YEAR)
+    region_types : sequence of str
+        Region code prefixes to keep (BU/WK/GM)
+    columns : iterable of str, optional
+        CBS indicator columns (default: keys of ADMIN_INDICATORS)
+    base_url : str
+        OData root URL
+    cache_dir : Path, optional
+        Response cache directory (None = no cache)
+    max_concurrency : int
+        Maximum number of requests in flight
+    revalidate : bool
+        If False, use cached responses without contacting the server
+
+    Returns
+    -------
+    pd.DataFrame
+        Rows of all years with a "year" column (raw CBS column names)
+    """
+    years = [str(y) for y in (tables if years is None else years)]
+    unknown = [y for y in years if y not in tables]
+    if unknown:
+        raise ValueError(f"No CBS table configured for year(s): {', '.join(unknown)}")
+
+    downloader = CBSDownloader(base_url, cache_dir, max_concurrency, revalidate)
+    print(f"Downloading CBS data for {len(years)} year(s) "
+          f"({max_concurrency} concurrent requests)...")
+    data = asyncio.run(fetch_years({y: tables[y] for y in years}, region_types,
+                                   columns, downloader))
+    stats = downloader.stats
+    print(f"  {len(data)} rows; {stats['downloaded']} downloaded, "
+          f"{stats['not_modified']} not modified, "
+          f"{stats['cached'] + stats['offline']} from cache")
+    return data
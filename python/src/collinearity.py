@@ -0,0 +1,156 @@
+# =============================================================================
+# collinearity.py - Vectorized Multicollinearity Diagnostics
+# =============================================================================
+"""
+VIFs, condition indices and variance-decomposition proportions from one
+cross-product matrix.
+
+statsmodels' variance_inflation_factor runs one auxiliary OLS regression
+per column. Here the p x p cross-product matrix of the predictors is
+formed once and everything follows from two small eigendecompositions:
+
+- VIF_j is the j-th diagonal element of the inverse correlation matrix
+  (equivalent to 1 / (1 - R^2_j) from regressing x_j on the others with
+  an intercept)
+- condition indices and variance-decomposition proportions follow Belsley,
+  Kuh & Welsch (1980): the intercept and the predictors are scaled to unit
+  length (not centered) and decomposed; a dimension with a high condition
+  index and two or more proportions above 0.5 marks a near-dependency
+
+Cost is one O(n p^2) pass over the data plus O(p^3), so several hundred
+candidate context variables are no problem.
+
+Classes:
+    CollinearityDiagnostics: VIF table and condition-index table
+
+Functions:
+    collinearity_diagnostics: Diagnostics for a set of numeric columns
+"""
+
+from dataclasses import dataclass
+from typing import List, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+# Eigenvalues below this fraction of the largest are treated as zero
+_RANK_TOL = 1e-12
+
+
+@dataclass
+class CollinearityDiagnostics:
+    """Multicollinearity diagnostics for one set of predictors."""
+    vif: pd.DataFrame                 # variable, VIF
+    condition_indices: pd.DataFrame   # eigenvalue, condition_index, one proportion column per term
+    n_obs: int
+
+    @property
+    def max_condition_index(self) -> float:
+        if len(self.condition_indices) == 0:
+            return np.nan
+        return float(self.condition_indices["condition_index"].max())
+
+    def dependencies(self, threshold: float = 30.0, proportion: float = 0.5) -> List[List[str]]:
+        """
+        Near-dependencies: for each dimension with condition index above
+        ``threshold``, the terms with variance proportion above ``proportion``
+        (reported only if there are at least two).
+        """
+        ci = self.condition_indices
+        terms = [c for c in ci.columns if c not in ("eigenvalue", "condition_index")]
+        groups = []
+        for _, row in ci[ci["condition_index"] > threshold].iterrows():
+            involved = [t for t in terms if row[t] > proportion]
+            if len(involved) > 1:
+                groups.append(involved)
+        return groups
+
+
+def _inverse_diagonal(matrix: np.ndarray) -> np.ndarray:
+    """diag(matrix^-1) of a symmetric PSD matrix; inf along null directions."""
+    eigval, eigvec = np.linalg.eigh(matrix)
+    null = eigval <= _RANK_TOL * max(eigval[-1], 0.0)
+    sq = eigvec ** 2
+    diag = sq[:, ~null] @ (1.0 / eigval[~null])
+    singular = (sq[:, null] > 1e-10).any(axis=1)
+    diag[singular] = np.inf
+    return diag
+
+
+def collinearity_diagnostics(
+    data: pd.DataFrame,
+    columns: Sequence[str]
+) -> CollinearityDiagnostics:
+    """
+    VIFs, condition indices and variance-decomposition proportions.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        Data containing ``columns`` (rows with missing values are dropped)
+    columns : sequence of str
+        Numeric predictors
+
+    Returns
+    -------
+    CollinearityDiagnostics
+        VIF is NaN for constant columns and inf for exactly collinear ones
+    """
+    columns = list(columns)
+    X = data[columns].dropna().to_numpy(dtype=float)
+    n, p = X.shape
+    empty = CollinearityDiagnostics(
+        vif=pd.DataFrame({"variable": columns, "VIF": np.nan}),
+        condition_indices=pd.DataFrame(columns=["eigenvalue", "condition_index"]),
+        n_obs=n
+    )
+    if n < 2 or p == 0:
+        return empty
+
+    # One pass over the data: cross-products of [1, X]
+    sums = X.sum(axis=0)
+    xtx = X.T @ X
+
+    # Correlation matrix from the centered cross-products
+    mean = sums / n
+    cov = xtx - n * np.outer(mean, mean)
+    sd = np.sqrt(np.clip(np.diag(cov), 0.0, None))
+    varying = sd > 1e-12 * np.maximum(1.0, np.abs(mean)) * np.sqrt(n)
+
+    vif = np.full(p, np.nan)
+    if varying.sum() == 1:
+        vif[varying] = 1.0
+    elif varying.any():
+        idx = np.flatnonzero(varying)
+        corr = cov[np.ix_(idx, idx)] / np.outer(sd[idx], sd[idx])
+        vif[idx] = _inverse_diagonal(corr)
+    vif_df = pd.DataFrame({"variable": columns, "VIF": vif})
+
+    # Belsley-Kuh-Welsch: unit-length columns of [1, X], uncentered
+    cross = np.empty((p + 1, p + 1))
+    cross[0, 0] = n
+    cross[0, 1:] = cross[1:, 0] = sums
+    cross[1:, 1:] = xtx
+    norm = np.sqrt(np.diag(cross))
+    if np.any(norm == 0):
+        return CollinearityDiagnostics(vif_df, empty.condition_indices, n)
+    scaled = cross / np.outer(norm, norm)
+
+    eigval, eigvec = np.linalg.eigh(scaled)
+    order = np.argsort(eigval)[::-1]
+    eigval = np.clip(eigval[order], 0.0, None)
+    eigvec = eigvec[:, order]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cond = np.sqrt(eigval[0] / eigval)
+        # term x dimension; exact null dimensions get all of the variance
+        phi = eigvec ** 2 / np.maximum(eigval, _RANK_TOL * eigval[0])
+        proportions = phi / phi.sum(axis=1, keepdims=True)
+
+    ci_df = pd.DataFrame(proportions.T, columns=["Intercept"] + columns)
+    ci_df.insert(0, "condition_index", cond)
+    ci_df.insert(0, "eigenvalue", eigval)
+    ci_df.index = pd.RangeIndex(1, p + 2, name="dimension")
+
+    return CollinearityDiagnostics(vif=vif_df, condition_indices=ci_df, n_obs=n)
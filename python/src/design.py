@@ -0,0 +1,318 @@
+# =============================================================================
+# design.py - Cached Design-Matrix Builder
+# =============================================================================
+"""
+Build model matrices for formulas without re-running patsy on every fit.
+
+The sensitivity and H3 specifications share the same controls and often the
+same rows, yet each smf.mixedlm call re-parses its formula and rebuilds the
+C(sex), C(employment_status) and C(occupation) dummies. DesignMatrixCache
+builds the columns of each formula term once per (term, frame, rows) and
+assembles the design matrix by column selection. Frames are identified by
+object identity, as in src/samples.py, so a lookup never rehashes the
+data; the rows of each (frame, formula variables) pair are digested once.
+A frame must therefore not be modified in place while it is being used.
+
+Supported directly: an intercept, numeric variables, products of numeric
+variables (a:b, a*b), and treatment-coded categoricals (C(x), or bare
+category/object/bool columns). Anything else (functions such as np.log(x),
+categorical interactions, formulas without intercept) is delegated to
+patsy, with the whole result cached under the same key scheme.
+
+Classes:
+    DesignMatrixCache: LRU cache of term blocks and assembled matrices
+
+Functions:
+    dmatrices: patsy-compatible entry point using the module-level cache
+"""
+
+import hashlib
+import itertools
+import re
+import weakref
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+_BARE_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+_C_CALL = re.compile(r"^C\(\s*([A-Za-z_][A-Za-z0-9_]*)\s*\)$")
+
+
+# =============================================================================
+# Formula Parsing
+# =============================================================================
+
+@lru_cache(maxsize=1024)
+def _formula_terms(formula: str) -> Tuple[tuple, bool, tuple]:
+    """
+    Parse a formula once into factor codes.
+
+    Returns
+    -------
+    tuple
+        (lhs terms, has intercept, rhs terms without the intercept), where
+        each term is a tuple of factor code strings
+    """
+    from patsy import ModelDesc, INTERCEPT
+
+    desc = ModelDesc.from_formula(formula)
+    lhs = tuple(tuple(f.code for f in t.factors) for t in desc.lhs_termlist)
+    rhs = tuple(tuple(f.code for f in t.factors)
+                for t in desc.rhs_termlist if t != INTERCEPT)
+    return lhs, INTERCEPT in desc.rhs_termlist, rhs
+
+
+# =============================================================================
+# Row Digests
+# =============================================================================
+
+def _rows_digest(rows: np.ndarray) -> str:
+    """Hash of a vector of row positions."""
+    return hashlib.sha1(np.ascontiguousarray(rows).tobytes()).hexdigest()
+
+
+# =============================================================================
+# Cache
+# =============================================================================
+
+class DesignMatrixCache:
+    """
+    LRU cache of formula design matrices.
+
+    Parameters
+    ----------
+    max_entries : int
+        Maximum number of cached term blocks / fallback matrices
+
+    Attributes
+    ----------
+    hits, misses : int
+        Block-level cache statistics
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._store: "OrderedDict[tuple, object]" = OrderedDict()
+        self._frames: Dict[int, Tuple[weakref.ref, int]] = {}
+        self._tokens = itertools.count()
+        self.hits = 0
+        self.misses = 0
+
+    # -------------------------------------------------------------------------
+    # LRU storage
+    # -------------------------------------------------------------------------
+
+    def _get(self, key: tuple):
+        if key in self._store:
+            self._store.move_to_end(key)
+            self.hits += 1
+            return self._store[key]
+        self.misses += 1
+        return None
+
+    def _put(self, key: tuple, value) -> None:
+        self._store[key] = value
+        self._store.move_to_end(key)
+        while len(self._store) > self.max_entries:
+            self._store.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop all cached blocks."""
+        self._store.clear()
+        self.hits = self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def _frame_token(self, data: pd.DataFrame) -> int:
+        """Number identifying ``data`` while it is alive."""
+        entry = self._frames.get(id(data))
+        if entry is None or entry[0]() is not data:
+            entry = (weakref.ref(data), next(self._tokens))
+            self._frames[id(data)] = entry
+            weakref.finalize(data, self._frames.pop, id(data), None)
+        return entry[1]
+
+    def _rows(self, data: pd.DataFrame, token: int,
+              variables: List[str]) -> Tuple[np.ndarray, str]:
+        """Complete-case positions of ``variables`` and their digest (cached)."""
+        key = ("rows", token, tuple(variables))
+        cached = self._store.get(key)
+        if cached is None:
+            complete = data[variables].notna().all(axis=1).to_numpy()
+            rows = np.flatnonzero(complete)
+            cached = (rows, _rows_digest(rows))
+            self._put(key, cached)
+        else:
+            self._store.move_to_end(key)
+        return cached
+
+    # -------------------------------------------------------------------------
+    # Formula parsing
+    # -------------------------------------------------------------------------
+
+    @staticmethod
+    def _parse(formula: str, data: pd.DataFrame) -> Optional[Tuple[str, List[tuple]]]:
+        """
+        Split a formula into (outcome, terms) if every term is supported.
+
+        Terms are ("cat", var, label_prefix) or ("num", (var, ...)), in
+        patsy's column order: categorical terms first, then numeric terms,
+        each in order of appearance. Returns None to request the patsy path.
+        """
+        lhs, has_intercept, rhs = _formula_terms(formula)
+        if len(lhs) != 1 or len(lhs[0]) != 1 or not has_intercept:
+            return None
+        outcome = lhs[0][0]
+        if not _BARE_NAME.match(outcome) or outcome not in data.columns:
+            return None
+
+        cat_terms, num_terms = [], []
+        for codes in rhs:
+            if len(codes) == 1:
+                match = _C_CALL.match(codes[0])
+                if match and match.group(1) in data.columns:
+                    cat_terms.append(("cat", match.group(1), codes[0]))
+                    continue
+                var = codes[0]
+                if _BARE_NAME.match(var) and var in data.columns:
+                    dtype = data[var].dtype
+                    if (isinstance(dtype, pd.CategoricalDtype) or dtype == bool
+                            or dtype == object or pd.api.types.is_string_dtype(dtype)):
+                        cat_terms.append(("cat", var, var))
+                        continue
+
+            if all(_BARE_NAME.match(c) and c in data.columns
+                   and pd.api.types.is_numeric_dtype(data[c].dtype)
+                   and data[c].dtype != bool for c in codes):
+                num_terms.append(("num", tuple(codes)))
+                continue
+
+            return None
+
+        return outcome, cat_terms + num_terms
+
+    @staticmethod
+    def _variables(outcome: str, terms: List[tuple]) -> List[str]:
+        names = [outcome]
+        for term in terms:
+            names.extend([term[1]] if term[0] == "cat" else term[1])
+        return list(dict.fromkeys(names))
+
+    # -------------------------------------------------------------------------
+    # Block construction
+    # -------------------------------------------------------------------------
+
+    def _block(self, data: pd.DataFrame, term: tuple, rows: np.ndarray,
+               sample: tuple) -> pd.DataFrame:
+        """Columns of one term on ``rows`` (cached under ``sample``)."""
+        key = ("term", term) + sample
+        block = self._get(key)
+        if block is not None:
+            return block
+
+        if term[0] == "num":
+            values = np.ones(len(rows))
+            for var in term[1]:
+                values = values * data[var].to_numpy(dtype=float)[rows]
+            block = pd.DataFrame({":".join(term[1]): values})
+        else:
+            _, var, prefix = term
+            block = _treatment_dummies(data[var].iloc[rows], prefix)
+
+        self._put(key, block)
+        return block
+
+    # -------------------------------------------------------------------------
+    # Public API
+    # -------------------------------------------------------------------------
+
+    def dmatrices(self, formula: str, data: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Build (outcome, design) DataFrames like patsy.dmatrices.
+
+        Rows with a missing value in any formula variable are dropped and
+        the returned frames keep the original row labels.
+
+        Parameters
+        ----------
+        formula : str
+            Model formula
+        data : pd.DataFrame
+            Data
+
+        Returns
+        -------
+        tuple
+            (y, X) as DataFrames
+        """
+        parsed = self._parse(formula, data)
+        if parsed is None:
+            return self._patsy(formula, data)
+
+        outcome, terms = parsed
+        variables = self._variables(outcome, terms)
+        token = self._frame_token(data)
+        rows, digest = self._rows(data, token, variables)
+        index = data.index[rows]
+
+        blocks = [pd.DataFrame({"Intercept": np.ones(len(rows))})]
+        for term in terms:
+            blocks.append(self._block(data, term, rows, (token, digest)))
+
+        X = pd.concat(blocks, axis=1, copy=False)
+        X.index = index
+        y = pd.DataFrame({outcome: data[outcome].to_numpy(dtype=float)[rows]}, index=index)
+        return y, X
+
+    def _patsy(self, formula: str, data: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Unsupported formula: run patsy once per (formula, frame)."""
+        from patsy import dmatrices as patsy_dmatrices
+
+        key = ("patsy", formula, self._frame_token(data))
+        cached = self._get(key)
+        if cached is None:
+            cached = patsy_dmatrices(formula, data, return_type="dataframe")
+            self._put(key, cached)
+        return cached
+
+
+def _treatment_dummies(values: pd.Series, prefix: str) -> pd.DataFrame:
+    """
+    Treatment-coded dummies matching patsy's column names and levels.
+
+    Levels are the categories of a Categorical (including unused ones),
+    [False, True] for booleans, and the sorted unique values otherwise;
+    the first level is the reference.
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        levels = list(values.cat.categories)
+        codes = values.cat.codes.to_numpy()
+    else:
+        if values.dtype == bool:
+            levels = [False, True]
+        else:
+            levels = sorted(values.unique())
+        codes = pd.Categorical(values, categories=levels).codes
+
+    dummies = np.zeros((len(values), len(levels) - 1))
+    has_level = codes > 0
+    dummies[np.flatnonzero(has_level), codes[has_level] - 1] = 1.0
+    names = [f"{prefix}[T.{level}]" for level in levels[1:]]
+    return pd.DataFrame(dummies, columns=names)
+
+
+# =============================================================================
+# Module-level Cache
+# =============================================================================
+
+DEFAULT_CACHE = DesignMatrixCache()
+
+
+def dmatrices(formula: str, data: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Cached replacement for patsy.dmatrices(formula, data, return_type="dataframe")."""
+    return DEFAULT_CACHE.dmatrices(formula, data)
@@ -7,23 +7,32 @@ Functions for loading data from CBS API and local files.
 Functions:
     download_cbs_data: Download neighborhood statistics from CBS StatLine API
     get_cbs_metadata: Get variable descriptions from CBS
-    load_survey_data: Load SCoRE survey from Stata file
+    load_survey_data: Load SCoRE survey (Stata file or Parquet cache)
+    iter_survey_chunks: Survey rows in chunks (out-of-core mode)
     load_admin_data: Load CBS administrative data (local or API)
     validate_raw_data: Basic validation of loaded data
 """
 
+import json
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterator, List
 
 import sys
 sys.path.insert(0, str(Path(__file__).parent.parent))
 from config import (
     SURVEY_COLUMNS, CBS_TABLE_ID, CBS_YEAR,
-    SURVEY_PATH, ADMIN_PATH
+    SURVEY_PATH, ADMIN_PATH, SURVEY_CACHE_DIR,
+    SURVEY_CHUNK_ROWS, SURVEY_READ_JOBS, PARTITION_CHUNK_ROWS,
+    ADMIN_INDICATORS, ADMIN_CACHE_DIR
 )
 
+from .cache import hash_file, hash_value
+from .scheduler import resolve_jobs
+
 
 # =============================================================================
 # CBS API Functions
@@ -37,6 +46,10 @@ def download_cbs_data(
     """
     Download CBS neighborhood indicators from StatLine API.
 
+    Uses the OData downloader in src/cbs_download.py: the year and region
+    filters and the column selection are applied by the server, and raw
+    responses are revalidated against CBS_CACHE_DIR.
+
     Parameters
     ----------
     table_id : str
@@ -51,23 +64,10 @@ def download_cbs_data(
     pd.DataFrame
         CBS indicators with standardized column names
     """
-    try:
-        import cbsodata
-    except ImportError:
-        raise ImportError("cbsodata not installed. Run: pip install cbsodata")
+    from .cbs_download import download_cbs_years
 
     print(f"Downloading CBS table {table_id}...")
-
-    # Download full table
-    data = pd.DataFrame(cbsodata.get_data(table_id))
-    print(f"  Downloaded {len(data)} rows")
-
-    # Filter by year if Perioden column exists
-    if "Perioden" in data.columns:
-        # CBS year format can vary: "2018JJ00", "2018", etc.
-        year_mask = data["Perioden"].astype(str).str.contains(year)
-        data = data[year_mask].copy()
-        print(f"  Filtered to year {year}: {len(data)} rows")
+    data = download_cbs_years([year], tables={year: table_id})
 
     # Standardize column names
     data = _standardize_cbs_columns(data)
@@ -96,26 +96,7 @@ def _standardize_cbs_columns(data: pd.DataFrame) -> pd.DataFrame:
 
     # Column name mappings (CBS Dutch -> English standard)
     # Note: region_code is handled above, not here
-    # Based on actual CBS 84286NED column names (2018+)
-    col_mapping = {
-        "Gemeentenaam_1": "gemeente_name",
-        "AantalInwoners_5": "pop_total",
-        "k_65JaarOfOuder_12": "pop_over_65",
-        "Bevolkingsdichtheid_33": "pop_dens",
-        "WestersTotaal_17": "pop_west",
-        "NietWestersTotaal_18": "pop_nonwest",
-        "GemiddeldInkomenPerInkomensontvanger_68": "avg_inc_recip",
-        "GemiddeldInkomenPerInwoner_69": "avg_inc_pers",
-        "HuishoudensTotaal_28": "hh_total",
-        "Koopwoningen_40": "owner_occupied",
-        "GemiddeldeWoningwaarde_35": "avg_home_value",
-        "k_40PersonenMetLaagsteInkomen_70": "perc_low40_pers",
-        "k_20PersonenMetHoogsteInkomen_71": "perc_high20_pers",
-        "k_40HuishoudensMetLaagsteInkomen_73": "perc_low40_hh",
-        "k_20HuishoudensMetHoogsteInkomen_74": "perc_high20_hh",
-        "HuishoudensMetEenLaagInkomen_75": "perc_low_inc_hh",
-        "HuishoudensTot110VanSociaalMinimum_77": "perc_soc_min_hh",
-    }
+    col_mapping = {"Gemeentenaam_1": "gemeente_name", **ADMIN_INDICATORS}
 
     # Rename columns that exist
     renamed = {k: v for k, v in col_mapping.items() if k in data.columns}
@@ -158,26 +139,204 @@ def get_cbs_metadata(table_id: str = CBS_TABLE_ID) -> pd.DataFrame:
     return pd.DataFrame(meta)[["Key", "Title", "Description", "Unit"]]
 
 
+# =============================================================================
+# Columnar Extracts
+# =============================================================================
+
+# Parquet schema-metadata key holding the extract provenance
+_EXTRACT_KEY = b"extract_provenance"
+
+
+def _extract_info(path: Path, spec: Any) -> Dict[str, Any]:
+    """Provenance of an extract: source file stat and the column spec used."""
+    st = path.stat()
+    return {
+        "source": str(path.resolve()),
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "columns": hash_value(spec),
+    }
+
+
+def _read_extract(path: Path, cache_path: Path, spec: Any) -> Optional[pd.DataFrame]:
+    """
+    Parquet extract of ``path`` if it is still valid, else None.
+
+    The extract is valid if the column spec is unchanged and the source
+    file has the same size and mtime; if only the stat changed (e.g. the
+    file was copied or touched), the content hash decides.
+    """
+    if not cache_path.exists():
+        return None
+    try:
+        import pyarrow.parquet as pq
+        meta = pq.read_schema(cache_path).metadata or {}
+        cached = json.loads(meta[_EXTRACT_KEY])
+    except (ImportError, KeyError, ValueError, OSError):
+        return None
+
+    info = _extract_info(path, spec)
+    if cached["columns"] != info["columns"] or cached["source"] != info["source"]:
+        return None
+    same_stat = (cached["size"], cached["mtime_ns"]) == (info["size"], info["mtime_ns"])
+    if not same_stat and cached["sha256"] != hash_file(path):
+        return None
+    return pd.read_parquet(cache_path)
+
+
+def _write_extract(df: pd.DataFrame, path: Path, cache_path: Path, spec: Any) -> None:
+    """Write an extract to Parquet with its provenance (best effort)."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        return
+
+    info = _extract_info(path, spec)
+    info["sha256"] = hash_file(path)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        _EXTRACT_KEY: json.dumps(info).encode()
+    })
+
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = cache_path.with_suffix(".tmp")
+    pq.write_table(table, tmp)
+    tmp.replace(cache_path)
+
+
 # =============================================================================
 # Survey Data Loading
 # =============================================================================
 
-def load_survey_data(path: Path = SURVEY_PATH) -> pd.DataFrame:
+# Stata storage type (as reported by pyreadstat) -> in-memory dtype in the
+# chunked readers. Numeric columns are float64, as pyreadstat returns them
+# when reading the file in one piece, so the dtypes (and every downstream
+# value) do not depend on the file size (Stata missing values become NaN,
+# so integer dtypes are not an option).
+_STATA_DTYPES = {
+    "int8": np.float64,
+    "int16": np.float64,
+    "float": np.float64,
+    "int32": np.float64,
+    "double": np.float64,
+}
+
+
+def _read_survey_chunk(
+    path: str,
+    row_offset: int,
+    row_limit: int,
+    columns: List[str],
+    dtypes: Dict[str, Any]
+) -> Dict[str, np.ndarray]:
+    """Read, rename and downcast one row range of a Stata file (worker)."""
+    import pyreadstat
+
+    chunk, _ = pyreadstat.read_dta(path, usecols=columns,
+                                   row_offset=row_offset, row_limit=row_limit)
+    return {
+        SURVEY_COLUMNS[col]: chunk[col].to_numpy(dtype=dtypes[col])
+        for col in columns
+    }
+
+
+def _read_survey_chunked(
+    path: Path,
+    columns: List[str],
+    meta,
+    chunk_rows: int,
+    jobs: Optional[int]
+) -> pd.DataFrame:
+    """
+    Read selected columns of a large Stata file in row chunks.
+
+    Chunks are read by worker processes, renamed and downcast there, and
+    copied into preallocated output columns as they arrive. At most two
+    chunks per worker are in flight, so peak memory is about the output
+    frame plus a few compact chunks, whatever the size of the file.
+    """
+    n_rows = meta.number_rows
+    dtypes = {
+        col: _STATA_DTYPES.get(meta.readstat_variable_types.get(col), object)
+        for col in columns
+    }
+    out = {SURVEY_COLUMNS[col]: np.empty(n_rows, dtype=dtypes[col]) for col in columns}
+    offsets = list(range(0, n_rows, chunk_rows))
+
+    jobs = resolve_jobs(jobs, len(offsets))
+    print(f"  Reading {n_rows} rows in {len(offsets)} chunks of {chunk_rows} "
+          f"({jobs} worker(s))...")
+
+    def store(offset: int, chunk: Dict[str, np.ndarray]) -> None:
+        for name, values in chunk.items():
+            out[name][offset:offset + len(values)] = values
+
+    if jobs == 1:
+        for offset in offsets:
+            store(offset, _read_survey_chunk(str(path), offset, chunk_rows, columns, dtypes))
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            pending = deque()
+            for offset in offsets:
+                pending.append((offset, pool.submit(
+                    _read_survey_chunk, str(path), offset, chunk_rows, columns, dtypes)))
+                if len(pending) >= 2 * jobs:
+                    done, future = pending.popleft()
+                    store(done, future.result())
+            while pending:
+                done, future = pending.popleft()
+                store(done, future.result())
+
+    return pd.DataFrame(out, copy=False)
+
+
+def load_survey_data(
+    path: Path = SURVEY_PATH,
+    cache_dir: Optional[Path] = SURVEY_CACHE_DIR,
+    chunk_rows: Optional[int] = SURVEY_CHUNK_ROWS,
+    jobs: Optional[int] = SURVEY_READ_JOBS
+) -> pd.DataFrame:
     """
     Load SCoRE survey data from Stata file.
 
-    Selects and renames key variables for analysis.
+    Selects and renames key variables for analysis. Only the columns in
+    SURVEY_COLUMNS are read from the .dta file, and the renamed extract is
+    kept as Parquet in ``cache_dir``; later calls read the Parquet file as
+    long as the source file (mtime/size, else content hash) and the column
+    mapping are unchanged.
+
+    Files with more than ``chunk_rows`` rows are read in row chunks by
+    ``jobs`` worker processes (see _read_survey_chunked), with the same
+    column dtypes as a read in one piece.
 
     Parameters
     ----------
     path : Path
         Path to .dta file
+    cache_dir : Path, optional
+        Directory of the Parquet extract (None = always read the .dta file)
+    chunk_rows : int, optional
+        Rows per chunk for large files (None = read in one piece)
+    jobs : int, optional
+        Worker processes for chunked reading (None = all cores, 1 = sequential)
 
     Returns
     -------
     pd.DataFrame
         Survey data with English column names
     """
+    path = Path(path)
+    cache_path = Path(cache_dir) / f"{path.stem}.parquet" if cache_dir else None
+
+    if cache_path is not None and path.exists():
+        df = _read_extract(path, cache_path, SURVEY_COLUMNS)
+        if df is not None:
+            print(f"Loading survey data from {cache_path} (cached extract of {path.name})...")
+            print(f"  Loaded {len(df)} respondents, {len(df.columns)} columns")
+            return df
+
     try:
         import pyreadstat
     except ImportError:
@@ -185,41 +344,150 @@ def load_survey_data(path: Path = SURVEY_PATH) -> pd.DataFrame:
 
     print(f"Loading survey data from {path}...")
 
-    # Read Stata file
-    df, meta = pyreadstat.read_dta(str(path))
-    print(f"  Loaded {len(df)} respondents, {len(df.columns)} variables")
-
-    # Select and rename columns
+    # Read only the needed columns (the header tells which exist)
+    _, meta = pyreadstat.read_dta(str(path), metadataonly=True)
     cols_to_select = list(SURVEY_COLUMNS.keys())
-    available_cols = [c for c in cols_to_select if c in df.columns]
-    missing_cols = [c for c in cols_to_select if c not in df.columns]
+    available_cols = [c for c in cols_to_select if c in meta.column_names]
+    missing_cols = [c for c in cols_to_select if c not in meta.column_names]
+
+    if chunk_rows and meta.number_rows > chunk_rows:
+        df = _read_survey_chunked(path, available_cols, meta, chunk_rows, jobs)
+    else:
+        df, _ = pyreadstat.read_dta(str(path), usecols=available_cols)
+        # Select and rename columns (usecols keeps file order)
+        df = df[available_cols].rename(columns=SURVEY_COLUMNS)
+    print(f"  Loaded {len(df)} respondents, {meta.number_columns} variables")
 
     if missing_cols:
         print(f"  Warning: Missing columns: {missing_cols}")
 
-    df = df[available_cols].copy()
-    df = df.rename(columns=SURVEY_COLUMNS)
-
     # Add respondent ID
     df["respondent_id"] = range(1, len(df) + 1)
 
     print(f"  Selected {len(df.columns)} columns")
+
+    if cache_path is not None:
+        _write_extract(df, path, cache_path, SURVEY_COLUMNS)
     return df
 
 
+# Columns the partitioned pipeline cannot run without (English names)
+_STREAM_REQUIRED_COLUMNS = ("Buurtcode", "red_inc_diff")
+
+
+def iter_survey_chunks(
+    path: Path = SURVEY_PATH,
+    chunk_rows: int = PARTITION_CHUNK_ROWS
+) -> Iterator[pd.DataFrame]:
+    """
+    Survey data in row chunks, for populations too large to load at once.
+
+    Reads a Stata file (pyreadstat row ranges) or a Parquet file (record
+    batches) with the SURVEY_COLUMNS variables, either under their Stata
+    names or already renamed. Each chunk has the English column names and
+    respondent_id numbered as in load_survey_data. A file without the
+    neighborhood code or the primary DV raises ValueError.
+
+    Parameters
+    ----------
+    path : Path
+        Path to a .dta or .parquet file
+    chunk_rows : int
+        Rows per chunk
+
+    Yields
+    ------
+    pd.DataFrame
+        Consecutive chunks of the survey
+    """
+    path = Path(path)
+    if path.suffix == ".parquet":
+        import pyarrow.parquet as pq
+
+        source = pq.ParquetFile(path)
+        names = source.schema_arrow.names
+        columns = [c for c in names
+                   if c in SURVEY_COLUMNS or c in SURVEY_COLUMNS.values()]
+        print(f"Streaming survey data from {path} ({source.metadata.num_rows} rows)...")
+        chunks = (batch.to_pandas().rename(columns=SURVEY_COLUMNS)
+                  for batch in source.iter_batches(chunk_rows, columns=columns))
+    else:
+        try:
+            import pyreadstat
+        except ImportError:
+            raise ImportError("pyreadstat not installed. Run: pip install pyreadstat")
+
+        _, meta = pyreadstat.read_dta(str(path), metadataonly=True)
+        columns = [c for c in SURVEY_COLUMNS if c in meta.column_names]
+        dtypes = {
+            col: _STATA_DTYPES.get(meta.readstat_variable_types.get(col), object)
+            for col in columns
+        }
+        print(f"Streaming survey data from {path} ({meta.number_rows} rows)...")
+        chunks = (pd.DataFrame(_read_survey_chunk(str(path), offset, chunk_rows,
+                                                  columns, dtypes), copy=False)
+                  for offset in range(0, meta.number_rows, chunk_rows))
+
+    found = {SURVEY_COLUMNS.get(c, c) for c in columns}
+    missing = [c for c in _STREAM_REQUIRED_COLUMNS if c not in found]
+    if missing:
+        raise ValueError(f"{path} lacks required survey columns: {missing}")
+
+    offset = 0
+    for chunk in chunks:
+        chunk["respondent_id"] = np.arange(offset + 1, offset + len(chunk) + 1)
+        offset += len(chunk)
+        yield chunk
+
+
 # =============================================================================
 # Administrative Data Loading
 # =============================================================================
 
+# Region code and name columns of the admin data (raw CBS or standardized)
+_ADMIN_CODE_COLUMNS = ("region_code", "Codering_3", "WijkenEnBuurten", "region_id")
+_ADMIN_NAME_COLUMNS = ("gemeente_name", "Gemeentenaam_1", "region_type")
+
+
+def _admin_dtypes(columns) -> Dict[str, Any]:
+    """
+    Columns of the admin data the pipeline uses, with their dtypes.
+
+    Indicators (under CBS or standard names) are float32, gemeente names
+    and region types categorical and region codes strings; other columns
+    are not read.
+    """
+    indicators = set(ADMIN_INDICATORS) | set(ADMIN_INDICATORS.values())
+    dtypes = {}
+    for col in columns:
+        if col in indicators:
+            dtypes[col] = np.float32
+        elif col in _ADMIN_NAME_COLUMNS:
+            dtypes[col] = "category"
+        elif col in _ADMIN_CODE_COLUMNS:
+            dtypes[col] = str
+    return dtypes
+
+
+def _project_admin(data: pd.DataFrame) -> pd.DataFrame:
+    """Used columns of an in-memory admin table, with the loader's dtypes."""
+    dtypes = _admin_dtypes(data.columns)
+    return data[list(dtypes)].astype(dtypes)
+
+
 def load_admin_data(
     path: Path = ADMIN_PATH,
     use_api: bool = False,
-    table_id: str = CBS_TABLE_ID
+    table_id: str = CBS_TABLE_ID,
+    cache_dir: Optional[Path] = ADMIN_CACHE_DIR
 ) -> pd.DataFrame:
     """
     Load CBS administrative indicators.
 
-    Can load from local CSV file or download from CBS API.
+    Can load from local CSV file or download from CBS API. Only the region
+    code/name columns and the ADMIN_INDICATORS are kept, with explicit
+    dtypes (see _admin_dtypes). The parsed CSV is stored as Parquet in
+    ``cache_dir`` and reused while the CSV is unchanged.
 
     Parameters
     ----------
@@ -229,6 +497,8 @@ def load_admin_data(
         If True, download fresh data from CBS API
     table_id : str
         CBS table ID for API download
+    cache_dir : Path, optional
+        Directory of the Parquet extract (None = always parse the CSV)
 
     Returns
     -------
@@ -237,11 +507,35 @@ def load_admin_data(
     """
     if use_api:
         # Download and save to the local path
-        return download_cbs_data(table_id, save_path=path)
+        return _project_admin(download_cbs_data(table_id, save_path=path))
+
+    path = Path(path)
+    cache_path = Path(cache_dir) / f"{path.stem}.parquet" if cache_dir else None
+    spec = {k: str(v) for k, v in _admin_dtypes(
+        list(_ADMIN_CODE_COLUMNS + _ADMIN_NAME_COLUMNS)
+        + list(ADMIN_INDICATORS) + list(ADMIN_INDICATORS.values())).items()}
+
+    if cache_path is not None and path.exists():
+        df = _read_extract(path, cache_path, spec)
+        if df is not None:
+            print(f"Loading admin data from {cache_path} (cached extract of {path.name})...")
+            print(f"  Loaded {len(df)} rows, {len(df.columns)} columns")
+            return df
 
     print(f"Loading admin data from {path}...")
-    df = pd.read_csv(path)
-    print(f"  Loaded {len(df)} rows, {len(df.columns)} columns")
+    header = pd.read_csv(path, nrows=0).columns
+    dtypes = _admin_dtypes(header)
+    try:
+        df = pd.read_csv(path, usecols=list(dtypes), dtype=dtypes,
+                         na_values=["."], engine="pyarrow")
+    except ImportError:
+        df = pd.read_csv(path, usecols=list(dtypes), dtype=dtypes, na_values=["."])
+    # usecols does not reorder; keep the file's column order
+    df = df[[c for c in header if c in dtypes]]
+    print(f"  Loaded {len(df)} rows, {len(df.columns)} of {len(header)} columns")
+
+    if cache_path is not None:
+        _write_extract(df, path, cache_path, spec)
     return df
 
 
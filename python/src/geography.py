@@ -26,7 +26,10 @@ import warnings
 
 import sys
 sys.path.insert(0, str(Path(__file__).parent.parent))
-from config import DATA_DIR, RAW_DIR, FIGURES_DIR
+from config import DATA_DIR, RAW_DIR, FIGURES_DIR, GEO_NAMES_DIR
+
+from .geonames import load_name_dictionary
+from .transform import parse_geo_ids
 
 
 # =============================================================================
@@ -42,6 +45,8 @@ def create_name_lookup(admin_data: pd.DataFrame) -> Dict[str, pd.DataFrame]:
     - gemeente_name: Name of the gemeente
     - region_code: Code like "BU03630000" or "GM0363"
 
+    The tables are views of the shared name dictionary (src/geonames.py).
+
     Parameters
     ----------
     admin_data : pd.DataFrame
@@ -51,42 +56,23 @@ def create_name_lookup(admin_data: pd.DataFrame) -> Dict[str, pd.DataFrame]:
     -------
     Dict with lookup DataFrames for each level
     """
-    lookups = {}
+    names = load_name_dictionary(admin_data, GEO_NAMES_DIR)
+    gemeente_names = names.table('gemeente')
 
-    # Gemeente lookup
-    gemeente_data = admin_data[admin_data['region_code'].str.startswith('GM', na=False)].copy()
-    if len(gemeente_data) > 0:
-        gemeente_data['gemeente_id'] = gemeente_data['region_code'].str[2:].str.strip()
-        gemeente_lookup = gemeente_data[['gemeente_id', 'gemeente_name', 'WijkenEnBuurten']].copy()
-        gemeente_lookup = gemeente_lookup.rename(columns={'WijkenEnBuurten': 'gemeente_name_full'})
-        gemeente_lookup['gemeente_name'] = gemeente_lookup['gemeente_name'].str.strip()
-        lookups['gemeente'] = gemeente_lookup.drop_duplicates('gemeente_id')
-        print(f"  Created gemeente lookup: {len(lookups['gemeente'])} municipalities")
-
-    # Wijk lookup
-    wijk_data = admin_data[admin_data['region_code'].str.startswith('WK', na=False)].copy()
-    if len(wijk_data) > 0:
-        wijk_data['wijk_id'] = wijk_data['region_code'].str[2:].str.strip()
-        wijk_data['gemeente_id'] = wijk_data['wijk_id'].str[:4]
-        wijk_lookup = wijk_data[['wijk_id', 'gemeente_id', 'WijkenEnBuurten', 'gemeente_name']].copy()
-        wijk_lookup = wijk_lookup.rename(columns={'WijkenEnBuurten': 'wijk_name'})
-        wijk_lookup['wijk_name'] = wijk_lookup['wijk_name'].str.strip()
-        wijk_lookup['gemeente_name'] = wijk_lookup['gemeente_name'].str.strip()
-        lookups['wijk'] = wijk_lookup.drop_duplicates('wijk_id')
-        print(f"  Created wijk lookup: {len(lookups['wijk'])} districts")
-
-    # Buurt lookup
-    buurt_data = admin_data[admin_data['region_code'].str.startswith('BU', na=False)].copy()
-    if len(buurt_data) > 0:
-        buurt_data['buurt_id'] = buurt_data['region_code'].str[2:].str.strip()
-        buurt_data['wijk_id'] = buurt_data['buurt_id'].str[:6]
-        buurt_data['gemeente_id'] = buurt_data['buurt_id'].str[:4]
-        buurt_lookup = buurt_data[['buurt_id', 'wijk_id', 'gemeente_id', 'WijkenEnBuurten', 'gemeente_name']].copy()
-        buurt_lookup = buurt_lookup.rename(columns={'WijkenEnBuurten': 'buurt_name'})
-        buurt_lookup['buurt_name'] = buurt_lookup['buurt_name'].str.strip()
-        buurt_lookup['gemeente_name'] = buurt_lookup['gemeente_name'].str.strip()
-        lookups['buurt'] = buurt_lookup.drop_duplicates('buurt_id')
-        print(f"  Created buurt lookup: {len(lookups['buurt'])} neighborhoods")
+    lookups = {}
+    for level, label in [('gemeente', 'municipalities'), ('wijk', 'districts'),
+                         ('buurt', 'neighborhoods')]:
+        table = names.table(level)
+        if len(table) == 0:
+            continue
+        # Parent codes and the gemeente name for wijk and buurt tables
+        if level != 'gemeente':
+            table['gemeente_id'] = table[f'{level}_id'] // (100 if level == 'wijk' else 10000)
+            table = table.merge(gemeente_names, on='gemeente_id', how='left')
+        if level == 'buurt':
+            table.insert(1, 'wijk_id', table['buurt_id'] // 100)
+        lookups[level] = table
+        print(f"  Created {level} lookup: {len(table)} {label}")
 
     return lookups
 
@@ -115,39 +101,19 @@ def add_geographic_names(
     """
     print("\nAdding geographic names...")
 
-    # Create lookup tables
-    lookups = create_name_lookup(admin_data)
-
-    result = data.copy()
-
-    # Add buurt names
-    if 'buurt' in lookups and 'buurt_id' in result.columns:
-        buurt_names = lookups['buurt'][['buurt_id', 'buurt_name']].copy()
-        result['buurt_id'] = result['buurt_id'].astype(str).str.strip()
-        buurt_names['buurt_id'] = buurt_names['buurt_id'].astype(str).str.strip()
-        result = result.merge(buurt_names, on='buurt_id', how='left')
-        n_matched = result['buurt_name'].notna().sum()
-        print(f"  Buurt names: {n_matched}/{len(result)} matched ({100*n_matched/len(result):.1f}%)")
-
-    # Add wijk names
-    if 'wijk' in lookups and 'wijk_id' in result.columns:
-        wijk_names = lookups['wijk'][['wijk_id', 'wijk_name']].copy()
-        result['wijk_id'] = result['wijk_id'].astype(str).str.strip()
-        wijk_names['wijk_id'] = wijk_names['wijk_id'].astype(str).str.strip()
-        result = result.merge(wijk_names, on='wijk_id', how='left')
-        n_matched = result['wijk_name'].notna().sum()
-        print(f"  Wijk names: {n_matched}/{len(result)} matched ({100*n_matched/len(result):.1f}%)")
-
-    # Add gemeente names (from buurt lookup or gemeente lookup)
-    if 'buurt' in lookups and 'gemeente_id' in result.columns:
-        # Get unique gemeente_id -> gemeente_name mapping
-        gemeente_names = lookups['buurt'][['gemeente_id', 'gemeente_name']].drop_duplicates('gemeente_id')
-        result['gemeente_id'] = result['gemeente_id'].astype(str).str.strip()
-        gemeente_names['gemeente_id'] = gemeente_names['gemeente_id'].astype(str).str.strip()
-        if 'gemeente_name' not in result.columns:
-            result = result.merge(gemeente_names, on='gemeente_id', how='left')
-        n_matched = result['gemeente_name'].notna().sum()
-        print(f"  Gemeente names: {n_matched}/{len(result)} matched ({100*n_matched/len(result):.1f}%)")
+    names = load_name_dictionary(admin_data, GEO_NAMES_DIR)
+
+    result = data.copy(deep=False)
+
+    for level in ['buurt', 'wijk', 'gemeente']:
+        id_col, name_col = f'{level}_id', f'{level}_name'
+        if id_col not in result.columns or len(names.levels[level][0]) == 0:
+            continue
+        if name_col not in result.columns:
+            result[name_col] = names.lookup(result[id_col], level)
+        n_matched = result[name_col].notna().sum()
+        print(f"  {level.capitalize()} names: {n_matched}/{len(result)} matched "
+              f"({100*n_matched/len(result):.1f}%)")
 
     return result
 
@@ -408,7 +374,7 @@ def create_choropleth_map(
 
     # Prepare data for joining
     map_data = data[[geo_id_column, value_column]].copy()
-    map_data[geo_id_column] = map_data[geo_id_column].astype(str)
+    map_data[geo_id_column] = parse_geo_ids(map_data[geo_id_column])
 
     # Aggregate if multiple observations per area
     map_data = map_data.groupby(geo_id_column)[value_column].mean().reset_index()
@@ -428,8 +394,8 @@ def create_choropleth_map(
         return None
 
     # Clean IDs for joining
-    shp['_join_id'] = shp[shp_id_col].astype(str).str.replace('BU', '').str.replace('WK', '').str.replace('GM', '').str.strip()
-    map_data['_join_id'] = map_data[geo_id_column].astype(str).str.strip()
+    shp['_join_id'] = parse_geo_ids(shp[shp_id_col])
+    map_data['_join_id'] = map_data[geo_id_column]
 
     # Merge
     merged = shp.merge(map_data, on='_join_id', how='left')
@@ -531,9 +497,9 @@ def create_interactive_map(
         print("Could not find ID column in shapefile")
         return None
 
-    # Clean IDs
-    shp['_id'] = shp[shp_id_col].astype(str).str.replace('GM', '').str.replace('WK', '').str.replace('BU', '').str.strip()
-    map_data[geo_id_column] = map_data[geo_id_column].astype(str).str.strip()
+    # Integer codes on both sides; GeoJSON feature ids are matched as strings
+    shp['_id'] = parse_geo_ids(shp[shp_id_col]).astype("string")
+    map_data[geo_id_column] = parse_geo_ids(map_data[geo_id_column]).astype("string")
 
     # Merge for hover data
     shp_merged = shp.merge(map_data, left_on='_id', right_on=geo_id_column, how='left')
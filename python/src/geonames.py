@@ -0,0 +1,257 @@
+# =============================================================================
+# geonames.py - Integer-Keyed Geographic Name Dictionary
+# =============================================================================
+"""
+Buurt, wijk and gemeente names keyed by the integer geographic codes.
+
+The dictionary is built once per CBS vintage (a content hash of the
+admin frame's code and name columns) and stored as plain .npy arrays:
+
+    <cache_dir>/<vintage>/names.npy           unique names (fixed-width unicode)
+    <cache_dir>/<vintage>/<level>_ids.npy     sorted int32 codes
+    <cache_dir>/<vintage>/<level>_names.npy   int32 position in names.npy
+
+Later runs memory-map the arrays, so looking up names for n respondents
+is a binary search plus an array gather. The result is a categorical
+column over the shared name table; no strings are copied per row.
+
+Buurt and wijk names are the WijkenEnBuurten labels of the BU/WK rows.
+Gemeente names come from the gemeente_name column of all rows.
+
+Classes:
+    GeoNameDictionary: Name lookup for the three geographic levels
+
+Functions:
+    admin_vintage: Content hash identifying the admin data's names
+    build_name_dictionary: Build the dictionary from CBS admin data
+    load_name_dictionary: Stored dictionary for the admin data's vintage (built if missing)
+    latest_name_dictionary: Most recently stored dictionary (for the dashboard)
+"""
+
+import os
+import shutil
+import tempfile
+import pandas as pd
+import numpy as np
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import GEO_NAMES_DIR
+
+from .cache import hash_value
+from .transform import parse_geo_ids
+
+
+LEVELS = ("buurt", "wijk", "gemeente")
+
+# Code prefix of the rows whose WijkenEnBuurten label names each level
+_LEVEL_PREFIX = {"buurt": "BU", "wijk": "WK"}
+
+# Integer code -> gemeente code (buurt: 8 digits, wijk: 6, gemeente: 4)
+_GEMEENTE_DIVISOR = {"BU": 10000, "WK": 100, "GM": 1}
+
+
+class GeoNameDictionary:
+    """
+    Names of buurten, wijken and gemeenten keyed by integer code.
+
+    Parameters
+    ----------
+    names : np.ndarray
+        Unique names
+    levels : dict
+        level -> (sorted int32 codes, int32 positions in ``names``)
+    """
+
+    def __init__(self, names: np.ndarray, levels: Dict[str, Tuple[np.ndarray, np.ndarray]]):
+        self.names = names
+        self.levels = levels
+        self._categories = None
+
+    @property
+    def categories(self) -> pd.Index:
+        if self._categories is None:
+            self._categories = pd.Index(self.names.astype(object))
+        return self._categories
+
+    def __len__(self) -> int:
+        return sum(len(ids) for ids, _ in self.levels.values())
+
+    def codes(self, ids: pd.Series, level: str) -> np.ndarray:
+        """Position of each ID's name in ``names`` (-1 where unknown)."""
+        keys, positions = self.levels[level]
+        query = parse_geo_ids(ids).to_numpy(dtype="int64", na_value=-1)
+        if len(keys) == 0:
+            return np.full(len(query), -1, dtype=np.int32)
+        at = np.minimum(np.searchsorted(keys, query), len(keys) - 1)
+        return np.where(keys[at] == query, positions[at], -1).astype(np.int32)
+
+    def lookup(self, ids: pd.Series, level: str) -> pd.Series:
+        """
+        Names for a column of integer codes.
+
+        Parameters
+        ----------
+        ids : pd.Series
+            Codes at ``level`` (e.g. the buurt_id column)
+        level : str
+            "buurt", "wijk" or "gemeente"
+
+        Returns
+        -------
+        pd.Series
+            Categorical names aligned with ``ids`` (missing where unknown)
+        """
+        names = pd.Categorical.from_codes(self.codes(ids, level), categories=self.categories)
+        return pd.Series(names.remove_unused_categories(), index=ids.index, name=f"{level}_name")
+
+    def table(self, level: str) -> pd.DataFrame:
+        """All codes and names of one level."""
+        keys, positions = self.levels[level]
+        return pd.DataFrame({
+            f"{level}_id": pd.array(keys, dtype="Int32"),
+            f"{level}_name": self.names[positions].astype(object),
+        })
+
+    def save(self, directory: Path) -> None:
+        """Write the arrays to ``directory`` (replaced atomically)."""
+        directory = Path(directory)
+        directory.parent.mkdir(parents=True, exist_ok=True)
+        tmp = Path(tempfile.mkdtemp(dir=directory.parent, suffix=".tmp"))
+        np.save(tmp / "names.npy", self.names)
+        for level, (keys, positions) in self.levels.items():
+            np.save(tmp / f"{level}_ids.npy", keys)
+            np.save(tmp / f"{level}_names.npy", positions)
+        try:
+            os.replace(tmp, directory)
+        except OSError:
+            # Another process stored the same vintage first
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    @classmethod
+    def open(cls, directory: Path) -> "GeoNameDictionary":
+        """Memory-map a dictionary written by save()."""
+        directory = Path(directory)
+        names = np.load(directory / "names.npy", mmap_mode="r")
+        levels = {
+            level: (np.load(directory / f"{level}_ids.npy", mmap_mode="r"),
+                    np.load(directory / f"{level}_names.npy", mmap_mode="r"))
+            for level in LEVELS
+        }
+        return cls(names, levels)
+
+
+def _admin_name_columns(admin_data: pd.DataFrame) -> Tuple[pd.Series, Optional[str], Optional[str]]:
+    """Region codes and the name columns present in the admin data."""
+    if "region_code" in admin_data.columns:
+        region_code = admin_data["region_code"]
+    else:
+        source = "Codering_3" if "Codering_3" in admin_data.columns else "WijkenEnBuurten"
+        region_code = admin_data[source]
+    region_code = region_code.astype("string").str.strip()
+    name_col = "WijkenEnBuurten" if "WijkenEnBuurten" in admin_data.columns else None
+    gemeente_col = "gemeente_name" if "gemeente_name" in admin_data.columns else None
+    return region_code, name_col, gemeente_col
+
+
+def admin_vintage(admin_data: pd.DataFrame) -> str:
+    """Content hash of the code and name columns (identifies a CBS vintage)."""
+    region_code, name_col, gemeente_col = _admin_name_columns(admin_data)
+    cols = [c for c in (name_col, gemeente_col) if c]
+    return hash_value(pd.concat([region_code.rename("code"), admin_data[cols]], axis=1))[:16]
+
+
+def _labels(admin_data: pd.DataFrame, column: Optional[str], rows: np.ndarray) -> pd.Series:
+    """Stripped names of the selected rows (all missing without a name column)."""
+    if column is None:
+        return pd.Series(pd.NA, index=range(int(rows.sum())), dtype="string")
+    return admin_data.loc[rows, column].astype("string").str.strip()
+
+
+def build_name_dictionary(admin_data: pd.DataFrame) -> GeoNameDictionary:
+    """
+    Build the name dictionary from CBS admin data.
+
+    Parameters
+    ----------
+    admin_data : pd.DataFrame
+        Raw CBS admin data with region codes, WijkenEnBuurten and gemeente_name
+
+    Returns
+    -------
+    GeoNameDictionary
+        First name per code; empty levels if the name columns are missing
+    """
+    region_code, name_col, gemeente_col = _admin_name_columns(admin_data)
+    prefix = region_code.str[:2].to_numpy(dtype=object, na_value="")
+    ids = parse_geo_ids(region_code).to_numpy(dtype="int64", na_value=-1)
+
+    # (code, name) candidates per level, in admin row order
+    keys, labels = {}, {}
+    for level, pre in _LEVEL_PREFIX.items():
+        rows = (prefix == pre) & (ids >= 0)
+        keys[level], labels[level] = ids[rows], _labels(admin_data, name_col, rows)
+
+    divisor = pd.Series(prefix).map(_GEMEENTE_DIVISOR).to_numpy(dtype=float, na_value=np.nan)
+    rows = ~np.isnan(divisor) & (ids >= 0)
+    keys["gemeente"] = ids[rows] // divisor[rows].astype(np.int64)
+    labels["gemeente"] = _labels(admin_data, gemeente_col, rows)
+
+    # One name table for all levels
+    all_labels = pd.concat([labels[level] for level in LEVELS], ignore_index=True)
+    name_codes, names = pd.factorize(all_labels)
+
+    levels = {}
+    start = 0
+    for level in LEVELS:
+        n = len(keys[level])
+        codes = name_codes[start:start + n]
+        start += n
+        valid = codes >= 0
+        level_keys = keys[level][valid]
+        first = ~pd.Series(level_keys).duplicated().to_numpy()
+        order = np.argsort(level_keys[first], kind="stable")
+        levels[level] = (level_keys[first][order].astype(np.int32),
+                         codes[valid][first][order].astype(np.int32))
+
+    names = np.asarray(names, dtype=str) if len(names) else np.array([], dtype="<U1")
+    return GeoNameDictionary(names, levels)
+
+
+def load_name_dictionary(
+    admin_data: pd.DataFrame,
+    cache_dir: Optional[Path] = GEO_NAMES_DIR
+) -> GeoNameDictionary:
+    """
+    Name dictionary for the admin data's vintage, built at most once.
+
+    Parameters
+    ----------
+    admin_data : pd.DataFrame
+        Raw CBS admin data
+    cache_dir : Path, optional
+        Directory of stored dictionaries (None = build in memory only)
+
+    Returns
+    -------
+    GeoNameDictionary
+        Memory-mapped if stored
+    """
+    if cache_dir is None:
+        return build_name_dictionary(admin_data)
+
+    directory = Path(cache_dir) / admin_vintage(admin_data)
+    if not (directory / "names.npy").exists():
+        build_name_dictionary(admin_data).save(directory)
+    return GeoNameDictionary.open(directory)
+
+
+def latest_name_dictionary(cache_dir: Path = GEO_NAMES_DIR) -> Optional[GeoNameDictionary]:
+    """Most recently built stored dictionary (for readers without the admin data)."""
+    stored = [d for d in Path(cache_dir).glob("*") if (d / "names.npy").exists()] \
+        if Path(cache_dir).exists() else []
+    if not stored:
+        return None
+    return GeoNameDictionary.open(max(stored, key=lambda d: d.stat().st_mtime))
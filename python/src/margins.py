@@ -0,0 +1,330 @@
+# =============================================================================
+# margins.py - Marginal Effects of Interactions
+# =============================================================================
+"""
+Simple slopes, their standard errors and Johnson-Neyman regions.
+
+For a model with focal * moderator, the effect of the focal predictor at
+moderator value m is b_focal + m * b_interaction, a linear combination
+L_m'b of the fixed effects. Stacking L_m for a whole grid of moderator
+values gives a contrast matrix L (G x p), so every slope is L @ b and every
+variance the diagonal of L V L' (V = cov_params()), computed in one pass
+without a loop over moderator values. A grid of a few hundred points costs
+microseconds, enough to redraw interaction curves interactively.
+
+The Johnson-Neyman bounds (moderator values where the slope is exactly
+significant at the chosen level) solve
+(b_f + m b_i)^2 = z^2 (V_ff + 2 m V_fi + m^2 V_ii), a quadratic in m.
+
+Works with any fitted model exposing params (or fe_params) and
+cov_params(): RandomInterceptResults, statsmodels MixedLM and OLS results.
+
+Classes:
+    JohnsonNeyman: Bounds and regions of significance over a moderator range
+    MarginalEffects: Slopes, SEs and intervals over moderator values
+
+Functions:
+    moderator_grid: Dense grid (or the observed levels of a binary moderator)
+    contrast_matrix: Linear combinations of the coefficients for each value
+    simple_slopes: Slopes and SEs from coefficients and their covariance
+    johnson_neyman: Regions of significance from the quadratic solution
+    marginal_effects: Both from a fitted model
+"""
+
+from dataclasses import dataclass
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import CONFIDENCE_LEVEL, MARGINS_GRID_POINTS
+
+
+# =============================================================================
+# Results
+# =============================================================================
+
+@dataclass
+class JohnsonNeyman:
+    """Where the focal effect is significant over a moderator range."""
+    bounds: List[float]                     # moderator values with |z| = critical value
+    regions: List[Tuple[float, float]]      # significant intervals within the range
+    range: Tuple[float, float]              # moderator range considered
+    alpha: float
+
+    def summary(self) -> str:
+        """One-line description of the regions of significance."""
+        if not self.regions:
+            return "not significant anywhere in the observed range"
+        if self.regions == [self.range]:
+            return "significant over the whole observed range"
+        return "significant for " + ", ".join(f"[{lo:.2f}, {hi:.2f}]"
+                                            for lo, hi in self.regions)
+
+
+@dataclass
+class MarginalEffects:
+    """Effect of ``focal`` at each moderator value in ``at``."""
+    focal: str
+    moderator: str
+    at: np.ndarray          # moderator values (G,)
+    slope: np.ndarray       # effect of the focal predictor (G,)
+    se: np.ndarray          # standard errors from cov_params (G,)
+    alpha: float
+    johnson_neyman: Optional[JohnsonNeyman] = None
+
+    @property
+    def z(self) -> np.ndarray:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return self.slope / self.se
+
+    @property
+    def p(self) -> np.ndarray:
+        return 2 * stats.norm.sf(np.abs(self.z))
+
+    @property
+    def lower(self) -> np.ndarray:
+        return self.slope - stats.norm.ppf(1 - self.alpha / 2) * self.se
+
+    @property
+    def upper(self) -> np.ndarray:
+        return self.slope + stats.norm.ppf(1 - self.alpha / 2) * self.se
+
+    @property
+    def significant(self) -> np.ndarray:
+        return self.p < self.alpha
+
+    def to_frame(self) -> pd.DataFrame:
+        """One row per moderator value (moderator, slope, se, z, p, lower, upper, significant)."""
+        return pd.DataFrame({
+            self.moderator: self.at,
+            "slope": self.slope,
+            "se": self.se,
+            "z": self.z,
+            "p": self.p,
+            "lower": self.lower,
+            "upper": self.upper,
+            "significant": self.significant,
+        })
+
+
+# =============================================================================
+# Contrasts
+# =============================================================================
+
+def moderator_grid(values: Any, n_points: int = MARGINS_GRID_POINTS) -> np.ndarray:
+    """
+    Moderator values to evaluate the slopes at.
+
+    Parameters
+    ----------
+    values : array-like
+        Observed moderator values (missing values are ignored)
+    n_points : int
+        Grid size for a continuous moderator
+
+    Returns
+    -------
+    np.ndarray
+        The two levels of a binary moderator (e.g. professional_class),
+        otherwise ``n_points`` evenly spaced values over the observed range
+    """
+    values = pd.Series(values).dropna().to_numpy(dtype=float)
+    if len(values) == 0:
+        raise ValueError("Moderator has no observed values")
+    levels = np.unique(values)
+    if len(levels) <= 2:
+        return levels
+    return np.linspace(levels[0], levels[-1], n_points)
+
+
+def _interaction_term(names: Sequence[str], focal: str, moderator: str) -> str:
+    """Name of the focal x moderator coefficient (either order, as patsy writes it)."""
+    for name in (f"{focal}:{moderator}", f"{moderator}:{focal}"):
+        if name in names:
+            return name
+    raise ValueError(f"Model has no {focal}:{moderator} interaction")
+
+
+def contrast_matrix(
+    names: Sequence[str],
+    focal: str,
+    moderator: str,
+    at: np.ndarray
+) -> np.ndarray:
+    """
+    Rows L_m with L_m'b = b_focal + m * b_interaction for each m in ``at``.
+
+    Parameters
+    ----------
+    names : sequence of str
+        Coefficient names, in the order of params and cov_params
+    focal, moderator : str
+        Focal predictor and moderator
+    at : np.ndarray
+        Moderator values (G,)
+
+    Returns
+    -------
+    np.ndarray
+        (G, p) contrast matrix
+    """
+    names = list(names)
+    if focal not in names:
+        raise ValueError(f"Model has no {focal} coefficient")
+    at = np.asarray(at, dtype=float)
+    L = np.zeros((len(at), len(names)))
+    L[:, names.index(focal)] = 1.0
+    L[:, names.index(_interaction_term(names, focal, moderator))] = at
+    return L
+
+
+# =============================================================================
+# Slopes and Regions of Significance
+# =============================================================================
+
+def simple_slopes(
+    params: pd.Series,
+    cov: pd.DataFrame,
+    focal: str,
+    moderator: str,
+    at: np.ndarray,
+    alpha: float = 1 - CONFIDENCE_LEVEL
+) -> MarginalEffects:
+    """
+    Slopes of ``focal`` at the moderator values ``at``.
+
+    Parameters
+    ----------
+    params : pd.Series
+        Fixed-effect estimates
+    cov : pd.DataFrame
+        Their covariance matrix (labelled; extra rows such as "Group Var"
+        are ignored)
+    focal, moderator : str
+        Focal predictor and moderator
+    at : np.ndarray
+        Moderator values
+    alpha : float
+        Significance level of intervals and ``significant``
+
+    Returns
+    -------
+    MarginalEffects
+    """
+    names = list(params.index)
+    V = cov.loc[names, names].to_numpy(dtype=float)
+    L = contrast_matrix(names, focal, moderator, at)
+
+    slope = L @ params.to_numpy(dtype=float)
+    variance = np.einsum("gi,ij,gj->g", L, V, L)
+    se = np.sqrt(np.maximum(variance, 0.0))
+    return MarginalEffects(focal, moderator, np.asarray(at, dtype=float),
+                           slope, se, alpha)
+
+
+def johnson_neyman(
+    params: pd.Series,
+    cov: pd.DataFrame,
+    focal: str,
+    moderator: str,
+    value_range: Tuple[float, float],
+    alpha: float = 1 - CONFIDENCE_LEVEL
+) -> JohnsonNeyman:
+    """
+    Johnson-Neyman bounds and regions of significance.
+
+    Parameters
+    ----------
+    params, cov, focal, moderator, alpha
+        As in simple_slopes()
+    value_range : tuple
+        (min, max) of the moderator to report regions for
+
+    Returns
+    -------
+    JohnsonNeyman
+    """
+    interaction = _interaction_term(list(params.index), focal, moderator)
+    b_f, b_i = float(params[focal]), float(params[interaction])
+    v_ff = float(cov.loc[focal, focal])
+    v_fi = float(cov.loc[focal, interaction])
+    v_ii = float(cov.loc[interaction, interaction])
+    z2 = stats.norm.ppf(1 - alpha / 2) ** 2
+
+    # Significant where f(m) = (b_f + m b_i)^2 - z^2 Var(b_f + m b_i) > 0
+    coefs = np.array([b_i ** 2 - z2 * v_ii,
+                      2 * (b_f * b_i - z2 * v_fi),
+                      b_f ** 2 - z2 * v_ff])
+    roots = np.roots(coefs) if np.any(coefs[:2]) else np.array([])
+    bounds = sorted(float(r.real) for r in roots if abs(r.imag) < 1e-12)
+
+    lo, hi = float(value_range[0]), float(value_range[1])
+    edges = [lo] + [b for b in bounds if lo < b < hi] + [hi]
+    regions = []
+    for a, b in zip(edges[:-1], edges[1:]):
+        if np.polyval(coefs, (a + b) / 2) > 0:
+            if regions and regions[-1][1] == a:
+                regions[-1] = (regions[-1][0], b)
+            else:
+                regions.append((a, b))
+    return JohnsonNeyman(bounds, regions, (lo, hi), alpha)
+
+
+def _fixed_effects(results: Any) -> Tuple[pd.Series, pd.DataFrame]:
+    """Fixed-effect estimates and their covariance of a fitted model."""
+    params = getattr(results, "fe_params", None)
+    if params is None:
+        params = results.params
+    cov = results.cov_params()
+    return params, cov.loc[params.index, params.index]
+
+
+def marginal_effects(
+    results: Any,
+    focal: str,
+    moderator: str,
+    data: Optional[pd.DataFrame] = None,
+    at: Optional[np.ndarray] = None,
+    n_points: int = MARGINS_GRID_POINTS,
+    alpha: float = 1 - CONFIDENCE_LEVEL
+) -> MarginalEffects:
+    """
+    Marginal effects of ``focal`` across ``moderator`` for a fitted model.
+
+    Parameters
+    ----------
+    results : fitted model
+        With params or fe_params and cov_params()
+    focal, moderator : str
+        Focal predictor and moderator (the model must contain their product)
+    data : pd.DataFrame, optional
+        Estimation data; sets the grid and the Johnson-Neyman range
+    at : np.ndarray, optional
+        Moderator values (default: moderator_grid of ``data[moderator]``)
+    n_points : int
+        Grid size for a continuous moderator
+    alpha : float
+        Significance level
+
+    Returns
+    -------
+    MarginalEffects
+        With ``johnson_neyman`` over the range of the grid
+    """
+    if at is None:
+        if data is None:
+            raise ValueError("Either data or at is required")
+        at = moderator_grid(data[moderator], n_points)
+    at = np.asarray(at, dtype=float)
+
+    params, cov = _fixed_effects(results)
+    effects = simple_slopes(params, cov, focal, moderator, at, alpha)
+    effects.johnson_neyman = johnson_neyman(
+        params, cov, focal, moderator, (at.min(), at.max()), alpha
+    )
+    return effects
@@ -23,11 +23,30 @@ import sys
 sys.path.insert(0, str(Path(__file__).parent.parent))
 from config import INDIVIDUAL_CONTROLS, BUURT_CONTROLS, MIN_CLUSTER_SIZE
 
+from .missingness import MissingnessIndex
+from .samples import sample_manager
+
 
 # =============================================================================
 # Data Merging
 # =============================================================================
 
+def _level_positions(table: pd.DataFrame, id_col: str, ids: pd.Series) -> np.ndarray:
+    """Row position of each ID in a level table (-1 where unmatched)."""
+    if table.index.name == "region_id" and table.index.is_unique:
+        # Pre-indexed by transform.prepare_admin_by_level
+        return table.index.get_indexer(ids)
+
+    index = pd.Index(table[id_col])
+    if index.is_unique:
+        return index.get_indexer(ids)
+
+    print(f"  Warning: duplicate {id_col} in admin data, keeping first")
+    first = np.flatnonzero(~index.duplicated())
+    found = index[first].get_indexer(ids)
+    return np.where(found >= 0, first[found], -1)
+
+
 def merge_survey_admin(
     survey: pd.DataFrame,
     admin_by_level: Dict[str, pd.DataFrame]
@@ -35,10 +54,11 @@ def merge_survey_admin(
     """
     Merge survey with administrative data at all three geographic levels.
 
-    Performs sequential left joins:
-    1. survey + buurt (on buurt_id)
-    2. result + wijk (on wijk_id)
-    3. result + gemeente (on gemeente_id)
+    Left join on buurt_id, wijk_id and gemeente_id. Each respondent is
+    located in the three level tables once (Index.get_indexer) and all
+    context columns are gathered by position into a single result, so the
+    survey is never re-hashed or copied per level and the row count cannot
+    change.
 
     Parameters
     ----------
@@ -54,30 +74,27 @@ def merge_survey_admin(
     """
     print("Merging survey with administrative data...")
 
-    merged = survey.copy()
-    initial_n = len(merged)
+    context = {}
 
-    # Merge buurt level
-    if "buurt" in admin_by_level and len(admin_by_level["buurt"]) > 0:
-        buurt_data = admin_by_level["buurt"]
-        merged = merged.merge(buurt_data, on="buurt_id", how="left")
-        print(f"  + Buurt: {len(buurt_data)} units")
+    for level in ["buurt", "wijk", "gemeente"]:
+        table = admin_by_level.get(level)
+        if table is None or len(table) == 0:
+            continue
 
-    # Merge wijk level
-    if "wijk" in admin_by_level and len(admin_by_level["wijk"]) > 0:
-        wijk_data = admin_by_level["wijk"]
-        merged = merged.merge(wijk_data, on="wijk_id", how="left")
-        print(f"  + Wijk: {len(wijk_data)} units")
+        id_col = f"{level}_id"
+        positions = _level_positions(table, id_col, survey[id_col])
 
-    # Merge gemeente level
-    if "gemeente" in admin_by_level and len(admin_by_level["gemeente"]) > 0:
-        gemeente_data = admin_by_level["gemeente"]
-        merged = merged.merge(gemeente_data, on="gemeente_id", how="left")
-        print(f"  + Gemeente: {len(gemeente_data)} units")
+        # Gather every context column; unmatched rows (-1) become missing
+        for col in table.columns:
+            if col != id_col:
+                context[col] = pd.api.extensions.take(
+                    table[col].array, positions, allow_fill=True
+                )
+        print(f"  + {level.capitalize()}: {len(table)} units")
 
-    # Check row count didn't change
-    if len(merged) != initial_n:
-        print(f"  Warning: Row count changed from {initial_n} to {len(merged)}")
+    merged = pd.concat(
+        [survey, pd.DataFrame(context, index=survey.index)], axis=1
+    )
 
     print(f"  Final merged data: {len(merged)} rows, {len(merged.columns)} columns")
     return merged
@@ -172,18 +189,21 @@ def analyze_missingness(data: pd.DataFrame) -> MissingnessReport:
     """
     print("\nAnalyzing missingness patterns...")
 
+    # One pass over the data; patterns and rates come from the bitmasks
+    missing = MissingnessIndex(data)
+
     # Geographic pattern (cross-tab of which levels matched)
-    geo_pattern = pd.DataFrame({
-        "has_buurt": data.get("b_pop_total", pd.Series()).notna(),
-        "has_wijk": data.get("w_pop_total", pd.Series()).notna(),
-        "has_gemeente": data.get("g_pop_total", pd.Series()).notna()
-    }).value_counts().reset_index(name="count")
+    levels = {"b_pop_total": "has_buurt", "w_pop_total": "has_wijk",
+              "g_pop_total": "has_gemeente"}
+    levels = {col: name for col, name in levels.items() if col in data.columns}
+    geo_pattern = missing.patterns(list(levels)).rename(columns=levels)
+    geo_pattern[list(levels.values())] = ~geo_pattern[list(levels.values())]
 
     print(f"  Geographic patterns:")
     print(geo_pattern.to_string(index=False))
 
     # Variable-level missingness
-    missing_pct = data.isna().mean() * 100
+    missing_pct = missing.missing_rate() * 100
     var_missingness = pd.DataFrame({
         "variable": missing_pct.index,
         "pct_missing": missing_pct.values
@@ -320,19 +340,17 @@ def create_analysis_sample(
     required = [v for v in required if v in data.columns]
     print(f"  Required variables: {len(required)}")
 
-    # Create complete cases
+    # Complete cases, then clusters with minimum size (row positions only)
+    samples = sample_manager(data)
     initial_n = len(data)
-    sample = data.dropna(subset=required).copy()
-    final_n = len(sample)
+    final_n = len(samples.view(required))
 
     print(f"  Complete cases: {final_n}/{initial_n} ({final_n/initial_n*100:.1f}%)")
 
-    # Filter to clusters with minimum size
-    cluster_sizes = sample["buurt_id"].value_counts()
-    valid_clusters = cluster_sizes[cluster_sizes >= MIN_CLUSTER_SIZE].index
-    sample = sample[sample["buurt_id"].isin(valid_clusters)]
+    view = samples.view(required, MIN_CLUSTER_SIZE)
+    sample = data.iloc[view.rows]
 
     print(f"  After cluster filter (min={MIN_CLUSTER_SIZE}): {len(sample)} observations")
-    print(f"  Unique buurten: {sample['buurt_id'].nunique()}")
+    print(f"  Unique buurten: {view.n_clusters}")
 
     return sample
@@ -0,0 +1,131 @@
+# =============================================================================
+# missingness.py - Bitmask Missingness Index
+# =============================================================================
+"""
+Row-wise missingness of a data frame as packed bitmasks.
+
+The frame is scanned once: each row gets one bit per column (set when the
+value is missing), packed into uint64 words. Afterwards
+
+- the complete cases for any variable list are one AND/compare over the
+  packed words (no dropna over the columns again),
+- missingness patterns over a few variables are a bincount of the
+  extracted bits,
+- per-column missing rates are kept from the build.
+
+Used for the missingness report and, through samples.SampleManager, for
+every analysis sample.
+
+Classes:
+    MissingnessIndex: Packed missingness bits of a data frame
+"""
+
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+# Patterns over up to this many variables are counted with np.bincount
+_BINCOUNT_MAX_VARS = 16
+
+
+class MissingnessIndex:
+    """
+    Packed per-row missingness bits.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        Data to index
+    columns : sequence of str, optional
+        Columns to index (default: all)
+    """
+
+    def __init__(self, data: pd.DataFrame, columns: Optional[Sequence[str]] = None):
+        columns = list(data.columns if columns is None else columns)
+        self.columns = columns
+        self.n_rows = len(data)
+        self._position: Dict[str, int] = {c: j for j, c in enumerate(columns)}
+
+        self.bits = np.zeros((self.n_rows, (len(columns) + 63) // 64), dtype=np.uint64)
+        n_missing = np.zeros(len(columns), dtype=np.int64)
+        for j, col in enumerate(columns):
+            isna = data[col].isna().to_numpy()
+            n_missing[j] = isna.sum()
+            if n_missing[j]:
+                self.bits[:, j // 64] |= isna.astype(np.uint64) << np.uint64(j % 64)
+        self.n_missing = pd.Series(n_missing, index=pd.Index(columns, dtype=object))
+
+    def _masks(self, columns: Sequence[str]) -> np.ndarray:
+        """Word masks selecting ``columns``."""
+        masks = np.zeros(self.bits.shape[1], dtype=np.uint64)
+        for col in columns:
+            j = self._position[col]
+            masks[j // 64] |= np.uint64(1) << np.uint64(j % 64)
+        return masks
+
+    def complete(self, columns: Sequence[str]) -> np.ndarray:
+        """
+        Complete-case mask for ``columns``.
+
+        Parameters
+        ----------
+        columns : sequence of str
+            Indexed columns that must be non-missing
+
+        Returns
+        -------
+        np.ndarray
+            Boolean mask over rows (same as ``data[columns].notna().all(axis=1)``)
+        """
+        masks = self._masks(columns)
+        words = np.flatnonzero(masks)
+        if len(words) == 0:
+            return np.ones(self.n_rows, dtype=bool)
+        if len(words) == 1:
+            w = words[0]
+            return (self.bits[:, w] & masks[w]) == 0
+        return ~((self.bits[:, words] & masks[words]).any(axis=1))
+
+    def missing(self, column: str) -> np.ndarray:
+        """Boolean missing-value mask of one column."""
+        j = self._position[column]
+        return ((self.bits[:, j // 64] >> np.uint64(j % 64)) & np.uint64(1)).astype(bool)
+
+    def missing_rate(self) -> pd.Series:
+        """Share of missing values per column."""
+        return self.n_missing / max(self.n_rows, 1)
+
+    def patterns(self, columns: Sequence[str]) -> pd.DataFrame:
+        """
+        Counts of the missingness patterns over ``columns``.
+
+        Parameters
+        ----------
+        columns : sequence of str
+            Indexed columns
+
+        Returns
+        -------
+        pd.DataFrame
+            One boolean column per variable (True = missing) and ``count``,
+            observed patterns only, most frequent first
+        """
+        columns = list(columns)
+        code = np.zeros(self.n_rows, dtype=np.int64)
+        for k, col in enumerate(columns):
+            code |= self.missing(col).astype(np.int64) << k
+
+        if len(columns) <= _BINCOUNT_MAX_VARS:
+            counts = np.bincount(code, minlength=1 << len(columns))
+            observed = np.flatnonzero(counts)
+            counts = counts[observed]
+        else:
+            observed, counts = np.unique(code, return_counts=True)
+
+        table = pd.DataFrame({
+            col: (observed >> k) & 1 == 1 for k, col in enumerate(columns)
+        })
+        table["count"] = counts
+        return table.sort_values("count", ascending=False, kind="stable").reset_index(drop=True)
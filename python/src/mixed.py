@@ -0,0 +1,1040 @@
+# =============================================================================
+# mixed.py - Closed-Form Random-Intercept Engine
+# =============================================================================
+"""
+Fast REML/ML estimation of two-level random-intercept models.
+
+For y_ij = x_ij'b + u_j + e_ij with u_j ~ N(0, s2 * gamma) and
+e_ij ~ N(0, s2), the inverse covariance of cluster j has the closed form
+(I - w_j 11') / s2 with w_j = gamma / (1 + n_j gamma). All likelihood terms
+therefore reduce to per-cluster sufficient statistics (n_j, X_j'1, y_j'1)
+plus the global X'X, X'y and y'y. The scale s2 and the fixed effects are
+profiled out, leaving a 1-D optimization over the variance ratio gamma.
+
+Each likelihood evaluation costs O(m p^2) for m clusters and p fixed
+effects; building the statistics costs a single O(N p) pass.
+
+Classes:
+    GroupStructure: Cluster coding shared by all models on the same sample
+    SufficientStatistics: Stored statistics of a model, combinable over partitions
+    RandomInterceptModel: Model built from arrays or a patsy formula
+    RandomInterceptResults: Fitted model with a MixedLMResults-like surface
+    NestedModelSequence: Warm-started fitting of nested specifications
+
+Functions:
+    fit_random_intercept: Formula interface, drop-in for smf.mixedlm().fit()
+    cluster_aggregates: Per-cluster n, sum y, sum y^2 and cluster-level covariates
+    fit_cluster_aggregates: Fit a cluster-level-predictor model from that table
+    statsmodels_mixedlm: MixedLM model from cached design matrices
+"""
+
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+from scipy import optimize, stats
+
+from .design import dmatrices
+from .nested import NestedRandomEffectsModel
+
+
+# Bounds for log(gamma) = log(var_group / var_residual)
+_LOG_GAMMA_BOUNDS = (-30.0, 15.0)
+# Starting grid for log(gamma): gamma from about 5e-5 to 150
+_LOG_GAMMA_GRID = np.arange(-10.0, 5.5, 1.0)
+# Warm starts: spacing of the first three points and tolerance (log scale)
+_WARM_STEP = 0.05
+_WARM_XTOL = 1e-8
+_WARM_MAX_STEPS = 30
+
+
+# =============================================================================
+# Grouping Structure
+# =============================================================================
+
+class GroupStructure:
+    """
+    Integer coding of cluster labels, computed once per estimation sample.
+
+    Parameters
+    ----------
+    groups : array-like
+        Cluster labels (N,)
+    """
+
+    def __init__(self, groups: Any):
+        codes, labels = pd.factorize(np.asarray(groups), sort=True)
+        if (codes < 0).any():
+            raise ValueError("Group labels must not contain missing values")
+        self.codes = codes
+        self.labels = labels
+        self.n_groups = len(labels)
+        self.n_j = np.bincount(codes, minlength=self.n_groups).astype(float)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def take(self, positions: np.ndarray) -> "GroupStructure":
+        """Structure for a row subset (re-coded so every cluster is non-empty)."""
+        return GroupStructure(self.labels[self.codes[positions]])
+
+
+# =============================================================================
+# Sufficient Statistics
+# =============================================================================
+
+@dataclass
+class SufficientStatistics:
+    """
+    Everything the likelihood needs: cluster sums plus global cross-products.
+
+    Statistics of samples with disjoint clusters (e.g. gemeente partitions,
+    which never split a buurt) combine exactly with concat().
+    """
+    exog_names: List[str]
+    labels: np.ndarray      # cluster labels (m,)
+    n_j: np.ndarray         # observations per cluster (m,)
+    sx_j: np.ndarray        # X_j'1 (m, p)
+    sy_j: np.ndarray        # y_j'1 (m,)
+    xtx: np.ndarray         # X'X (p, p)
+    xty: np.ndarray         # X'y (p,)
+    yty: float              # y'y
+
+    @property
+    def nobs(self) -> int:
+        return int(round(self.n_j.sum()))
+
+    @classmethod
+    def concat(cls, parts: Sequence["SufficientStatistics"]) -> "SufficientStatistics":
+        """
+        Combine statistics of samples with disjoint clusters.
+
+        Clusters are ordered by label, as in GroupStructure.
+        """
+        parts = [p for p in parts if len(p.labels)]
+        if not parts:
+            raise ValueError("No statistics to combine")
+        names = parts[0].exog_names
+        if any(p.exog_names != names for p in parts):
+            raise ValueError("Statistics have different design columns")
+
+        labels = np.concatenate([p.labels for p in parts])
+        order = np.argsort(labels, kind="stable")
+        labels = labels[order]
+        if (labels[1:] == labels[:-1]).any():
+            raise ValueError("Clusters occur in more than one part")
+        return cls(
+            exog_names=list(names),
+            labels=labels,
+            n_j=np.concatenate([p.n_j for p in parts])[order],
+            sx_j=np.concatenate([p.sx_j for p in parts])[order],
+            sy_j=np.concatenate([p.sy_j for p in parts])[order],
+            xtx=sum(p.xtx for p in parts),
+            xty=sum(p.xty for p in parts),
+            yty=float(sum(p.yty for p in parts)),
+        )
+
+    @classmethod
+    def from_cluster_table(
+        cls,
+        formula: str,
+        table: pd.DataFrame,
+        n: str = "n",
+        sum_y: str = "sum_y",
+        sum_y2: str = "sum_y2"
+    ) -> "SufficientStatistics":
+        """
+        Statistics of a model whose predictors are all cluster-level.
+
+        With a design row z_j shared by every member of cluster j, the
+        statistics need only n_j, sum y and sum y^2 per cluster:
+        X_j'1 = n_j z_j, X'X = sum_j n_j z_j z_j', X'y = sum_j z_j sum_i y_ij
+        and y'y = sum_j sum_i y_ij^2.
+
+        Parameters
+        ----------
+        formula : str
+            Fixed-effects formula; the right-hand side is evaluated on the
+            table (clusters with missing predictors are dropped, as patsy
+            drops their rows), the outcome name is not used
+        table : pd.DataFrame
+            One row per cluster, indexed by cluster label (see
+            cluster_aggregates)
+        n, sum_y, sum_y2 : str
+            Columns with the cluster size and the outcome sums
+
+        Returns
+        -------
+        SufficientStatistics
+        """
+        from patsy import dmatrix
+
+        if table.index.has_duplicates or table.index.hasnans:
+            raise ValueError("Cluster table needs one row per cluster label")
+        rhs = formula.split("~", 1)[-1]
+        Z = dmatrix(rhs, table, return_type="dataframe")
+        rows = table.loc[Z.index]
+        rows = rows[rows[n] > 0].sort_index()
+        names = list(Z.columns)
+        Z = Z.loc[rows.index].to_numpy(dtype=float)
+
+        n_j = rows[n].to_numpy(dtype=float)
+        sy_j = rows[sum_y].to_numpy(dtype=float)
+        sx_j = Z * n_j[:, None]
+        return cls(
+            exog_names=names,
+            labels=rows.index.to_numpy(),
+            n_j=n_j,
+            sx_j=sx_j,
+            sy_j=sy_j,
+            xtx=Z.T @ sx_j,
+            xty=Z.T @ sy_j,
+            yty=float(rows[sum_y2].sum()),
+        )
+
+    def save(self, path: Path) -> None:
+        """Write the arrays to one .npz file."""
+        labels = np.asarray(self.labels)
+        if labels.dtype == object:
+            integer = pd.api.types.infer_dtype(labels) == "integer"
+            labels = labels.astype(np.int64 if integer else str)
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez(path, exog_names=np.asarray(self.exog_names, dtype=str),
+                 labels=labels, n_j=self.n_j, sx_j=self.sx_j, sy_j=self.sy_j,
+                 xtx=self.xtx, xty=self.xty, yty=np.float64(self.yty))
+
+    @classmethod
+    def load(cls, path: Path) -> "SufficientStatistics":
+        """Read statistics written by save()."""
+        with np.load(path) as f:
+            return cls(list(f["exog_names"]), f["labels"], f["n_j"], f["sx_j"],
+                       f["sy_j"], f["xtx"], f["xty"], float(f["yty"]))
+
+
+# =============================================================================
+# Model
+# =============================================================================
+
+class RandomInterceptModel:
+    """
+    Random-intercept linear mixed model estimated from sufficient statistics.
+
+    Parameters
+    ----------
+    endog : array-like
+        Outcome vector (N,)
+    exog : array-like
+        Fixed-effects design matrix (N, p)
+    groups : array-like or GroupStructure
+        Cluster labels (N,), or a precomputed GroupStructure
+    exog_names : list of str, optional
+        Names of the design matrix columns
+    """
+
+    def __init__(
+        self,
+        endog: Any,
+        exog: Any,
+        groups: Any,
+        exog_names: Optional[Sequence[str]] = None
+    ):
+        y = np.asarray(endog, dtype=float)
+        X = np.asarray(exog, dtype=float)
+        if X.ndim == 1:
+            X = X[:, None]
+        if exog_names is None:
+            exog_names = (list(exog.columns) if isinstance(exog, pd.DataFrame)
+                          else [f"x{i}" for i in range(X.shape[1])])
+
+        structure = groups if isinstance(groups, GroupStructure) else GroupStructure(groups)
+        if len(structure) != len(y):
+            raise ValueError("groups and endog have different lengths")
+        codes = structure.codes
+
+        self.endog = y
+        self.exog = X
+        self.exog_names = list(exog_names)
+        self.groups = structure
+        self.group_codes = codes
+        self.group_labels = structure.labels
+        self.nobs, self.k_fe = X.shape
+        self.n_groups = structure.n_groups
+
+        # Global cross-products and per-cluster sums (single O(N p) pass)
+        self.xtx = X.T @ X
+        self.xty = X.T @ y
+        self.yty = float(y @ y)
+        self.n_j = structure.n_j
+        self.sx_j = np.column_stack([
+            np.bincount(codes, weights=X[:, k], minlength=self.n_groups)
+            for k in range(self.k_fe)
+        ])
+        self.sy_j = np.bincount(codes, weights=y, minlength=self.n_groups)
+
+        # Multiplicity of each cluster (None = 1); set by resample_clusters()
+        self.cluster_weights = None
+        self._cluster_products = None
+        self._n_evals = 0
+
+    @classmethod
+    def from_formula(
+        cls,
+        formula: str,
+        data: pd.DataFrame,
+        groups: str,
+        structure: Optional[GroupStructure] = None
+    ) -> "RandomInterceptModel":
+        """
+        Build the model from a patsy formula (rows with NA are dropped).
+
+        Parameters
+        ----------
+        formula : str
+            Fixed-effects formula, e.g. "DV_single ~ b_perc_low40_hh + age"
+        data : pd.DataFrame
+            Data containing the formula variables and the grouping column
+        groups : str
+            Name of the grouping column
+        structure : GroupStructure, optional
+            Precomputed coding of ``data[groups]`` to reuse across models
+
+        Returns
+        -------
+        RandomInterceptModel
+        """
+        y, X = dmatrices(formula, data)
+        if structure is None or len(structure) != len(data):
+            structure = GroupStructure(data.loc[X.index, groups])
+        elif len(X) != len(data):
+            structure = structure.take(data.index.get_indexer(X.index))
+        model = cls(y.iloc[:, 0], X, structure, list(X.columns))
+        model.formula = formula
+        model.group_name = groups
+        model.row_index = X.index
+        return model
+
+    @classmethod
+    def from_statistics(cls, statistics: SufficientStatistics) -> "RandomInterceptModel":
+        """
+        Model from stored sufficient statistics.
+
+        Fits, standard errors and random effects are the same as for the
+        rows the statistics came from; the model has no row-level data
+        (exog/endog are None), so residuals, fitted values and
+        cluster resampling are unavailable.
+
+        Parameters
+        ----------
+        statistics : SufficientStatistics
+            E.g. SufficientStatistics.concat() of per-partition statistics
+
+        Returns
+        -------
+        RandomInterceptModel
+        """
+        model = object.__new__(cls)
+        model.endog = model.exog = model.group_codes = model.groups = None
+        model.exog_names = list(statistics.exog_names)
+        model.group_labels = np.asarray(statistics.labels)
+        model.n_groups = len(model.group_labels)
+        model.nobs = statistics.nobs
+        model.k_fe = len(model.exog_names)
+        model.xtx = np.asarray(statistics.xtx, dtype=float)
+        model.xty = np.asarray(statistics.xty, dtype=float)
+        model.yty = float(statistics.yty)
+        model.n_j = np.asarray(statistics.n_j, dtype=float)
+        model.sx_j = np.asarray(statistics.sx_j, dtype=float).reshape(model.n_groups, model.k_fe)
+        model.sy_j = np.asarray(statistics.sy_j, dtype=float)
+        model.cluster_weights = None
+        model._cluster_products = None
+        model._n_evals = 0
+        return model
+
+    def statistics(self) -> SufficientStatistics:
+        """The model's sufficient statistics (e.g. to store per partition)."""
+        if self.cluster_weights is not None:
+            raise ValueError("Statistics of a resampled model are weighted")
+        return SufficientStatistics(
+            exog_names=list(self.exog_names),
+            labels=np.asarray(self.group_labels),
+            n_j=self.n_j, sx_j=self.sx_j, sy_j=self.sy_j,
+            xtx=self.xtx, xty=self.xty, yty=self.yty,
+        )
+
+    def subset(self, columns: Sequence[str]) -> "RandomInterceptModel":
+        """
+        Model on a subset of the design columns, same rows and clusters.
+
+        Slices the stored cross-products and cluster sums instead of
+        recomputing them, so nested or alternative control sets fitted on
+        one sample cost O(p^2 G) each rather than O(N p).
+
+        Parameters
+        ----------
+        columns : sequence of str
+            Design column names to keep (in the order given)
+
+        Returns
+        -------
+        RandomInterceptModel
+        """
+        ix = np.array([self.exog_names.index(c) for c in columns], dtype=int)
+        model = object.__new__(type(self))
+        model.__dict__.update(self.__dict__)
+        model.exog = None if self.exog is None else self.exog[:, ix]
+        model.exog_names = list(columns)
+        model.k_fe = len(ix)
+        model.xtx = self.xtx[np.ix_(ix, ix)]
+        model.xty = self.xty[ix]
+        model.sx_j = self.sx_j[:, ix]
+        model._cluster_products = None
+        model._n_evals = 0
+        return model
+
+    # -------------------------------------------------------------------------
+    # Resampling (bootstrap replicates from sufficient statistics)
+    # -------------------------------------------------------------------------
+
+    def cluster_products(self) -> Dict[str, np.ndarray]:
+        """
+        Per-cluster cross-products X_j'X_j, X_j'y_j and y_j'y_j (cached).
+
+        Returns
+        -------
+        dict
+            "xtx" (m, p, p), "xty" (m, p) and "yty" (m,)
+        """
+        if self._cluster_products is None:
+            codes, m = self.group_codes, self.n_groups
+            X, y = self.exog, self.endog
+            xtx = np.empty((m, self.k_fe, self.k_fe))
+            for k in range(self.k_fe):
+                for l in range(k, self.k_fe):
+                    xtx[:, k, l] = xtx[:, l, k] = np.bincount(
+                        codes, weights=X[:, k] * X[:, l], minlength=m)
+            xty = np.column_stack([
+                np.bincount(codes, weights=X[:, k] * y, minlength=m)
+                for k in range(self.k_fe)
+            ])
+            yty = np.bincount(codes, weights=y * y, minlength=m)
+            self._cluster_products = {"xtx": xtx, "xty": xty, "yty": yty}
+        return self._cluster_products
+
+    def resample_clusters(self, counts: np.ndarray) -> "RandomInterceptModel":
+        """
+        Model for a cluster-bootstrap sample.
+
+        Cluster j enters ``counts[j]`` times (each copy is a separate
+        cluster). The statistics are weighted sums of the per-cluster
+        cross-products, so no rows are copied. The replicate has no
+        row-level data (exog/endog are None).
+
+        Parameters
+        ----------
+        counts : np.ndarray
+            Draw count per cluster (length n_groups)
+
+        Returns
+        -------
+        RandomInterceptModel
+        """
+        prod = self.cluster_products()
+        keep = np.flatnonzero(counts)
+        c = np.asarray(counts, dtype=float)[keep]
+
+        model = object.__new__(type(self))
+        model.__dict__.update(self.__dict__)
+        model.endog = model.exog = model.group_codes = None
+        model.group_labels = self.group_labels[keep]
+        model.n_groups = len(keep)
+        model.n_j = self.n_j[keep]
+        model.sx_j = self.sx_j[keep]
+        model.sy_j = self.sy_j[keep]
+        model.cluster_weights = c
+        model.nobs = int(round(c @ model.n_j))
+        model.xtx = np.einsum("j,jkl->kl", c, prod["xtx"][keep])
+        model.xty = c @ prod["xty"][keep]
+        model.yty = float(c @ prod["yty"][keep])
+        model._cluster_products = None
+        model._n_evals = 0
+        return model
+
+    def with_endog(self, endog: np.ndarray) -> "RandomInterceptModel":
+        """
+        Same design and clusters with a new outcome (parametric bootstrap).
+
+        Parameters
+        ----------
+        endog : np.ndarray
+            Outcome vector (N,)
+
+        Returns
+        -------
+        RandomInterceptModel
+        """
+        y = np.asarray(endog, dtype=float)
+        model = object.__new__(type(self))
+        model.__dict__.update(self.__dict__)
+        model.endog = y
+        model.xty = self.exog.T @ y
+        model.yty = float(y @ y)
+        model.sy_j = np.bincount(self.group_codes, weights=y, minlength=self.n_groups)
+        model._cluster_products = None
+        model._n_evals = 0
+        return model
+
+    # -------------------------------------------------------------------------
+    # Profiled likelihood
+    # -------------------------------------------------------------------------
+
+    def _profile(self, gamma: float, reml: bool) -> Dict[str, Any]:
+        """
+        Profile out fixed effects and scale for a given variance ratio.
+
+        Returns
+        -------
+        dict
+            llf, fe_params, scale, xtvx (X' H^-1 X) and weights w_j
+        """
+        self._n_evals += 1
+        w = gamma / (1.0 + self.n_j * gamma)
+        # Resampled clusters count once per draw
+        wc = w if self.cluster_weights is None else w * self.cluster_weights
+
+        xtvx = self.xtx - (self.sx_j * wc[:, None]).T @ self.sx_j
+        xtvy = self.xty - self.sx_j.T @ (wc * self.sy_j)
+        ytvy = self.yty - np.sum(wc * self.sy_j ** 2)
+
+        chol = np.linalg.cholesky(xtvx)
+        fe = np.linalg.solve(xtvx, xtvy)
+        rss = ytvy - xtvy @ fe
+
+        log_h = np.log1p(self.n_j * gamma)
+        if self.cluster_weights is not None:
+            log_h = log_h * self.cluster_weights
+        logdet_h = np.sum(log_h)
+        n, p = self.nobs, self.k_fe
+        if reml:
+            dof = n - p
+            scale = rss / dof
+            logdet_x = 2.0 * np.sum(np.log(np.diag(chol)))
+            llf = -0.5 * (dof * (np.log(2 * np.pi * scale) + 1.0)
+                          + logdet_h + logdet_x)
+        else:
+            scale = rss / n
+            llf = -0.5 * (n * (np.log(2 * np.pi * scale) + 1.0) + logdet_h)
+
+        return {"llf": llf, "fe_params": fe, "scale": scale,
+                "xtvx": xtvx, "w": w}
+
+    def loglike(self, gamma: float, reml: bool = True) -> float:
+        """Profiled (RE)ML log-likelihood at variance ratio ``gamma``."""
+        return self._profile(gamma, reml)["llf"]
+
+    # -------------------------------------------------------------------------
+    # Fitting
+    # -------------------------------------------------------------------------
+
+    def fit(
+        self,
+        reml: bool = True,
+        start_gamma: Optional[float] = None
+    ) -> "RandomInterceptResults":
+        """
+        Estimate the model.
+
+        Parameters
+        ----------
+        reml : bool
+            Restricted (default) or full maximum likelihood
+        start_gamma : float, optional
+            Variance ratio var_group / var_residual of a preceding, similar
+            model; the search then takes parabolic steps from it instead of
+            scanning the full grid
+
+        Returns
+        -------
+        RandomInterceptResults
+        """
+        self._n_evals = 0
+
+        def objective(t):
+            return -self.loglike(np.exp(t), reml)
+
+        # Cold starts bracket the maximum on a grid, then refine it with a
+        # bounded 1-D search: a gradient step from a single start can
+        # overshoot onto the flat region near gamma = 0 and stop there.
+        found = None
+        if start_gamma and start_gamma > 0:
+            t0 = float(np.clip(np.log(start_gamma), *_LOG_GAMMA_BOUNDS))
+            found = _search_from(objective, t0)
+        if found is not None:
+            t, fun, n_iter = found
+            converged = True
+        else:
+            lower, upper, t_best, f_best = _bracket_on_grid(objective)
+            opt = optimize.minimize_scalar(
+                objective, bounds=(lower, upper), method="bounded",
+                options={"xatol": 1e-8}
+            )
+            t, fun = (opt.x, opt.fun) if opt.fun <= f_best else (t_best, f_best)
+            converged, n_iter = bool(opt.success), int(getattr(opt, "nit", opt.nfev))
+        gamma = float(np.exp(t))
+
+        # The boundary gamma = 0 (no between-cluster variance) is not
+        # reachable on the log scale; take it if it is at least as good.
+        if self.loglike(0.0, reml) >= -fun:
+            gamma = 0.0
+
+        return RandomInterceptResults(
+            self, gamma, reml,
+            converged=converged, n_iter=n_iter, n_evals=self._n_evals
+        )
+
+
+def _bracket_on_grid(objective: Callable) -> Tuple[float, float, float, float]:
+    """(lower, upper, t, f) around the best point of _LOG_GAMMA_GRID."""
+    grid = _LOG_GAMMA_GRID
+    values = [objective(t) for t in grid]
+    i = int(np.argmin(values))
+    lower = grid[i - 1] if i > 0 else _LOG_GAMMA_BOUNDS[0]
+    upper = grid[i + 1] if i < len(grid) - 1 else _LOG_GAMMA_BOUNDS[1]
+    return lower, upper, grid[i], values[i]
+
+
+def _search_from(
+    objective: Callable,
+    t0: float
+) -> Optional[Tuple[float, float, int]]:
+    """
+    Minimize from a warm start t0 = log(gamma) by successive parabolic
+    interpolation: evaluate t0 and t0 +/- _WARM_STEP, then move to the
+    vertex of the parabola through the three best points until the step
+    falls below _WARM_XTOL. Near the previous model's optimum this takes a
+    handful of evaluations instead of a full bracket search.
+
+    Returns (t, f, steps), or None if the points stop being convex (e.g.
+    on the flat region near gamma = 0) or the search does not settle; the
+    caller then falls back to the grid.
+    """
+    lo_bound, hi_bound = _LOG_GAMMA_BOUNDS
+    points = [(t, objective(t)) for t in
+              (max(t0 - _WARM_STEP, lo_bound), t0, min(t0 + _WARM_STEP, hi_bound))]
+
+    for step in range(1, _WARM_MAX_STEPS + 1):
+        (a, fa), (b, fb), (c, fc) = sorted(points)
+        if not a < b < c:
+            return None
+        curvature = ((fc - fb) / (c - b) - (fb - fa) / (b - a)) / (c - a)
+        if curvature <= 0:
+            return None
+        num = (b - a) ** 2 * (fb - fc) - (b - c) ** 2 * (fb - fa)
+        den = (b - a) * (fb - fc) - (b - c) * (fb - fa)
+        t_best, f_best = min(points, key=lambda p: p[1])
+        # Newton step on the parabola, at most 2 (a factor e^2 in gamma)
+        t_new = float(np.clip(b - 0.5 * num / den, t_best - 2.0, t_best + 2.0))
+        t_new = float(np.clip(t_new, lo_bound, hi_bound))
+        if abs(t_new - t_best) < _WARM_XTOL:
+            return t_best, f_best, step
+        points = sorted(points + [(t_new, objective(t_new))], key=lambda p: p[1])[:3]
+
+    return None
+
+
+# =============================================================================
+# Results
+# =============================================================================
+
+class RandomInterceptResults:
+    """
+    Fitted random-intercept model.
+
+    Mirrors the parts of statsmodels' MixedLMResults used by this pipeline:
+    params (fixed effects followed by "Group Var" = cov_re / scale), bse,
+    fe_params, cov_re, scale, random_effects, llf, aic/bic (NaN under REML,
+    as in statsmodels), nobs, resid, fittedvalues, tvalues, pvalues and
+    cov_params().
+    """
+
+    def __init__(
+        self,
+        model: RandomInterceptModel,
+        gamma: float,
+        reml: bool,
+        converged: bool = True,
+        n_iter: int = 0,
+        n_evals: int = 0
+    ):
+        prof = model._profile(gamma, reml)
+        names = model.exog_names
+
+        self.model = model
+        self.reml = reml
+        self.method = "REML" if reml else "ML"
+        self.gamma = gamma
+        self.converged = converged
+        self.n_iter = n_iter
+        self.n_evals = n_evals
+        self.nobs = model.nobs
+        self.k_fe = model.k_fe
+        self.llf = float(prof["llf"])
+        self.scale = float(prof["scale"])
+
+        self.fe_params = pd.Series(prof["fe_params"], index=names)
+        cov_fe = self.scale * np.linalg.inv(prof["xtvx"])
+        self._cov_fe = pd.DataFrame(cov_fe, index=names, columns=names)
+        self.bse_fe = pd.Series(np.sqrt(np.diag(cov_fe)), index=names)
+
+        self.cov_re = pd.DataFrame([[gamma * self.scale]],
+                                   index=["Group"], columns=["Group"])
+        var_gamma = self._gamma_variance()
+        self.params = pd.concat([self.fe_params, pd.Series({"Group Var": gamma})])
+        self.bse = pd.concat([self.bse_fe,
+                              pd.Series({"Group Var": np.sqrt(var_gamma)})])
+
+        # BLUPs: u_j = w_j * (sum_i y_ij - (sum_i x_ij)' b)
+        blup = prof["w"] * (model.sy_j - model.sx_j @ prof["fe_params"])
+        self._blup = blup
+        self._random_effects = None
+
+        # AIC/BIC are undefined for REML fits (statsmodels returns NaN)
+        if reml:
+            self.aic = np.nan
+            self.bic = np.nan
+        else:
+            k = self.k_fe + 2
+            self.aic = -2 * self.llf + 2 * k
+            self.bic = -2 * self.llf + np.log(self.nobs) * k
+
+    def _gamma_variance(self) -> float:
+        """Variance of gamma-hat from the curvature of the profiled likelihood."""
+        g = max(self.gamma, 1e-8)
+        h = 1e-4 * max(g, 1e-2)
+        # Forward second difference (g, g+h, g+2h) where g-h would cross 0
+        center = g + h if g - h < 0 else g
+        ll = [self.model.loglike(center + d, self.reml) for d in (-h, 0.0, h)]
+        curvature = (ll[0] - 2 * ll[1] + ll[2]) / h ** 2
+        return -1.0 / curvature if curvature < 0 else np.nan
+
+    # -------------------------------------------------------------------------
+    # Derived quantities
+    # -------------------------------------------------------------------------
+
+    @property
+    def index(self) -> pd.Index:
+        """Row labels of the estimation sample."""
+        return getattr(self.model, "row_index", pd.RangeIndex(self.nobs))
+
+    @property
+    def random_effects(self) -> Dict[Any, pd.Series]:
+        """Predicted random intercepts by cluster (built on first access)."""
+        if self._random_effects is None:
+            self._random_effects = {
+                label: pd.Series([u], index=["Group"])
+                for label, u in zip(self.model.group_labels, self._blup)
+            }
+        return self._random_effects
+
+    @property
+    def fittedvalues(self) -> pd.Series:
+        """Fitted values including the predicted random intercepts."""
+        xb = self.model.exog @ self.fe_params.values
+        return pd.Series(xb + self._blup[self.model.group_codes], index=self.index)
+
+    @property
+    def resid(self) -> pd.Series:
+        """Residuals (outcome minus fitted values with random intercepts)."""
+        return pd.Series(self.model.endog, index=self.index) - self.fittedvalues
+
+    @property
+    def tvalues(self) -> pd.Series:
+        return self.params / self.bse
+
+    @property
+    def pvalues(self) -> pd.Series:
+        return pd.Series(2 * stats.norm.sf(np.abs(self.tvalues)), index=self.params.index)
+
+    def cov_params(self) -> pd.DataFrame:
+        """Covariance matrix of the fixed-effects estimates."""
+        return self._cov_fe.copy()
+
+    def conf_int(self, alpha: float = 0.05) -> pd.DataFrame:
+        """Wald confidence intervals for the fixed effects."""
+        z = stats.norm.ppf(1 - alpha / 2)
+        return pd.DataFrame({0: self.fe_params - z * self.bse_fe,
+                             1: self.fe_params + z * self.bse_fe})
+
+    def summary(self) -> str:
+        """Plain-text coefficient table."""
+        table = pd.DataFrame({
+            "Coef.": self.params,
+            "Std.Err.": self.bse,
+            "z": self.tvalues,
+            "P>|z|": self.pvalues,
+        })
+        header = (f"Random-intercept model ({self.method})\n"
+                  f"N={self.nobs}, groups={self.model.n_groups}, "
+                  f"scale={self.scale:.4f}, log-likelihood={self.llf:.4f}\n")
+        return header + table.to_string(float_format=lambda v: f"{v:.4f}")
+
+
+# =============================================================================
+# Formula Interface
+# =============================================================================
+
+def fit_random_intercept(
+    formula: str,
+    data: pd.DataFrame,
+    groups: str,
+    reml: bool = True,
+    start_gamma: Optional[float] = None
+) -> RandomInterceptResults:
+    """
+    Fit a random-intercept model from a formula.
+
+    Equivalent to ``smf.mixedlm(formula, data, groups=groups).fit(reml=reml)``
+    for models with a single random intercept.
+
+    Parameters
+    ----------
+    formula : str
+        Fixed-effects formula
+    data : pd.DataFrame
+        Estimation data
+    groups : str
+        Grouping column (e.g. "buurt_id")
+    reml : bool
+        Use REML (default) or ML
+    start_gamma : float, optional
+        Starting value for var_group / var_residual
+
+    Returns
+    -------
+    RandomInterceptResults
+    """
+    model = RandomInterceptModel.from_formula(formula, data, groups)
+    return model.fit(reml=reml, start_gamma=start_gamma)
+
+
+def cluster_aggregates(
+    data: pd.DataFrame,
+    outcome: str,
+    groups: str,
+    covariates: Sequence[str] = ()
+) -> pd.DataFrame:
+    """
+    Compact per-cluster table for models with cluster-level predictors only.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        Row-level data
+    outcome : str
+        Outcome column (rows where it is missing are not counted)
+    groups : str
+        Grouping column (e.g. "buurt_id")
+    covariates : sequence of str
+        Cluster-level columns to carry over; each must be constant within
+        a cluster (missing values included)
+
+    Returns
+    -------
+    pd.DataFrame
+        Indexed by cluster label (sorted), with the covariates plus ``n``,
+        ``sum_y`` and ``sum_y2`` of the outcome
+    """
+    covariates = list(covariates)
+    rows = data.loc[data[outcome].notna() & data[groups].notna(),
+                    [groups, outcome] + covariates]
+    grouped = rows.groupby(groups, sort=True, observed=True)
+
+    if covariates:
+        varying = [c for c in covariates
+                   if (grouped[c].nunique(dropna=False) > 1).any()]
+        if varying:
+            raise ValueError(f"Not constant within {groups}: {', '.join(varying)}")
+
+    y = rows[outcome].astype(float)
+    table = grouped[covariates].first() if covariates else pd.DataFrame(
+        index=grouped.size().index)
+    table["n"] = grouped.size()
+    table["sum_y"] = y.groupby(rows[groups], sort=True, observed=True).sum()
+    table["sum_y2"] = (y ** 2).groupby(rows[groups], sort=True, observed=True).sum()
+    return table
+
+
+def fit_cluster_aggregates(
+    formula: str,
+    table: pd.DataFrame,
+    reml: bool = True,
+    start_gamma: Optional[float] = None
+) -> RandomInterceptResults:
+    """
+    Fit a random-intercept model with cluster-level predictors from a
+    per-cluster table.
+
+    Equivalent to ``smf.mixedlm(formula, data, groups=groups).fit(reml=reml)``
+    on the rows ``table = cluster_aggregates(data, ...)`` was built from,
+    at a cost that depends only on the number of clusters. Residuals and
+    fitted values are unavailable (no rows).
+
+    Parameters
+    ----------
+    formula : str
+        Fixed-effects formula over the table's covariates
+    table : pd.DataFrame
+        Output of cluster_aggregates (or any table with ``n``, ``sum_y``
+        and ``sum_y2`` indexed by cluster label)
+    reml : bool
+        Use REML (default) or ML
+    start_gamma : float, optional
+        Starting value for var_group / var_residual
+
+    Returns
+    -------
+    RandomInterceptResults
+    """
+    statistics = SufficientStatistics.from_cluster_table(formula, table)
+    model = RandomInterceptModel.from_statistics(statistics)
+    model.formula = formula
+    return model.fit(reml=reml, start_gamma=start_gamma)
+
+
+def statsmodels_mixedlm(formula: str, data: pd.DataFrame, groups: str):
+    """
+    statsmodels MixedLM for a formula, built from the cached design matrices.
+
+    Equivalent to ``smf.mixedlm(formula, data, groups=groups)`` without
+    re-running patsy for terms that were already expanded on this sample.
+    """
+    from statsmodels.regression.mixed_linear_model import MixedLM
+
+    y, X = dmatrices(formula, data)
+    model = MixedLM(y.iloc[:, 0], X, groups=data.loc[X.index, groups])
+    model.formula = formula
+    return model
+
+
+# =============================================================================
+# Nested Model Sequences
+# =============================================================================
+
+class NestedModelSequence:
+    """
+    Fit a sequence of nested random-intercept models on one sample.
+
+    The grouping structure is coded once and shared by every model, and each
+    fit starts from the previous model's estimates: the variance ratio for
+    the closed-form engine, and the variance component plus the fixed
+    effects (new terms start at zero) for statsmodels MixedLM.
+
+    With several grouping columns the models have one random intercept per
+    column and are fitted by the sparse engine in src/nested.py, warm-started
+    from the previous variance ratios.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        Estimation sample shared by all models
+    groups : str or list of str
+        Grouping column (e.g. "buurt_id"), or several columns innermost
+        first (e.g. ["buurt_id", "wijk_id", "gemeente_id"])
+    engine : str
+        "closed_form" (default) or "statsmodels" (single grouping only)
+    reml : bool
+        Use REML (default) or ML
+
+    Examples
+    --------
+    >>> seq = NestedModelSequence(df, "buurt_id")
+    >>> m0 = seq.fit("DV_single ~ 1")
+    >>> m1 = seq.fit("DV_single ~ b_perc_low40_hh")
+    >>> [formula for formula, _ in seq.evaluations]
+    ['DV_single ~ 1', 'DV_single ~ b_perc_low40_hh']
+
+    A warm start needs far fewer likelihood evaluations than a cold one:
+
+    >>> cold = NestedModelSequence(df, "buurt_id").fit("DV_single ~ b_perc_low40_hh")
+    >>> m1.n_evals < cold.n_evals
+    True
+    """
+
+    def __init__(
+        self,
+        data: pd.DataFrame,
+        groups: Union[str, Sequence[str]],
+        engine: str = "closed_form",
+        reml: bool = True
+    ):
+        if engine not in ("closed_form", "statsmodels"):
+            raise ValueError(f"Unknown engine: {engine}")
+        if not isinstance(groups, str):
+            groups = list(groups)
+            if len(groups) == 1:
+                groups = groups[0]
+            elif engine != "closed_form":
+                raise ValueError("Several random intercepts need the closed_form engine")
+        self.data = data
+        self.groups = groups
+        self.engine = engine
+        self.reml = reml
+        self.structure = (GroupStructure(data[groups])
+                          if engine == "closed_form" and isinstance(groups, str) else None)
+        self.previous = None
+        self.evaluations = []
+
+    def fit(self, formula: str, warm_start: bool = True):
+        """
+        Fit the next model in the sequence.
+
+        Parameters
+        ----------
+        formula : str
+            Fixed-effects formula
+        warm_start : bool
+            Start from the previous model's estimates (default True)
+
+        Returns
+        -------
+        RandomInterceptResults, NestedRandomEffectsResults or MixedLMResults
+        """
+        prev = self.previous if warm_start else None
+
+        if isinstance(self.groups, list):
+            model = NestedRandomEffectsModel.from_formula(formula, self.data, self.groups)
+            result = model.fit(self.reml, start_theta=prev.theta if prev else None)
+            n_evals = result.n_evals
+        elif self.engine == "closed_form":
+            model = RandomInterceptModel.from_formula(
+                formula, self.data, self.groups, structure=self.structure
+            )
+            result = model.fit(self.reml, start_gamma=prev.gamma if prev else None)
+            n_evals = result.n_evals
+        else:
+            result, n_evals = self._fit_statsmodels(formula, prev)
+
+        self.evaluations.append((formula, n_evals))
+        self.previous = result
+        return result
+
+    def _fit_statsmodels(self, formula: str, prev):
+        """MixedLM fit with start values taken from the previous model."""
+        from statsmodels.regression.mixed_linear_model import MixedLMParams
+
+        model = statsmodels_mixedlm(formula, self.data, self.groups)
+        start = None
+        if prev is not None:
+            fe = pd.Series(0.0, index=model.exog_names)
+            shared = fe.index.intersection(prev.fe_params.index)
+            fe[shared] = prev.fe_params[shared]
+            start = MixedLMParams.from_components(
+                fe_params=fe.values,
+                cov_re=np.asarray(prev.cov_re, dtype=float) / prev.scale
+            )
+        result = model.fit(reml=self.reml, start_params=start, full_output=True)
+        # full_output keeps the optimizer's return values (function calls)
+        hist = getattr(result, "hist", None) or [{}]
+        n_evals = hist[-1].get("fcalls", max(len(hist[-1].get("allvecs", [])) - 1, 0))
+        return result, int(n_evals)
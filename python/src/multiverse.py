@@ -0,0 +1,316 @@
+# =============================================================================
+# multiverse.py - Specification-Curve (Multiverse) Engine
+# =============================================================================
+"""
+Fit every combination of analytic choices for the key coefficient.
+
+The multiverse is the Cartesian product of
+- outcome (DV_single, DV_2item_scaled, DV_3item_scaled),
+- subset of BUURT_CONTROLS (all 2^k subsets),
+- occupation included or not,
+- subsample filter (the SUBSAMPLES registry of src/sensitivity.py).
+
+Specifications that share outcome, occupation choice and subsample form a
+"universe": they are fitted on one common complete-case sample, so the
+design matrix and the closed-form sufficient statistics (X'X, cluster
+sums; see src/mixed.py) are built once with every candidate control, and
+each control subset is fitted by slicing them (RandomInterceptModel.subset)
+with a warm start from the previous fit. Universes run on a process pool.
+Holding the sample fixed within a universe also means that differences
+between specifications reflect the controls, not changing missingness.
+
+The result is one row per specification with compact dtypes (categorical
+labels, a control bitmask plus one boolean column per control, int32
+counts) ready for a specification-curve chart.
+
+Functions:
+    enumerate_universes: Outcome x occupation x subsample combinations
+    fit_universe: Fit every control subset within one universe
+    run_multiverse: Fit the whole multiverse, in parallel where possible
+    save_spec_curve: Write the specification table (Parquet, CSV fallback)
+"""
+
+import itertools
+from concurrent.futures import as_completed
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import BUURT_CONTROLS, KEY_PREDICTOR, CONFIDENCE_LEVEL, SENSITIVITY_JOBS
+
+from .mixed import RandomInterceptModel
+from .scheduler import SharedStatePool, resolve_jobs
+from .sensitivity import SENSITIVITY_CONTROLS, SUBSAMPLES, SensitivitySpec, prepare_sample
+
+
+MULTIVERSE_DVS = ("DV_single", "DV_2item_scaled", "DV_3item_scaled")
+
+# Universe: (dv, include_occupation, subsample)
+Universe = Tuple[str, bool, str]
+
+
+# =============================================================================
+# Enumeration
+# =============================================================================
+
+def enumerate_universes(
+    data: pd.DataFrame,
+    dvs: Sequence[str] = MULTIVERSE_DVS,
+    occupation: Sequence[bool] = (False, True),
+    subsamples: Optional[Sequence[str]] = None
+) -> List[Universe]:
+    """
+    Outcome x occupation x subsample combinations available in ``data``.
+
+    Returns
+    -------
+    list of tuple
+        (dv, include_occupation, subsample)
+    """
+    subsamples = list(SUBSAMPLES) if subsamples is None else list(subsamples)
+    universes = []
+    for dv, occ, sub in itertools.product(dvs, occupation, subsamples):
+        if dv not in data.columns or (occ and "occupation" not in data.columns):
+            continue
+        _, filter_columns = SUBSAMPLES[sub]
+        if all(c in data.columns for c in filter_columns):
+            universes.append((dv, bool(occ), sub))
+    return universes
+
+
+def _control_subsets(controls: Sequence[str]) -> List[Tuple[str, ...]]:
+    """All subsets of ``controls``, smallest first (nested fits warm-start)."""
+    return [combo for size in range(len(controls) + 1)
+            for combo in itertools.combinations(controls, size)]
+
+
+# =============================================================================
+# Fitting
+# =============================================================================
+
+def fit_universe(
+    data: pd.DataFrame,
+    universe: Universe,
+    key_var: str = KEY_PREDICTOR,
+    controls: Optional[Sequence[str]] = None
+) -> Dict[str, np.ndarray]:
+    """
+    Fit every subset of neighborhood controls within one universe.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        Full analysis data
+    universe : tuple
+        (dv, include_occupation, subsample)
+    key_var : str
+        Coefficient to report
+    controls : sequence of str, optional
+        Candidate neighborhood controls (default: BUURT_CONTROLS in data)
+
+    Returns
+    -------
+    dict of np.ndarray
+        Columns of the result rows (one entry per control subset)
+    """
+    dv, include_occupation, subsample = universe
+    if controls is None:
+        controls = [c for c in BUURT_CONTROLS if c in data.columns]
+    controls = list(controls)
+
+    individual = SENSITIVITY_CONTROLS
+    if include_occupation:
+        individual += ("C(occupation)",)
+    spec = SensitivitySpec(
+        f"{dv} / {subsample}", dv=dv, predictors=(key_var,), key_var=key_var,
+        controls=individual + tuple(controls), buurt_controls=False,
+        subsample=subsample
+    )
+    sample = prepare_sample(data, spec)
+    formula = spec.formula(data)
+
+    full = RandomInterceptModel.from_formula(formula, sample, "buurt_id")
+
+    # Controls that are constant in the subsample (e.g. born_in_nl among the
+    # Dutch-born, unused categories) cannot be estimated; drop them.
+    constant = set(np.asarray(full.exog_names)[np.ptp(full.exog, axis=0) == 0])
+    constant.discard("Intercept")
+    base = [c for c in full.exog_names if c not in controls and c not in constant]
+
+    subsets = _control_subsets([c for c in controls if c not in constant])
+    n = len(subsets)
+    out = {
+        "coefficient": np.full(n, np.nan),
+        "SE": np.full(n, np.nan),
+        "group_var": np.full(n, np.nan),
+        "mask": np.zeros(n, dtype=np.int64),
+    }
+
+    gamma = None
+    for i, subset in enumerate(subsets):
+        out["mask"][i] = sum(1 << controls.index(c) for c in subset)
+        try:
+            result = full.subset(base + list(subset)).fit(start_gamma=gamma)
+        except np.linalg.LinAlgError:
+            continue
+        gamma = result.gamma or None
+        out["coefficient"][i] = result.fe_params[key_var]
+        out["SE"][i] = result.bse_fe[key_var]
+        out["group_var"][i] = result.cov_re.iloc[0, 0]
+
+    out["N"] = np.full(n, full.nobs)
+    out["n_clusters"] = np.full(n, full.n_groups)
+    return out
+
+
+def run_multiverse(
+    data: pd.DataFrame,
+    dvs: Sequence[str] = MULTIVERSE_DVS,
+    occupation: Sequence[bool] = (False, True),
+    subsamples: Optional[Sequence[str]] = None,
+    key_var: str = KEY_PREDICTOR,
+    jobs: Optional[int] = SENSITIVITY_JOBS
+) -> pd.DataFrame:
+    """
+    Fit the full specification multiverse.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        Full analysis data
+    dvs : sequence of str
+        Outcome choices
+    occupation : sequence of bool
+        Occupation inclusion choices
+    subsamples : sequence of str, optional
+        Names from SUBSAMPLES (default: all registered)
+    key_var : str
+        Coefficient to report
+    jobs : int, optional
+        Worker processes (None = all cores, 1 = sequential)
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per specification, sorted by coefficient, with columns
+        rank, dv, subsample, occupation, controls (bitmask over
+        BUURT_CONTROLS), n_controls, one ``ctl_<name>`` flag per control,
+        N, n_clusters, coefficient, SE, ci_low, ci_high, group_var,
+        significant
+    """
+    print("\nRunning multiverse analysis...")
+    controls = [c for c in BUURT_CONTROLS if c in data.columns]
+    universes = enumerate_universes(data, dvs, occupation, subsamples)
+    print(f"  {len(universes)} universes x {2 ** len(controls)} control sets")
+
+    jobs = resolve_jobs(jobs, len(universes))
+
+    fitted: Dict[int, Dict[str, np.ndarray]] = {}
+    if jobs == 1:
+        for i, universe in enumerate(universes):
+            try:
+                fitted[i] = fit_universe(data, universe, key_var, controls)
+            except Exception as e:
+                print(f"  {universe}: Error: {e}")
+    else:
+        with SharedStatePool(data, jobs) as pool:
+            futures = {pool.submit(fit_universe, u, key_var, controls): i
+                       for i, u in enumerate(universes)}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    fitted[i] = future.result()
+                except Exception as e:
+                    print(f"  {universes[i]}: Error: {e}")
+
+    table = _assemble(universes, fitted, controls)
+    if table.empty:
+        print("  No specification could be fitted")
+        return table
+    n_sig = int(table["significant"].sum())
+    print(f"  Fitted {len(table)} specifications "
+          f"({n_sig} significant at {1 - CONFIDENCE_LEVEL:.0%}, "
+          f"median b={table['coefficient'].median():.3f})")
+    return table
+
+
+def _assemble(
+    universes: List[Universe],
+    fitted: Dict[int, Dict[str, np.ndarray]],
+    controls: List[str]
+) -> pd.DataFrame:
+    """Concatenate universe results into the compact spec-curve table."""
+    parts = []
+    for i in sorted(fitted):
+        dv, occ, sub = universes[i]
+        cols = fitted[i]
+        n = len(cols["mask"])
+        parts.append(pd.DataFrame({
+            "dv": np.repeat(dv, n),
+            "subsample": np.repeat(sub, n),
+            "occupation": np.repeat(occ, n),
+            **cols,
+        }))
+
+    if not parts:
+        return pd.DataFrame()
+    table = pd.concat(parts, ignore_index=True)
+
+    z = stats.norm.ppf(1 - (1 - CONFIDENCE_LEVEL) / 2)
+    table["ci_low"] = table["coefficient"] - z * table["SE"]
+    table["ci_high"] = table["coefficient"] + z * table["SE"]
+    table["significant"] = (table["coefficient"] / table["SE"]).abs() > z
+
+    masks = table.pop("mask").to_numpy()
+    table["controls"] = masks.astype(np.uint16)
+    table["n_controls"] = np.array([bin(m).count("1") for m in masks], dtype=np.int8)
+    for k, name in enumerate(controls):
+        table[f"ctl_{name}"] = (masks >> k) & 1 == 1
+
+    table["dv"] = table["dv"].astype("category")
+    table["subsample"] = table["subsample"].astype("category")
+    table["N"] = table["N"].astype(np.int32)
+    table["n_clusters"] = table["n_clusters"].astype(np.int32)
+
+    table = table.sort_values("coefficient", kind="stable", na_position="last")
+    table.insert(0, "rank", np.arange(1, len(table) + 1, dtype=np.int32))
+    order = (["rank", "dv", "subsample", "occupation", "controls", "n_controls"]
+             + [f"ctl_{name}" for name in controls]
+             + ["N", "n_clusters", "coefficient", "SE", "ci_low", "ci_high",
+                "group_var", "significant"])
+    return table[order].reset_index(drop=True)
+
+
+def save_spec_curve(table: pd.DataFrame, path: Path) -> Path:
+    """
+    Write the specification-curve table.
+
+    Parquet keeps the compact dtypes; without pyarrow the table is written
+    as CSV next to the requested path.
+
+    Parameters
+    ----------
+    table : pd.DataFrame
+        Output of run_multiverse()
+    path : Path
+        Target file (.parquet)
+
+    Returns
+    -------
+    Path
+        File written
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        table.to_parquet(path, index=False)
+    except ImportError:
+        path = path.with_suffix(".csv")
+        table.to_csv(path, index=False)
+    print(f"  Specification curve saved to: {path}")
+    return path
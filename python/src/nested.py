@@ -0,0 +1,574 @@
+# =============================================================================
+# nested.py - Sparse Multi-Level Random-Intercept Engine
+# =============================================================================
+"""
+REML/ML estimation of models with several random intercepts, e.g.
+(1|buurt_id) + (1|wijk_id) + (1|gemeente_id).
+
+Following lme4, the random effects are written as u = Lambda v with
+v ~ N(0, s2 I) and Lambda = diag(s_k) per grouping factor (s_k^2 is the
+variance ratio var_k / var_residual). With A = Lambda Z'Z Lambda + I, the
+marginal covariance is s2 (I + Z Lambda Lambda Z'), whose inverse and
+determinant follow from A alone (Woodbury / determinant lemma). Every term
+of the profiled likelihood therefore needs only the sufficient statistics
+Z'Z (sparse), Z'X, Z'y, X'X, X'y and y'y, never an N x N matrix.
+
+Each row belongs to exactly one level of the first grouping factor, so the
+first diagonal block of A is diagonal. It is eliminated in closed form and
+only the Schur complement over the remaining factors (wijken and gemeenten:
+a few thousand rows for the whole country) is factorized with a sparse LU.
+Memory stays O(N p + nnz(Z'Z)); with a single factor the model reduces to
+the closed-form engine in src/mixed.py.
+
+Groupings are given innermost first. Nested factors need globally unique
+labels (buurt/wijk/gemeente codes are); crossed factors are handled by the
+same algebra.
+
+Classes:
+    NestedRandomEffectsModel: Model built from arrays or a patsy formula
+    NestedRandomEffectsResults: Fitted model with a MixedLMResults-like surface
+
+Functions:
+    fit_nested_random_effects: Formula interface
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional, Sequence
+from scipy import optimize, sparse, stats
+from scipy.sparse.linalg import splu
+
+from .design import dmatrices
+
+
+# Upper bound for the relative standard deviations s_k
+_MAX_REL_SD = 1e3
+# Relative SDs of the second start of a cold fit (the first is 0.5)
+_SECOND_START = 0.1
+
+
+# =============================================================================
+# Model
+# =============================================================================
+
+class NestedRandomEffectsModel:
+    """
+    Linear mixed model with one random intercept per grouping factor.
+
+    Parameters
+    ----------
+    endog : array-like
+        Outcome vector (N,)
+    exog : array-like
+        Fixed-effects design matrix (N, p)
+    groups : pd.DataFrame or dict
+        One column of cluster labels per grouping factor, innermost first
+    exog_names : list of str, optional
+        Names of the design matrix columns
+    """
+
+    def __init__(
+        self,
+        endog: Any,
+        exog: Any,
+        groups: Any,
+        exog_names: Optional[Sequence[str]] = None
+    ):
+        y = np.asarray(endog, dtype=float)
+        X = np.asarray(exog, dtype=float)
+        if X.ndim == 1:
+            X = X[:, None]
+        if exog_names is None:
+            exog_names = (list(exog.columns) if isinstance(exog, pd.DataFrame)
+                          else [f"x{i}" for i in range(X.shape[1])])
+
+        groups = pd.DataFrame(groups)
+        if len(groups) != len(y):
+            raise ValueError("groups and endog have different lengths")
+
+        self.endog = y
+        self.exog = X
+        self.exog_names = list(exog_names)
+        self.nobs, self.k_fe = X.shape
+        self.level_names = [str(c) for c in groups.columns]
+        self.k_re = len(self.level_names)
+
+        # Integer codes per factor; columns of Z are stacked factor by factor
+        self.codes: List[np.ndarray] = []
+        self.labels: List[np.ndarray] = []
+        for col in groups.columns:
+            codes, labels = pd.factorize(np.asarray(groups[col]), sort=True)
+            if (codes < 0).any():
+                raise ValueError(f"Group labels in '{col}' must not contain missing values")
+            self.codes.append(codes)
+            self.labels.append(np.asarray(labels))
+        self.n_levels = [len(lab) for lab in self.labels]
+        self.offsets = np.concatenate([[0], np.cumsum(self.n_levels)])
+        self.q = int(self.offsets[-1])
+
+        # Sufficient statistics (single pass; Z is N x q with k_re ones per row)
+        rows = np.repeat(np.arange(self.nobs), self.k_re)
+        cols = np.column_stack([c + o for c, o in zip(self.codes, self.offsets)]).ravel()
+        Z = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)),
+                              shape=(self.nobs, self.q))
+        self.ztz = (Z.T @ Z).tocsr()
+        self.ztx = np.asarray(Z.T @ X)
+        self.zty = np.asarray(Z.T @ y).ravel()
+        self.xtx = X.T @ X
+        self.xty = X.T @ y
+        self.yty = float(y @ y)
+
+        # Level index of every column of Z
+        self.column_level = np.repeat(np.arange(self.k_re), self.n_levels)
+        q1 = self.n_levels[0]
+        self._n1 = self.ztz.diagonal()[:q1]
+        self._a12 = self.ztz[:q1, q1:].tocsc()
+        self._a22 = self.ztz[q1:, q1:].tocsc()
+
+        self._n_evals = 0
+
+    @classmethod
+    def from_formula(
+        cls,
+        formula: str,
+        data: pd.DataFrame,
+        groups: Sequence[str]
+    ) -> "NestedRandomEffectsModel":
+        """
+        Build the model from a patsy formula (rows with NA are dropped).
+
+        Parameters
+        ----------
+        formula : str
+            Fixed-effects formula
+        data : pd.DataFrame
+            Data with the formula variables and the grouping columns
+        groups : sequence of str
+            Grouping columns, innermost first (e.g. buurt, wijk, gemeente)
+
+        Returns
+        -------
+        NestedRandomEffectsModel
+        """
+        y, X = dmatrices(formula, data)
+        model = cls(y.iloc[:, 0], X, data.loc[X.index, list(groups)], list(X.columns))
+        model.formula = formula
+        model.row_index = X.index
+        return model
+
+    # -------------------------------------------------------------------------
+    # Resampling (bootstrap replicates)
+    # -------------------------------------------------------------------------
+
+    def with_endog(self, endog: np.ndarray) -> "NestedRandomEffectsModel":
+        """Same design and clusters with a new outcome (parametric bootstrap)."""
+        y = np.asarray(endog, dtype=float)
+        model = object.__new__(type(self))
+        model.__dict__.update(self.__dict__)
+        model.endog = y
+        model.xty = self.exog.T @ y
+        model.yty = float(y @ y)
+        model.zty = np.concatenate([
+            np.bincount(codes, weights=y, minlength=n)
+            for codes, n in zip(self.codes, self.n_levels)
+        ])
+        model._n_evals = 0
+        return model
+
+    def resample_clusters(self, counts: np.ndarray) -> "NestedRandomEffectsModel":
+        """
+        Model for a bootstrap sample of outermost clusters.
+
+        Outermost cluster j (e.g. a gemeente, with all its wijken, buurten
+        and respondents) enters ``counts[j]`` times; every copy gets its
+        own cluster labels at all levels.
+
+        Parameters
+        ----------
+        counts : np.ndarray
+            Draw count per outermost cluster (length n_levels[-1])
+
+        Returns
+        -------
+        NestedRandomEffectsModel
+        """
+        top = self.codes[-1]
+        order = np.argsort(top, kind="stable")
+        bounds = np.concatenate([[0], np.cumsum(np.bincount(top, minlength=self.n_levels[-1]))])
+
+        draws = np.repeat(np.arange(len(counts)), counts)
+        rows = np.concatenate([order[bounds[j]:bounds[j + 1]] for j in draws])
+        copy = np.repeat(np.arange(len(draws)), bounds[draws + 1] - bounds[draws])
+
+        groups = pd.DataFrame({
+            name: codes[rows] + copy * n
+            for name, codes, n in zip(self.level_names, self.codes, self.n_levels)
+        })
+        return type(self)(self.endog[rows], self.exog[rows], groups, self.exog_names)
+
+    # -------------------------------------------------------------------------
+    # Linear algebra on A = Lambda Z'Z Lambda + I
+    # -------------------------------------------------------------------------
+
+    def _factorize(self, rel_sd: np.ndarray) -> Dict[str, Any]:
+        """
+        Factor A for relative standard deviations ``rel_sd`` (one per factor).
+
+        The first factor's block is diagonal (D); the rest is handled
+        through the Schur complement S = A22 - A21 D^-1 A12.
+        """
+        lam = rel_sd[self.column_level]
+        q1 = self.n_levels[0]
+        lam1, lam2 = lam[:q1], lam[q1:]
+
+        d = 1.0 + lam1 ** 2 * self._n1
+        fac = {"lam": lam, "d": d, "lu": None}
+        logdet = np.sum(np.log(d))
+
+        if self.k_re > 1:
+            a12 = sparse.diags(lam1) @ self._a12 @ sparse.diags(lam2)
+            a22 = sparse.diags(lam2) @ self._a22 @ sparse.diags(lam2)
+            s = (a22 + sparse.identity(len(lam2)) - a12.T @ sparse.diags(1.0 / d) @ a12)
+            lu = splu(s.tocsc(), permc_spec="MMD_AT_PLUS_A",
+                      diag_pivot_thresh=0.0, options={"SymmetricMode": True})
+            logdet += np.sum(np.log(np.abs(lu.U.diagonal())))
+            fac.update(lu=lu, a12=a12.tocsr())
+
+        fac["logdet"] = logdet
+        return fac
+
+    def _solve(self, fac: Dict[str, Any], rhs: np.ndarray) -> np.ndarray:
+        """Solve A v = rhs using the block factorization."""
+        q1 = self.n_levels[0]
+        d = fac["d"]
+        if fac["lu"] is None:
+            return rhs / (d[:, None] if rhs.ndim == 2 else d)
+
+        r1, r2 = rhs[:q1], rhs[q1:]
+        dinv = 1.0 / (d[:, None] if rhs.ndim == 2 else d)
+        a12 = fac["a12"]
+        v2 = fac["lu"].solve(np.asarray(r2 - a12.T @ (dinv * r1)))
+        v1 = dinv * (r1 - a12 @ v2)
+        return np.concatenate([v1, v2])
+
+    # -------------------------------------------------------------------------
+    # Profiled likelihood
+    # -------------------------------------------------------------------------
+
+    def _profile(self, rel_sd: np.ndarray, reml: bool) -> Dict[str, Any]:
+        """
+        Profile out fixed effects and scale for given relative SDs.
+
+        Returns
+        -------
+        dict
+            llf, fe_params, scale, xtvx (X' H^-1 X), spherical random
+            effects v and the scaling vector lam
+        """
+        self._n_evals += 1
+        rel_sd = np.asarray(rel_sd, dtype=float)
+        fac = self._factorize(rel_sd)
+        lam = fac["lam"]
+
+        b = lam[:, None] * self.ztx
+        c = lam * self.zty
+        sol = self._solve(fac, np.column_stack([b, c]))
+        ainv_b, ainv_c = sol[:, :-1], sol[:, -1]
+
+        xtvx = self.xtx - b.T @ ainv_b
+        xtvy = self.xty - b.T @ ainv_c
+        ytvy = self.yty - c @ ainv_c
+
+        chol = np.linalg.cholesky(xtvx)
+        fe = np.linalg.solve(xtvx, xtvy)
+        rss = ytvy - xtvy @ fe
+
+        n, p = self.nobs, self.k_fe
+        if reml:
+            dof = n - p
+            scale = rss / dof
+            logdet_x = 2.0 * np.sum(np.log(np.diag(chol)))
+            llf = -0.5 * (dof * (np.log(2 * np.pi * scale) + 1.0)
+                          + fac["logdet"] + logdet_x)
+        else:
+            scale = rss / n
+            llf = -0.5 * (n * (np.log(2 * np.pi * scale) + 1.0) + fac["logdet"])
+
+        # Conditional modes of the spherical effects: v = A^-1 Lambda Z'(y - Xb)
+        v = ainv_c - ainv_b @ fe
+        return {"llf": llf, "fe_params": fe, "scale": scale,
+                "xtvx": xtvx, "v": v, "lam": lam}
+
+    def loglike(self, rel_sd: Sequence[float], reml: bool = True) -> float:
+        """Profiled (RE)ML log-likelihood at relative SDs ``rel_sd``."""
+        return self._profile(np.asarray(rel_sd, dtype=float), reml)["llf"]
+
+    # -------------------------------------------------------------------------
+    # Fitting
+    # -------------------------------------------------------------------------
+
+    def fit(
+        self,
+        reml: bool = True,
+        start_theta: Optional[Sequence[float]] = None
+    ) -> "NestedRandomEffectsResults":
+        """
+        Estimate the model.
+
+        Parameters
+        ----------
+        reml : bool
+            Restricted (default) or full maximum likelihood
+        start_theta : sequence of float, optional
+            Starting variance ratios var_k / var_residual, one per factor
+            (default 0.25 each)
+
+        Returns
+        -------
+        NestedRandomEffectsResults
+        """
+        self._n_evals = 0
+        if start_theta is None:
+            x0 = np.full(self.k_re, 0.5)
+        else:
+            x0 = np.sqrt(np.clip(np.asarray(start_theta, dtype=float), 1e-6, None))
+
+        # Optimize on relative SDs >= 0 so zero variance components are
+        # reachable (as in lme4). The likelihood depends on s_k only through
+        # s_k^2, so its gradient vanishes at s_k = 0 and a gradient method
+        # can stop on that boundary; use a bounded derivative-free search
+        # (Powell, in place of lme4's bobyqa) and, from a cold start, a
+        # second start so one bad path cannot decide the fit.
+        starts = [np.minimum(x0, _MAX_REL_SD)]
+        if start_theta is None:
+            starts.append(np.full(self.k_re, _SECOND_START))
+
+        best, n_iter = None, 0
+        for x in starts:
+            opt = optimize.minimize(
+                lambda s: -self.loglike(s, reml), x0=x, method="Powell",
+                bounds=[(0.0, _MAX_REL_SD)] * self.k_re,
+                options={"xtol": 1e-6, "ftol": 1e-10}
+            )
+            n_iter += int(opt.nit)
+            if best is None or opt.fun < best.fun:
+                best = opt
+
+        return NestedRandomEffectsResults(
+            self, np.clip(best.x, 0.0, _MAX_REL_SD) ** 2, reml,
+            converged=bool(best.success), n_iter=n_iter,
+            n_evals=self._n_evals
+        )
+
+
+# =============================================================================
+# Results
+# =============================================================================
+
+class NestedRandomEffectsResults:
+    """
+    Fitted multi-level random-intercept model.
+
+    Mirrors the parts of MixedLMResults used by this pipeline: params
+    (fixed effects followed by one "<level> Var" variance ratio per
+    grouping factor), bse, fe_params, cov_re (diagonal, one row per level),
+    scale, random_effects (innermost level), llf, aic/bic (NaN under REML),
+    nobs, resid, fittedvalues, tvalues, pvalues and cov_params(). vcomp
+    holds the variance components on the outcome scale.
+    """
+
+    def __init__(
+        self,
+        model: NestedRandomEffectsModel,
+        theta: np.ndarray,
+        reml: bool,
+        converged: bool = True,
+        n_iter: int = 0,
+        n_evals: int = 0
+    ):
+        prof = model._profile(np.sqrt(theta), reml)
+        names = model.exog_names
+        levels = model.level_names
+
+        self.model = model
+        self.reml = reml
+        self.method = "REML" if reml else "ML"
+        self.theta = np.asarray(theta, dtype=float)
+        self.converged = converged
+        self.n_iter = n_iter
+        self.n_evals = n_evals
+        self.nobs = model.nobs
+        self.k_fe = model.k_fe
+        self.llf = float(prof["llf"])
+        self.scale = float(prof["scale"])
+
+        self.fe_params = pd.Series(prof["fe_params"], index=names)
+        cov_fe = self.scale * np.linalg.inv(prof["xtvx"])
+        self._cov_fe = pd.DataFrame(cov_fe, index=names, columns=names)
+        self.bse_fe = pd.Series(np.sqrt(np.diag(cov_fe)), index=names)
+
+        self.vcomp = pd.Series(self.theta * self.scale, index=levels)
+        self.cov_re = pd.DataFrame(np.diag(self.vcomp.values), index=levels, columns=levels)
+        self.n_groups = dict(zip(levels, model.n_levels))
+
+        var_names = [f"{level} Var" for level in levels]
+        self.params = pd.concat([self.fe_params, pd.Series(self.theta, index=var_names)])
+        self.bse = pd.concat([self.bse_fe,
+                              pd.Series(self._theta_se(), index=var_names)])
+
+        # BLUPs on the outcome scale: u = Lambda v
+        self._blup = prof["lam"] * prof["v"]
+        self._random_effects = None
+
+        if reml:
+            self.aic = np.nan
+            self.bic = np.nan
+        else:
+            k = self.k_fe + model.k_re + 1
+            self.aic = -2 * self.llf + 2 * k
+            self.bic = -2 * self.llf + np.log(self.nobs) * k
+
+    def _theta_se(self) -> np.ndarray:
+        """Standard errors of the variance ratios from the numeric Hessian."""
+        k = len(self.theta)
+        t = np.maximum(self.theta, 1e-8)
+        h = 1e-4 * np.maximum(t, 1e-2)
+        # Shift the stencil (t +/- 2h) forward in coordinates near the 0 boundary
+        t = np.where(t - 2 * h < 0, t + 2 * h, t)
+
+        def ll(theta):
+            return self.model.loglike(np.sqrt(theta), self.reml)
+
+        hess = np.zeros((k, k))
+        for i in range(k):
+            for j in range(i, k):
+                ei, ej = np.eye(k)[i] * h[i], np.eye(k)[j] * h[j]
+                hess[i, j] = hess[j, i] = (
+                    ll(t + ei + ej) - ll(t + ei - ej) - ll(t - ei + ej) + ll(t - ei - ej)
+                ) / (4 * h[i] * h[j])
+        try:
+            cov = np.linalg.inv(-hess)
+        except np.linalg.LinAlgError:
+            return np.full(k, np.nan)
+        diag = np.diag(cov)
+        return np.where(diag > 0, np.sqrt(np.abs(diag)), np.nan)
+
+    # -------------------------------------------------------------------------
+    # Random effects
+    # -------------------------------------------------------------------------
+
+    @property
+    def random_effects_by_level(self) -> Dict[str, pd.Series]:
+        """Predicted random intercepts per grouping factor, indexed by label."""
+        m = self.model
+        return {
+            level: pd.Series(self._blup[m.offsets[k]:m.offsets[k + 1]],
+                             index=m.labels[k], name=level)
+            for k, level in enumerate(m.level_names)
+        }
+
+    @property
+    def random_effects(self) -> Dict[Any, pd.Series]:
+        """Predicted random intercepts of the innermost level (one per cluster)."""
+        if self._random_effects is None:
+            m = self.model
+            self._random_effects = {
+                label: pd.Series([u], index=["Group"])
+                for label, u in zip(m.labels[0], self._blup[:m.n_levels[0]])
+            }
+        return self._random_effects
+
+    # -------------------------------------------------------------------------
+    # Derived quantities
+    # -------------------------------------------------------------------------
+
+    @property
+    def index(self) -> pd.Index:
+        """Row labels of the estimation sample."""
+        return getattr(self.model, "row_index", pd.RangeIndex(self.nobs))
+
+    @property
+    def fittedvalues(self) -> pd.Series:
+        """Fitted values including the predicted random intercepts."""
+        m = self.model
+        fitted = m.exog @ self.fe_params.values
+        for codes, offset in zip(m.codes, m.offsets):
+            fitted = fitted + self._blup[offset + codes]
+        return pd.Series(fitted, index=self.index)
+
+    @property
+    def resid(self) -> pd.Series:
+        """Residuals (outcome minus fitted values with random intercepts)."""
+        return pd.Series(self.model.endog, index=self.index) - self.fittedvalues
+
+    @property
+    def tvalues(self) -> pd.Series:
+        return self.params / self.bse
+
+    @property
+    def pvalues(self) -> pd.Series:
+        return pd.Series(2 * stats.norm.sf(np.abs(self.tvalues)), index=self.params.index)
+
+    def cov_params(self) -> pd.DataFrame:
+        """Covariance matrix of the fixed-effects estimates."""
+        return self._cov_fe.copy()
+
+    def conf_int(self, alpha: float = 0.05) -> pd.DataFrame:
+        """Wald confidence intervals for the fixed effects."""
+        z = stats.norm.ppf(1 - alpha / 2)
+        return pd.DataFrame({0: self.fe_params - z * self.bse_fe,
+                             1: self.fe_params + z * self.bse_fe})
+
+    def summary(self) -> str:
+        """Plain-text coefficient and variance-component table."""
+        table = pd.DataFrame({
+            "Coef.": self.params,
+            "Std.Err.": self.bse,
+            "z": self.tvalues,
+            "P>|z|": self.pvalues,
+        })
+        groups = ", ".join(f"{k}={v}" for k, v in self.n_groups.items())
+        vcomp = ", ".join(f"{k}={v:.4f}" for k, v in self.vcomp.items())
+        header = (f"Multi-level random-intercept model ({self.method})\n"
+                  f"N={self.nobs}, {groups}\n"
+                  f"Variance components: {vcomp}, residual={self.scale:.4f}\n"
+                  f"log-likelihood={self.llf:.4f}\n")
+        return header + table.to_string(float_format=lambda v: f"{v:.4f}")
+
+
+# =============================================================================
+# Formula Interface
+# =============================================================================
+
+def fit_nested_random_effects(
+    formula: str,
+    data: pd.DataFrame,
+    groups: Sequence[str],
+    reml: bool = True,
+    start_theta: Optional[Sequence[float]] = None
+) -> NestedRandomEffectsResults:
+    """
+    Fit a model with one random intercept per grouping column.
+
+    Equivalent to lme4's ``lmer(y ~ x + (1|g1) + (1|g2) + ..., REML=reml)``.
+
+    Parameters
+    ----------
+    formula : str
+        Fixed-effects formula
+    data : pd.DataFrame
+        Estimation data
+    groups : sequence of str
+        Grouping columns, innermost first (e.g. ["buurt_id", "wijk_id",
+        "gemeente_id"])
+    reml : bool
+        Use REML (default) or ML
+    start_theta : sequence of float, optional
+        Starting variance ratios, one per grouping column
+
+    Returns
+    -------
+    NestedRandomEffectsResults
+    """
+    model = NestedRandomEffectsModel.from_formula(formula, data, groups)
+    return model.fit(reml=reml, start_theta=start_theta)
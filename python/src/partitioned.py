@@ -0,0 +1,562 @@
+# =============================================================================
+# partitioned.py - Out-of-Core Pipeline by Gemeente Partitions
+# =============================================================================
+"""
+Run phases 1-5a on populations too large for memory, one gemeente at a time.
+
+Buurten and wijken are nested in gemeenten, so a partition by gemeente_id
+never splits a cluster: the admin merge, the MIN_CLUSTER_SIZE filter,
+area-level scaling and the per-buurt sums of the random-intercept model are
+the same per partition as on the whole frame. Only a few quantities need
+the whole population; they are accumulated in streaming passes first.
+
+    1. partition_survey       survey chunks -> <root>/survey/gemeente_id=<g>/
+                              plus age/education moments and the observed
+                              employment and occupation labels
+    2. fit_partition_scaler   merge each partition, accumulate context moments
+    3. transform_partitions   merge + transform_analysis_data with the global
+                              parameters -> <root>/analysis/gemeente_id=<g>/
+    4. partition_statistics   analysis sample + sufficient statistics of
+                              m0-m3 per partition -> <root>/stats/<model>/
+
+Only one partition is in memory at a time. The analysis stage combines the
+per-partition statistics (mixed.SufficientStatistics.concat) and fits the
+two-level models without materializing the full frame. The analysis
+partitions are a Hive-partitioned Parquet dataset (gemeente_id in the
+directory names); read_partitions() reads all or selected gemeenten.
+
+Classes:
+    SurveyPartitions: Partitioned survey and its population-wide recode parameters
+    PartitionedRun: Outputs of run_partitioned
+
+Functions:
+    partition_survey: Stream the survey into Parquet partitions by gemeente
+    fit_partition_scaler: ContextScaler accumulated over partitions
+    transform_partitions: Merge and transform each partition to Parquet
+    partition_statistics: Per-partition sufficient statistics of m0-m3
+    load_statistics: Combine stored per-partition statistics
+    read_partitions: Read partitioned Parquet back into a data frame
+    run_partitioned: All passes and the two-level models from statistics
+"""
+
+import contextlib
+import io
+import shutil
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import (
+    SURVEY_PATH, ADMIN_PATH, SURVEY_YEAR, PARTITIONED_DIR, PARTITION_CHUNK_ROWS,
+    STANDARDIZE_WEIGHTED, STANDARDIZE_LEVEL, GEO_NAMES_DIR, PIPELINE_JOBS,
+    GROUPING_VAR
+)
+
+from .analyze import TwoLevelModels, two_level_formulas, fit_two_level_from_statistics
+from .design import DesignMatrixCache
+from .extract import iter_survey_chunks, load_admin_data
+from .mixed import RandomInterceptModel, SufficientStatistics
+from .transform import (
+    create_geo_ids, prepare_admin_by_level, transform_analysis_data,
+    ContextMoments, ContextScaler,
+    RunningMoments, CONTEXT_PREFIXES, EMPLOYMENT_LABELS, OCCUPATION_LABELS,
+    GEO_ID_DTYPE, _inequality_columns
+)
+from .merge import merge_survey_admin, create_analysis_sample
+from .scheduler import SharedStatePool, resolve_jobs
+
+
+# Partition column (Hive-style directory names, not stored in the files)
+PARTITION_COLUMN = "gemeente_id"
+
+# Directory name of respondents without a valid buurt code (Hive's null)
+_NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+# Survey code column -> (recoded column, labels)
+_RECODE_CATEGORIES = {
+    "work_status": ("employment_status", EMPLOYMENT_LABELS),
+    "work_type": ("occupation", OCCUPATION_LABELS),
+}
+
+
+# =============================================================================
+# Partition Layout
+# =============================================================================
+
+@dataclass
+class SurveyPartitions:
+    """Survey spooled to Parquet by gemeente, with population-wide parameters."""
+    root: Path
+    gemeenten: List[Optional[int]]     # partition keys (None = no valid buurt code)
+    n_rows: int
+    moments: Dict[str, Tuple[float, float]]    # age_raw / educyrs -> (mean, sd)
+    categories: Dict[str, List[str]]           # employment_status / occupation
+
+
+def _partition_name(gemeente: Optional[int]) -> str:
+    return f"{PARTITION_COLUMN}={_NULL_PARTITION if gemeente is None else gemeente}"
+
+
+def _partition_dir(base: Path, gemeente: Optional[int]) -> Path:
+    return base / _partition_name(gemeente)
+
+
+def _insert_partition_column(df: pd.DataFrame, values) -> pd.DataFrame:
+    """gemeente_id back in place (after wijk_id, as in create_geo_ids)."""
+    at = df.columns.get_loc("wijk_id") + 1 if "wijk_id" in df.columns else len(df.columns)
+    df.insert(at, PARTITION_COLUMN, pd.array(values, dtype=GEO_ID_DTYPE))
+    return df
+
+
+def _read_partition(base: Path, gemeente: Optional[int]) -> pd.DataFrame:
+    """One partition with its gemeente_id column."""
+    df = pd.read_parquet(_partition_dir(base, gemeente))
+    return _insert_partition_column(df, [gemeente] * len(df))
+
+
+def read_partitions(
+    base: Path = PARTITIONED_DIR / "analysis",
+    columns: Optional[List[str]] = None,
+    gemeenten: Optional[List[int]] = None
+) -> pd.DataFrame:
+    """
+    Read a partitioned dataset (e.g. <root>/analysis) into one data frame.
+
+    Parameters
+    ----------
+    base : Path
+        Dataset directory with gemeente_id=<g> partitions
+    columns : list of str, optional
+        Columns to read (default: all)
+    gemeenten : list of int, optional
+        Gemeente codes to read (default: all, including unknown gemeente)
+
+    Returns
+    -------
+    pd.DataFrame
+        Rows of the selected partitions with gemeente_id as Int32
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    # Explicit key type: an inferred (dictionary) key cannot hold the null partition
+    partitioning = ds.partitioning(pa.schema([(PARTITION_COLUMN, pa.int32())]), flavor="hive")
+    dataset = ds.dataset(base, format="parquet", partitioning=partitioning)
+    if columns is not None:
+        columns = [c for c in columns if c != PARTITION_COLUMN] + [PARTITION_COLUMN]
+    selected = ds.field(PARTITION_COLUMN).isin(gemeenten) if gemeenten is not None else None
+    df = dataset.to_table(columns=columns, filter=selected).to_pandas()
+    return _insert_partition_column(df, df.pop(PARTITION_COLUMN))
+
+
+def _reset_dir(path: Path) -> Path:
+    """Empty output directory of a pass (stale partitions would be read back)."""
+    if path.exists():
+        shutil.rmtree(path)
+    path.mkdir(parents=True)
+    return path
+
+
+@contextlib.contextmanager
+def _quiet():
+    """Silence the per-step progress output while processing one partition."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+# =============================================================================
+# Pass 1: Partition the Survey
+# =============================================================================
+
+def partition_survey(
+    survey_path: Path = SURVEY_PATH,
+    root: Path = PARTITIONED_DIR,
+    chunk_rows: int = PARTITION_CHUNK_ROWS
+) -> SurveyPartitions:
+    """
+    Stream the survey into Parquet partitions by gemeente_id.
+
+    Each chunk gets its geographic IDs and is appended to the partitions
+    of its gemeenten as one file per (chunk, gemeente). The same pass
+    accumulates the moments of age and education years and the observed
+    employment and occupation codes, which recode_survey_variables would
+    otherwise take from the whole frame.
+
+    Parameters
+    ----------
+    survey_path : Path
+        Survey file (.dta or .parquet, see extract.iter_survey_chunks)
+    root : Path
+        Output root; partitions go to <root>/survey
+    chunk_rows : int
+        Survey rows read at a time
+
+    Returns
+    -------
+    SurveyPartitions
+    """
+    print("Partitioning survey by gemeente...")
+    root = Path(root)
+    base = _reset_dir(root / "survey")
+
+    moments: Dict[str, RunningMoments] = {}
+    observed = {col: set() for col in _RECODE_CATEGORIES}
+    gemeenten = set()
+    n_rows = 0
+
+    for k, chunk in enumerate(iter_survey_chunks(survey_path, chunk_rows)):
+        with _quiet():
+            chunk = create_geo_ids(chunk)
+        n_rows += len(chunk)
+
+        # Variables standardized by recode_survey_variables
+        raw = {}
+        if "birth_year" in chunk.columns:
+            raw["age_raw"] = SURVEY_YEAR - chunk["birth_year"]
+        if "educyrs" in chunk.columns:
+            raw["educyrs"] = chunk["educyrs"]
+        for name, values in raw.items():
+            values = values.to_numpy(dtype=np.float64, na_value=np.nan)[:, None]
+            moments.setdefault(name, RunningMoments(1)).update(values)
+
+        for col in observed:
+            if col in chunk.columns:
+                observed[col].update(chunk[col].dropna().unique().tolist())
+
+        groups = chunk.groupby(PARTITION_COLUMN, dropna=False, sort=False).indices
+        body = chunk.drop(columns=PARTITION_COLUMN)
+        for key, rows in groups.items():
+            gemeente = None if pd.isna(key) else int(key)
+            gemeenten.add(gemeente)
+            directory = _partition_dir(base, gemeente)
+            directory.mkdir(exist_ok=True)
+            body.iloc[rows].to_parquet(directory / f"part-{k:05d}.parquet", index=False)
+        print(f"  Chunk {k + 1}: {n_rows} rows, {len(gemeenten)} partitions")
+
+    recode_moments = {
+        name: (float(m.means()[0]), float(m.sds()[0])) for name, m in moments.items()
+    }
+    categories = {
+        column: sorted({labels[code] for code in observed[source] if code in labels})
+        for source, (column, labels) in _RECODE_CATEGORIES.items()
+        if observed[source]
+    }
+
+    keys = sorted(g for g in gemeenten if g is not None)
+    if None in gemeenten:
+        keys.append(None)
+    print(f"  {n_rows} respondents in {len(keys)} partitions ({base})")
+    return SurveyPartitions(root, keys, n_rows, recode_moments, categories)
+
+
+# =============================================================================
+# Partition Workers
+# =============================================================================
+
+def _call_partition(shared: Dict[str, Any], fn: Callable, gemeente: Optional[int]):
+    return fn(gemeente, **shared)
+
+
+def _map_partitions(
+    fn: Callable,
+    gemeenten: List[Optional[int]],
+    shared: Dict[str, Any],
+    jobs: Optional[int]
+) -> list:
+    """fn(gemeente, **shared) for every partition, in partition order."""
+    jobs = resolve_jobs(jobs, len(gemeenten))
+
+    if jobs == 1:
+        return [fn(g, **shared) for g in gemeenten]
+    with SharedStatePool(shared, jobs) as pool:
+        return list(pool.map(_call_partition, [fn] * len(gemeenten), gemeenten))
+
+
+def _merged_partition(gemeente, root, admin_by_level) -> pd.DataFrame:
+    survey = _read_partition(Path(root) / "survey", gemeente)
+    return merge_survey_admin(survey, admin_by_level)
+
+
+# =============================================================================
+# Pass 2: Context Scaler
+# =============================================================================
+
+def _partition_moments(gemeente, root, admin_by_level, weights, level) -> ContextMoments:
+    with _quiet():
+        merged = _merged_partition(gemeente, root, admin_by_level)
+    data = merged.assign(**_inequality_columns(merged))
+    weights = weights if weights in data.columns else None
+    return ContextMoments(tuple(CONTEXT_PREFIXES), weights, level).update(data)
+
+
+def fit_partition_scaler(
+    partitions: SurveyPartitions,
+    admin_by_level: Dict[str, pd.DataFrame],
+    weighted: bool = STANDARDIZE_WEIGHTED,
+    level: str = STANDARDIZE_LEVEL,
+    jobs: Optional[int] = PIPELINE_JOBS
+) -> ContextScaler:
+    """
+    Fit the context scaler over all partitions (as fit_context_scaler on the whole frame).
+
+    Parameters
+    ----------
+    partitions : SurveyPartitions
+        Output of partition_survey
+    admin_by_level : dict
+        Admin data by level (transform.prepare_admin_by_level)
+    weighted : bool
+        Weight respondents by the survey weight
+    level : str
+        "respondent" or "area"
+    jobs : int, optional
+        Worker processes (None = all cores, 1 = sequential)
+
+    Returns
+    -------
+    ContextScaler
+    """
+    print("Fitting context scaler over partitions...")
+    shared = {"root": str(partitions.root), "admin_by_level": admin_by_level,
+              "weights": "weight" if weighted else None, "level": level}
+    parts = _map_partitions(_partition_moments, partitions.gemeenten, shared, jobs)
+
+    moments = parts[0]
+    for part in parts[1:]:
+        moments.merge(part)
+    scaler = moments.scaler()
+    print(f"  {len(scaler.columns)} context variables")
+    return scaler
+
+
+# =============================================================================
+# Pass 3: Transform to Parquet
+# =============================================================================
+
+def _transform_partition(gemeente, root, admin_by_level, admin_data, scaler,
+                         names_dir, moments, categories, include_occupation):
+    with _quiet():
+        merged = _merged_partition(gemeente, root, admin_by_level)
+        data = transform_analysis_data(merged, admin_data, scaler, names_dir,
+                                       moments, categories)
+        sample = create_analysis_sample(data, include_occupation)
+
+    directory = _partition_dir(Path(root) / "analysis", gemeente)
+    directory.mkdir()
+    data.drop(columns=PARTITION_COLUMN).to_parquet(directory / "part-0.parquet", index=False)
+    return len(data), len(sample), sample.notna().sum()
+
+
+def transform_partitions(
+    partitions: SurveyPartitions,
+    admin_by_level: Dict[str, pd.DataFrame],
+    admin_data: pd.DataFrame,
+    scaler: ContextScaler,
+    names_dir: Optional[Path] = GEO_NAMES_DIR,
+    include_occupation: bool = True,
+    jobs: Optional[int] = PIPELINE_JOBS
+) -> pd.Series:
+    """
+    Merge and transform every partition and write it to <root>/analysis.
+
+    Uses the population-wide recode parameters and context scaler, so the
+    partitions together equal transform_analysis_data on the whole frame.
+
+    Parameters
+    ----------
+    partitions : SurveyPartitions
+        Output of partition_survey
+    admin_by_level : dict
+        Admin data by level
+    admin_data : pd.DataFrame
+        Raw CBS admin data (for geographic names)
+    scaler : ContextScaler
+        Output of fit_partition_scaler
+    names_dir : Path, optional
+        Directory of stored name dictionaries (None = build per partition)
+    include_occupation : bool
+        Whether the analysis sample requires occupation
+    jobs : int, optional
+        Worker processes (None = all cores, 1 = sequential)
+
+    Returns
+    -------
+    pd.Series
+        Non-missing values per column of the analysis sample (for
+        analyze.two_level_formulas)
+    """
+    print("Transforming partitions...")
+    base = _reset_dir(Path(partitions.root) / "analysis")
+    shared = {
+        "root": str(partitions.root), "admin_by_level": admin_by_level,
+        "admin_data": admin_data, "scaler": scaler,
+        "names_dir": str(names_dir) if names_dir else None,
+        "moments": partitions.moments, "categories": partitions.categories,
+        "include_occupation": include_occupation,
+    }
+    parts = _map_partitions(_transform_partition, partitions.gemeenten, shared, jobs)
+
+    n_rows = sum(n for n, _, _ in parts)
+    n_sample = sum(n for _, n, _ in parts)
+    n_observed = pd.concat([counts for _, _, counts in parts], axis=1).sum(axis=1)
+    print(f"  {n_rows} respondents, analysis sample {n_sample} ({base})")
+    return n_observed
+
+
+# =============================================================================
+# Pass 4: Sufficient Statistics
+# =============================================================================
+
+def _partition_statistics(gemeente, root, formulas, include_occupation):
+    data = _read_partition(Path(root) / "analysis", gemeente)
+    with _quiet():
+        sample = create_analysis_sample(data, include_occupation)
+
+    # Design blocks of one partition are not reused; keep them out of the
+    # shared cache
+    design = DesignMatrixCache()
+    statistics = {}
+    for name, formula in formulas.items():
+        y, X = design.dmatrices(formula, sample)
+        if len(X) == 0:
+            continue
+        model = RandomInterceptModel(y.iloc[:, 0], X, sample.loc[X.index, GROUPING_VAR],
+                                     list(X.columns))
+        statistics[name] = model.statistics()
+        statistics[name].save(Path(root) / "stats" / name / f"{_partition_name(gemeente)}.npz")
+    return statistics
+
+
+def partition_statistics(
+    partitions: SurveyPartitions,
+    formulas: Dict[str, str],
+    include_occupation: bool = True,
+    jobs: Optional[int] = PIPELINE_JOBS
+) -> Dict[str, SufficientStatistics]:
+    """
+    Sufficient statistics of each model, per partition and combined.
+
+    Per partition, the analysis sample is rebuilt from <root>/analysis and
+    the statistics of every formula are written to
+    <root>/stats/<model>/gemeente_id=<g>.npz.
+
+    Parameters
+    ----------
+    partitions : SurveyPartitions
+        Partitions already transformed by transform_partitions
+    formulas : dict
+        Model name -> formula (analyze.two_level_formulas)
+    include_occupation : bool
+        Whether the analysis sample requires occupation
+    jobs : int, optional
+        Worker processes (None = all cores, 1 = sequential)
+
+    Returns
+    -------
+    dict
+        Model name -> SufficientStatistics of all partitions
+    """
+    print("Computing sufficient statistics per partition...")
+    _reset_dir(Path(partitions.root) / "stats")
+    shared = {"root": str(partitions.root), "formulas": formulas,
+              "include_occupation": include_occupation}
+    parts = _map_partitions(_partition_statistics, partitions.gemeenten, shared, jobs)
+
+    statistics = {
+        name: SufficientStatistics.concat([p[name] for p in parts if name in p])
+        for name in formulas
+    }
+    for name, stats in statistics.items():
+        print(f"  {name}: N={stats.nobs}, clusters={len(stats.labels)}, "
+              f"{len(stats.exog_names)} fixed effects")
+    return statistics
+
+
+def load_statistics(root: Path = PARTITIONED_DIR) -> Dict[str, SufficientStatistics]:
+    """
+    Combine the stored per-partition statistics of every model.
+
+    Parameters
+    ----------
+    root : Path
+        Root written by partition_statistics
+
+    Returns
+    -------
+    dict
+        Model name -> SufficientStatistics
+    """
+    base = Path(root) / "stats"
+    return {
+        directory.name: SufficientStatistics.concat(
+            [SufficientStatistics.load(path) for path in sorted(directory.glob("*.npz"))])
+        for directory in sorted(base.iterdir()) if directory.is_dir()
+    }
+
+
+# =============================================================================
+# Runner
+# =============================================================================
+
+@dataclass
+class PartitionedRun:
+    """Outputs of the out-of-core pipeline."""
+    partitions: SurveyPartitions
+    scaler: ContextScaler
+    formulas: Dict[str, str]
+    statistics: Dict[str, SufficientStatistics]
+    models: TwoLevelModels
+
+
+def run_partitioned(
+    survey_path: Path = SURVEY_PATH,
+    admin_path: Path = ADMIN_PATH,
+    root: Path = PARTITIONED_DIR,
+    use_cbs_api: bool = False,
+    include_occupation: bool = True,
+    chunk_rows: int = PARTITION_CHUNK_ROWS,
+    names_dir: Optional[Path] = GEO_NAMES_DIR,
+    jobs: Optional[int] = PIPELINE_JOBS
+) -> PartitionedRun:
+    """
+    Run the pipeline out of core and fit the two-level models.
+
+    Parameters
+    ----------
+    survey_path : Path
+        Survey or synthetic population (.dta or .parquet)
+    admin_path : Path
+        CBS admin data
+    root : Path
+        Directory of the partitions and statistics
+    use_cbs_api : bool
+        Download fresh CBS data
+    include_occupation : bool
+        Whether the analysis sample requires occupation
+    chunk_rows : int
+        Survey rows read at a time
+    names_dir : Path, optional
+        Directory of stored name dictionaries
+    jobs : int, optional
+        Worker processes for the partition passes
+
+    Returns
+    -------
+    PartitionedRun
+    """
+    admin = load_admin_data(admin_path, use_api=use_cbs_api)
+    admin_by_level = prepare_admin_by_level(admin)
+
+    partitions = partition_survey(survey_path, root, chunk_rows)
+    scaler = fit_partition_scaler(partitions, admin_by_level, jobs=jobs)
+    n_observed = transform_partitions(partitions, admin_by_level, admin, scaler,
+                                      names_dir, include_occupation, jobs)
+    formulas = two_level_formulas(n_observed)
+    statistics = partition_statistics(partitions, formulas, include_occupation, jobs)
+    models = fit_two_level_from_statistics(statistics)
+    return PartitionedRun(partitions, scaler, formulas, statistics, models)
@@ -15,7 +15,7 @@ import pandas as pd
 import numpy as np
 from pathlib import Path
 from typing import Dict, Any, Optional, List
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 import sys
 sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -189,7 +189,8 @@ def create_four_level_table(
         all_params.update(model.params.index)
 
     all_params.discard("Intercept")
-    all_params.discard("Group Var")
+    # Variance ratios ("Group Var", "<level> Var") are reported below
+    all_params = {p for p in all_params if not p.endswith(" Var")}
 
     # Sort parameters - key predictors first
     param_order = [
@@ -244,6 +245,15 @@ def create_four_level_table(
     rows.append(["---"] * 6)
     rows.append(["N"] + [str(int(m.nobs)) for _, m in model_list])
     rows.append(["Groups (buurt)"] + [str(len(m.random_effects)) for _, m in model_list])
+    # Variance components of nested models (src/nested.py)
+    if all(hasattr(m, "vcomp") for _, m in model_list):
+        for level in ["wijk", "gemeente"]:
+            rows.append([f"Groups ({level})"]
+                        + [str(m.n_groups.get(f"{level}_id", "")) for _, m in model_list])
+        for level in ["buurt", "wijk", "gemeente"]:
+            rows.append([f"Var ({level})"]
+                        + [f"{m.vcomp.get(f'{level}_id', np.nan):.2f}" for _, m in model_list])
+        rows.append(["Var (residual)"] + [f"{m.scale:.2f}" for _, m in model_list])
     rows.append(["AIC"] + [f"{m.aic:.1f}" for _, m in model_list])
     rows.append(["BIC"] + [f"{m.bic:.1f}" for _, m in model_list])
 
@@ -430,6 +440,7 @@ class AnalysisReport:
     key_ci: tuple
     diagnostics: Dict[str, Any]
     sensitivity: pd.DataFrame
+    bootstrap: Dict[str, Any] = field(default_factory=dict)
 
 
 def generate_report(
@@ -438,7 +449,8 @@ def generate_report(
     diagnostics,
     sensitivity: Optional[pd.DataFrame] = None,
     merge_validation: Optional[List] = None,
-    output_path: Optional[Path] = None
+    output_path: Optional[Path] = None,
+    bootstrap: Optional[Dict[str, Any]] = None
 ) -> AnalysisReport:
     """
     Generate comprehensive analysis report.
@@ -457,6 +469,8 @@ def generate_report(
         Merge validation results
     output_path : Path, optional
         Path to save report
+    bootstrap : dict, optional
+        Bootstrap intervals by statistic (src/bootstrap.py)
 
     Returns
     -------
@@ -510,10 +524,13 @@ def generate_report(
         diagnostics={
             "vif": diagnostics.vif,
             "high_vif": diagnostics.high_vif,
+            "condition_indices": diagnostics.condition_indices,
+            "collinear_sets": diagnostics.collinear_sets,
             "residual_stats": diagnostics.residual_stats,
             "random_effect_stats": diagnostics.random_effect_stats
         },
-        sensitivity=sensitivity if sensitivity is not None else pd.DataFrame()
+        sensitivity=sensitivity if sensitivity is not None else pd.DataFrame(),
+        bootstrap=bootstrap or {}
     )
 
     # Print summary
@@ -573,4 +590,22 @@ def _save_report_text(report: AnalysisReport, output_path: Path) -> None:
             f.write(report.sensitivity.to_string(index=False))
             f.write("\n")
 
+        if report.bootstrap:
+            first = next(iter(report.bootstrap.values()))
+            f.write("\nBOOTSTRAP INTERVALS\n")
+            f.write("-" * 40 + "\n")
+            f.write(f"{first.n_boot} {first.method} replicates\n")
+            table = pd.DataFrame([{
+                "statistic": r.statistic,
+                "estimate": r.estimate,
+                "boot_SE": r.se,
+                "pct_low": r.ci_percentile[0],
+                "pct_high": r.ci_percentile[1],
+                "bca_low": r.ci_bca[0],
+                "bca_high": r.ci_bca[1],
+                "failed": r.n_failed
+            } for r in report.bootstrap.values()])
+            f.write(table.to_string(index=False))
+            f.write("\n")
+
     print(f"  Report saved to {output_path}")
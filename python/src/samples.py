@@ -0,0 +1,208 @@
+# =============================================================================
+# samples.py - Memoized Analysis Samples
+# =============================================================================
+"""
+Complete-case analysis samples as row positions, shared across stages.
+
+The analysis sample, the four-level and H3 models and every sensitivity
+or multiverse specification take complete cases of the same data for
+their own variable list, sometimes within a subsample and with a minimum
+cluster size. A SampleManager answers these from one MissingnessIndex and
+keeps the answers (row positions plus cluster sizes, no data) in an LRU
+cache keyed by (variables, minimum cluster size, subsample filter), so
+memory does not grow with the number of specifications. Columns are
+gathered only when a caller asks for a frame.
+
+sample_manager(data) returns the manager of a given frame, created on
+first use and dropped with the frame.
+
+Classes:
+    SampleView: Row positions and cluster sizes of one sample
+    SampleManager: LRU cache of samples over one data frame
+
+Functions:
+    sample_manager: Shared manager of a data frame
+"""
+
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import GROUPING_VAR, SAMPLE_CACHE_SIZE
+
+from .missingness import MissingnessIndex
+
+
+@dataclass(frozen=True)
+class SampleView:
+    """One analysis sample of a SampleManager's data."""
+    rows: np.ndarray            # positions into the data, ascending
+    cluster_codes: np.ndarray   # cluster of each sample row (0..n_clusters-1)
+    cluster_sizes: np.ndarray   # observations per cluster in the sample
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @property
+    def n_clusters(self) -> int:
+        return len(self.cluster_sizes)
+
+
+class SampleManager:
+    """
+    Memoized complete-case samples of one data frame.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        Data the samples are drawn from (not copied)
+    cluster : str
+        Grouping column for cluster sizes and the minimum-size filter
+    maxsize : int
+        Samples kept in the LRU cache
+    """
+
+    def __init__(self, data: pd.DataFrame, cluster: str = GROUPING_VAR,
+                 maxsize: int = SAMPLE_CACHE_SIZE):
+        self._data = weakref.ref(data)
+        self.cluster = cluster
+        self.maxsize = maxsize
+        self.missing = MissingnessIndex(data)
+        self._cache: "OrderedDict[Tuple, SampleView]" = OrderedDict()
+        self._subsamples: Dict[Callable, np.ndarray] = {}
+        if cluster in data.columns:
+            self._cluster_codes = pd.factorize(data[cluster])[0]
+        else:
+            self._cluster_codes = None
+
+    @property
+    def data(self) -> pd.DataFrame:
+        data = self._data()
+        if data is None:
+            raise RuntimeError("The data of this SampleManager no longer exists")
+        return data
+
+    def _subsample_mask(self, subsample: Callable[[pd.DataFrame], pd.Series]) -> np.ndarray:
+        if subsample not in self._subsamples:
+            self._subsamples[subsample] = np.asarray(subsample(self.data), dtype=bool)
+        return self._subsamples[subsample]
+
+    def view(
+        self,
+        variables: Sequence[str],
+        min_cluster_size: int = 1,
+        subsample: Optional[Callable[[pd.DataFrame], pd.Series]] = None
+    ) -> SampleView:
+        """
+        Complete cases of ``variables`` (within ``subsample``), in clusters of
+        at least ``min_cluster_size`` complete cases.
+
+        Parameters
+        ----------
+        variables : sequence of str
+            Columns that must be non-missing
+        min_cluster_size : int
+            Drop clusters with fewer sample rows (1 = no filter)
+        subsample : callable, optional
+            Module-level filter returning a boolean mask over the data
+
+        Returns
+        -------
+        SampleView
+        """
+        key = (frozenset(variables), min_cluster_size, subsample)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        keep = self.missing.complete(list(variables))
+        if subsample is not None:
+            keep &= self._subsample_mask(subsample)
+        rows = np.flatnonzero(keep)
+
+        if self._cluster_codes is None:
+            codes = np.zeros(len(rows), dtype=np.intp)
+        else:
+            codes = self._cluster_codes[rows]
+        if min_cluster_size > 1 and len(rows):
+            sizes = np.bincount(codes[codes >= 0])
+            large = codes >= 0
+            large[large] = sizes[codes[large]] >= min_cluster_size
+            rows, codes = rows[large], codes[large]
+
+        # Compact cluster codes of the sample (first appearance order; -1 = no cluster)
+        compact = np.full(len(codes), -1, dtype=np.intp)
+        clustered = codes >= 0
+        compact[clustered], uniques = pd.factorize(codes[clustered])
+        view = SampleView(rows, compact,
+                          np.bincount(compact[clustered], minlength=len(uniques)))
+
+        self._cache[key] = view
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+        return view
+
+    def frame(
+        self,
+        variables: Sequence[str],
+        min_cluster_size: int = 1,
+        subsample: Optional[Callable[[pd.DataFrame], pd.Series]] = None,
+        columns: Optional[Sequence[str]] = None,
+        reset_index: bool = True
+    ) -> pd.DataFrame:
+        """
+        The sample as a data frame.
+
+        Parameters
+        ----------
+        variables, min_cluster_size, subsample
+            As in view()
+        columns : sequence of str, optional
+            Columns to gather (default: ``variables``; all columns if "all")
+        reset_index : bool
+            Contiguous index instead of the data's row labels
+
+        Returns
+        -------
+        pd.DataFrame
+        """
+        rows = self.view(variables, min_cluster_size, subsample).rows
+        data = self.data
+        if columns != "all":
+            data = data[list(variables if columns is None else columns)]
+        sample = data.iloc[rows]
+        return sample.reset_index(drop=True) if reset_index else sample
+
+
+# Managers by id() of their data frame; entries go away with the frame
+_MANAGERS: Dict[int, SampleManager] = {}
+
+
+def sample_manager(data: pd.DataFrame) -> SampleManager:
+    """
+    Shared SampleManager of ``data`` (created on first use).
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        Data frame (identity, not content, selects the manager; the frame
+        must not be modified in place afterwards)
+
+    Returns
+    -------
+    SampleManager
+    """
+    key = id(data)
+    manager = _MANAGERS.get(key)
+    if manager is None or manager._data() is not data:
+        manager = SampleManager(data)
+        _MANAGERS[key] = manager
+        weakref.finalize(data, _MANAGERS.pop, key, None)
+    return manager
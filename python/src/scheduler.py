@@ -0,0 +1,451 @@
+# =============================================================================
+# scheduler.py - Pipeline Dependency Graph and Parallel Executor
+# =============================================================================
+"""
+Express the pipeline as a dependency graph and run ready stages concurrently.
+
+Each Task names its output and refers to upstream outputs with Ref(...).
+The scheduler runs every task whose inputs are available, dispatching
+independent tasks to a process pool, and reports the critical path
+(the longest chain of dependent stages) after the run.
+
+Classes:
+    Ref: Placeholder for the output of another task
+    Task: One pipeline stage (function, inputs, cache settings)
+    DAGScheduler: Topological executor with optional process pool
+    SharedStatePool: Process pool whose workers receive shared inputs once
+
+Functions:
+    critical_path: Longest dependency chain by measured duration
+    resolve_jobs: Worker count for a stage's own process pool
+"""
+
+import os
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .cache import ArtifactStore
+
+
+# =============================================================================
+# Graph Definition
+# =============================================================================
+
+@dataclass(frozen=True)
+class Ref:
+    """Reference to the output of another task."""
+    name: str
+
+
+@dataclass
+class Task:
+    """
+    One node of the pipeline graph.
+
+    Attributes
+    ----------
+    name : str
+        Output name (other tasks refer to it with Ref(name))
+    fn : callable
+        Stage function; must be importable at module level for the pool
+    args, kwargs
+        Inputs; Ref values are replaced by upstream outputs
+    config_keys : tuple
+        Extra config.py settings for the cache key (settings imported by
+        the task's modules are included automatically)
+    local : bool
+        Run in the scheduling process (cheap or print-only stages)
+    cache : bool
+        Whether the output goes through the ArtifactStore
+    optional : bool
+        On failure, print a warning and yield None instead of aborting;
+        dependent tasks are skipped
+    phase : str
+        Banner printed before the first task of each phase (sequential runs)
+    """
+    name: str
+    fn: Callable
+    args: Tuple[Any, ...] = ()
+    kwargs: Dict[str, Any] = field(default_factory=dict)
+    config_keys: Tuple[str, ...] = ()
+    local: bool = False
+    cache: bool = True
+    optional: bool = False
+    phase: str = ""
+
+    @property
+    def deps(self) -> List[str]:
+        """Names of the tasks this task depends on."""
+        refs = [a for a in list(self.args) + list(self.kwargs.values())
+                if isinstance(a, Ref)]
+        return [r.name for r in refs]
+
+
+# =============================================================================
+# Nested Pools
+# =============================================================================
+
+# Set in pool workers (the scheduler's and SharedStatePool's), which must not
+# start pools of their own
+_IN_PIPELINE_WORKER = False
+
+
+def _init_pipeline_worker() -> None:
+    global _IN_PIPELINE_WORKER
+    _IN_PIPELINE_WORKER = True
+
+
+def resolve_jobs(jobs: Optional[int], n_tasks: int) -> int:
+    """
+    Worker count for a stage that runs ``n_tasks`` units on a process pool.
+
+    All cores when ``jobs`` is None or below 1, never more than the units,
+    and 1 inside a pool worker.
+    """
+    if jobs is None or jobs < 1:
+        jobs = os.cpu_count() or 1
+    if _IN_PIPELINE_WORKER:
+        jobs = 1
+    return max(1, min(jobs, n_tasks))
+
+
+# Worker-process copy of a SharedStatePool's state (set once per worker)
+_WORKER_STATE: Any = None
+
+
+def _init_shared_worker(state: Any) -> None:
+    global _IN_PIPELINE_WORKER, _WORKER_STATE
+    _IN_PIPELINE_WORKER = True
+    _WORKER_STATE = state
+
+
+def _call_with_state(fn: Callable, args: tuple) -> Any:
+    return fn(_WORKER_STATE, *args)
+
+
+class SharedStatePool:
+    """
+    Process pool whose workers receive one shared object at start-up.
+
+    ``submit(fn, *args)`` and ``map(fn, *iterables)`` run ``fn(state, *args)``
+    in a worker, so large inputs (the analysis data, a bootstrap problem)
+    are pickled once per worker rather than with every task. ``fn`` must be
+    importable at module level.
+
+    Parameters
+    ----------
+    state : object
+        Shared input passed as the first argument of every call
+    jobs : int
+        Number of worker processes (see resolve_jobs)
+
+    Examples
+    --------
+    >>> with SharedStatePool(data, jobs=4) as pool:
+    ...     results = list(pool.map(fit_spec, specs))
+    """
+
+    def __init__(self, state: Any, jobs: int):
+        self._pool = ProcessPoolExecutor(max_workers=jobs, initializer=_init_shared_worker,
+                                         initargs=(state,))
+
+    def __enter__(self) -> "SharedStatePool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._pool.shutdown()
+
+    def submit(self, fn: Callable, *args) -> Future:
+        """Schedule ``fn(state, *args)``."""
+        return self._pool.submit(_call_with_state, fn, args)
+
+    def map(self, fn: Callable, *iterables: Iterable) -> Iterator:
+        """``fn(state, *args)`` for each tuple of arguments, in order."""
+        return self._pool.map(partial(_call_with_state, fn), zip(*iterables))
+
+
+def _timed_call(fn: Callable, args: tuple, kwargs: dict) -> Tuple[Any, float, float]:
+    """Run a task body and return (output, start, end) wall-clock times."""
+    start = time.time()
+    output = fn(*args, **kwargs)
+    return output, start, time.time()
+
+
+# =============================================================================
+# Critical Path
+# =============================================================================
+
+def critical_path(
+    tasks: Dict[str, Task],
+    timings: Dict[str, Tuple[float, float]]
+) -> Tuple[List[str], float]:
+    """
+    Longest chain of dependent tasks by measured duration.
+
+    Parameters
+    ----------
+    tasks : dict
+        Task name -> Task
+    timings : dict
+        Task name -> (start, end) wall-clock times
+
+    Returns
+    -------
+    tuple
+        (task names along the path, total seconds)
+    """
+    duration = {n: end - start for n, (start, end) in timings.items()}
+    longest: Dict[str, float] = {}
+    previous: Dict[str, Optional[str]] = {}
+
+    for name in _topological_order(tasks):
+        if name not in duration:
+            continue
+        best_dep, best_len = None, 0.0
+        for dep in tasks[name].deps:
+            if longest.get(dep, 0.0) > best_len:
+                best_dep, best_len = dep, longest[dep]
+        longest[name] = best_len + duration[name]
+        previous[name] = best_dep
+
+    if not longest:
+        return [], 0.0
+
+    node = max(longest, key=longest.get)
+    total = longest[node]
+    path = []
+    while node is not None:
+        path.append(node)
+        node = previous[node]
+    return path[::-1], total
+
+
+def _topological_order(tasks: Dict[str, Task]) -> List[str]:
+    """Task names in dependency order (declaration order among ready tasks)."""
+    order, done = [], set()
+    pending = list(tasks)
+    while pending:
+        progressed = False
+        for name in list(pending):
+            if all(d in done for d in tasks[name].deps):
+                order.append(name)
+                done.add(name)
+                pending.remove(name)
+                progressed = True
+        if not progressed:
+            raise ValueError(f"Cycle or missing dependency among tasks: {pending}")
+    return order
+
+
+# =============================================================================
+# Scheduler
+# =============================================================================
+
+class DAGScheduler:
+    """
+    Run a graph of pipeline tasks, in parallel where dependencies allow.
+
+    With ``jobs=1`` tasks run sequentially in declaration order, matching
+    the original pipeline output. With ``jobs>1`` every non-local task whose
+    inputs are ready is submitted to a process pool of ``jobs`` workers.
+    Cache lookups and writes always happen in the scheduling process.
+
+    Parameters
+    ----------
+    tasks : list of Task
+        Pipeline graph
+    store : ArtifactStore, optional
+        Stage cache (a disabled store is used if omitted)
+    jobs : int
+        Number of worker processes
+    """
+
+    def __init__(
+        self,
+        tasks: List[Task],
+        store: Optional[ArtifactStore] = None,
+        jobs: int = 1
+    ):
+        self.tasks = {t.name: t for t in tasks}
+        if len(self.tasks) != len(tasks):
+            raise ValueError("Task names must be unique")
+        for task in tasks:
+            missing = [d for d in task.deps if d not in self.tasks]
+            if missing:
+                raise ValueError(f"Task '{task.name}' depends on unknown tasks: {missing}")
+        self.order = _topological_order(self.tasks)
+        self.store = store if store is not None else ArtifactStore(enabled=False)
+        self.jobs = max(1, int(jobs))
+        self.results: Dict[str, Any] = {}
+        self.timings: Dict[str, Tuple[float, float]] = {}
+        self.failed: Dict[str, str] = {}
+
+    # -------------------------------------------------------------------------
+    # Helpers
+    # -------------------------------------------------------------------------
+
+    def _resolve(self, task: Task) -> Tuple[tuple, dict]:
+        """Substitute upstream outputs for Ref placeholders."""
+        def sub(v):
+            return self.results[v.name] if isinstance(v, Ref) else v
+        args = tuple(sub(a) for a in task.args)
+        kwargs = {k: sub(v) for k, v in task.kwargs.items()}
+        return args, kwargs
+
+    def _blocked(self, task: Task) -> bool:
+        """True if an upstream task failed or was skipped."""
+        return any(d in self.failed for d in task.deps)
+
+    def _cache_key(self, task: Task, args: tuple, kwargs: dict) -> Optional[str]:
+        if not (task.cache and self.store.enabled):
+            return None
+        return self.store.stage_key(task.name, task.fn, args, kwargs, task.config_keys)
+
+    def _finish(self, task: Task, key: Optional[str], output: Any,
+                start: float, end: float) -> None:
+        self.results[task.name] = output
+        self.timings[task.name] = (start, end)
+        if key is not None:
+            self.store.save(task.name, key, output)
+
+    def _fail(self, task: Task, error: Exception) -> None:
+        if not task.optional:
+            raise error
+        print(f"  Warning: {task.name} failed: {error}")
+        self.failed[task.name] = str(error)
+        self.results[task.name] = None
+
+    def _skip(self, task: Task) -> None:
+        upstream = [d for d in task.deps if d in self.failed]
+        print(f"  Skipping {task.name}: upstream {', '.join(upstream)} unavailable")
+        self.failed[task.name] = "skipped"
+        self.results[task.name] = None
+
+    # -------------------------------------------------------------------------
+    # Execution
+    # -------------------------------------------------------------------------
+
+    def run(self) -> Dict[str, Any]:
+        """
+        Execute the graph.
+
+        Returns
+        -------
+        dict
+            Task name -> output (None for failed/skipped optional tasks)
+        """
+        wall_start = time.time()
+        if self.jobs == 1:
+            self._run_sequential()
+        else:
+            self._run_parallel()
+        self.wall_time = time.time() - wall_start
+        return self.results
+
+    def _run_sequential(self) -> None:
+        current_phase = None
+        for name in self.order:
+            task = self.tasks[name]
+            if task.phase and task.phase != current_phase:
+                current_phase = task.phase
+                print("\n" + "=" * 60)
+                print(current_phase)
+                print("=" * 60)
+            if self._blocked(task):
+                self._skip(task)
+                continue
+            args, kwargs = self._resolve(task)
+            key = self._cache_key(task, args, kwargs)
+            if key is not None:
+                hit, output = self.store.lookup(task.name, key)
+                if hit:
+                    self.results[name] = output
+                    continue
+            try:
+                output, start, end = _timed_call(task.fn, args, kwargs)
+            except Exception as e:
+                self._fail(task, e)
+                continue
+            self._finish(task, key, output, start, end)
+
+    def _run_parallel(self) -> None:
+        pending = list(self.order)
+        running = {}  # future -> (task, key)
+
+        with ProcessPoolExecutor(max_workers=self.jobs,
+                                 initializer=_init_pipeline_worker) as pool:
+            while pending or running:
+                # Dispatch everything whose inputs are available
+                for name in list(pending):
+                    task = self.tasks[name]
+                    if not all(d in self.results for d in task.deps):
+                        continue
+                    pending.remove(name)
+                    if self._blocked(task):
+                        self._skip(task)
+                        continue
+
+                    args, kwargs = self._resolve(task)
+                    key = self._cache_key(task, args, kwargs)
+                    if key is not None:
+                        hit, output = self.store.lookup(task.name, key)
+                        if hit:
+                            self.results[name] = output
+                            continue
+
+                    if task.local:
+                        try:
+                            output, start, end = _timed_call(task.fn, args, kwargs)
+                        except Exception as e:
+                            self._fail(task, e)
+                            continue
+                        self._finish(task, key, output, start, end)
+                    else:
+                        future = pool.submit(_timed_call, task.fn, args, kwargs)
+                        running[future] = (task, key)
+
+                if not running:
+                    continue
+
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    task, key = running.pop(future)
+                    try:
+                        output, start, end = future.result()
+                    except Exception as e:
+                        self._fail(task, e)
+                        continue
+                    self._finish(task, key, output, start, end)
+
+    # -------------------------------------------------------------------------
+    # Reporting
+    # -------------------------------------------------------------------------
+
+    def report(self) -> Tuple[List[str], float]:
+        """
+        Print stage timings and the critical path.
+
+        Returns
+        -------
+        tuple
+            (critical path task names, critical path seconds)
+        """
+        path, total = critical_path(self.tasks, self.timings)
+
+        print("\nStage timings:")
+        for name in self.order:
+            if name in self.timings:
+                start, end = self.timings[name]
+                print(f"  {name:<24} {end - start:8.2f}s")
+            elif name in self.failed:
+                print(f"  {name:<24}   failed")
+            else:
+                print(f"  {name:<24}   cached")
+
+        print(f"Critical path ({total:.2f}s of {self.wall_time:.2f}s wall-clock, "
+              f"jobs={self.jobs}):")
+        print("  " + " -> ".join(path) if path else "  (all stages cached)")
+        return path, total
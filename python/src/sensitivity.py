@@ -0,0 +1,324 @@
+# =============================================================================
+# sensitivity.py - Robustness Specification Registry and Runner
+# =============================================================================
+"""
+Declare robustness specifications as data and fit them on a process pool.
+
+A SensitivitySpec names the outcome, the predictor terms, the controls and
+the subsample; nothing else is needed to fit it. Specifications are kept in
+an ordered registry (SPEC_REGISTRY) so new checks are added with
+register_spec() instead of another try/except block in run_sensitivity().
+run_specs() fits them with one worker per core and streams each result row
+in the shape produced by analyze._extract_key_coef().
+
+Classes:
+    SensitivitySpec: One robustness specification
+
+Functions:
+    register_spec: Add a specification to the registry
+    register_subsample: Add a named subsample filter
+    default_specs: The standard six robustness checks
+    prepare_sample: Complete-case sample of a specification
+    run_spec: Fit one specification
+    run_specs: Fit many specifications, in parallel where possible
+"""
+
+import re
+from collections import OrderedDict
+from concurrent.futures import as_completed
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import BUURT_CONTROLS, SENSITIVITY_JOBS
+
+from .samples import sample_manager
+from .scheduler import SharedStatePool, resolve_jobs
+
+
+# Individual controls of the sensitivity models (occupation is left out so
+# the checks keep the larger sample)
+SENSITIVITY_CONTROLS = ("age", "C(sex)", "education", "C(employment_status)", "born_in_nl")
+
+_VARIABLE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+
+# =============================================================================
+# Specification
+# =============================================================================
+
+@dataclass(frozen=True)
+class SensitivitySpec:
+    """
+    One robustness specification.
+
+    Attributes
+    ----------
+    name : str
+        Label in the results table
+    dv : str
+        Outcome column
+    predictors : tuple of str
+        Formula terms placed before the controls (e.g. "b_perc_low40_hh *
+        wealth_index")
+    key_var : str
+        Coefficient reported in the results row
+    controls : tuple of str
+        Individual-level control terms
+    buurt_controls : bool
+        Append the BUURT_CONTROLS present in the data
+    subsample : str
+        Name of a filter in SUBSAMPLES ("all" = full data)
+    extra_terms : tuple of (label, term)
+        Further coefficients reported as their own rows (skipped if absent)
+    min_n : int
+        Skip the specification if fewer complete cases remain
+    """
+    name: str
+    dv: str = "DV_single"
+    predictors: Tuple[str, ...] = ("b_perc_low40_hh",)
+    key_var: str = "b_perc_low40_hh"
+    controls: Tuple[str, ...] = SENSITIVITY_CONTROLS
+    buurt_controls: bool = True
+    subsample: str = "all"
+    extra_terms: Tuple[Tuple[str, str], ...] = ()
+    min_n: int = 0
+
+    def buurt_terms(self, data: pd.DataFrame) -> List[str]:
+        """BUURT_CONTROLS available in ``data`` (empty if disabled)."""
+        if not self.buurt_controls:
+            return []
+        return [var for var in BUURT_CONTROLS if var in data.columns]
+
+    def formula(self, data: pd.DataFrame) -> str:
+        """Model formula for this specification."""
+        terms = list(self.predictors) + list(self.controls) + self.buurt_terms(data)
+        return f"{self.dv} ~ " + " + ".join(terms)
+
+    def variables(self, data: pd.DataFrame) -> List[str]:
+        """Columns needed to fit the model, in formula order."""
+        names = [self.dv]
+        for term in list(self.predictors) + list(self.controls):
+            names.extend(v for v in _VARIABLE.findall(term) if v != "C")
+        names.extend(self.buurt_terms(data))
+        names.append("buurt_id")
+        return list(dict.fromkeys(names))
+
+    def required_columns(self, data: pd.DataFrame) -> List[str]:
+        """Model variables plus the columns the subsample filter reads."""
+        _, filter_columns = SUBSAMPLES[self.subsample]
+        return list(dict.fromkeys(self.variables(data) + list(filter_columns)))
+
+
+# =============================================================================
+# Subsamples
+# =============================================================================
+
+def _dutch_born(data: pd.DataFrame) -> pd.Series:
+    """Respondents born in the Netherlands.
+
+    born_in_nl may be coded as max value = born in NL, or binary (1 = yes).
+    """
+    max_val = data["born_in_nl"].max()
+    return data["born_in_nl"] == max_val if max_val > 1 else data["born_in_nl"] == 1
+
+
+# name -> (filter returning a boolean mask or None for all rows, columns read)
+SUBSAMPLES: Dict[str, Tuple[Optional[Callable[[pd.DataFrame], pd.Series]], Tuple[str, ...]]] = {
+    "all": (None, ()),
+    "dutch_born": (_dutch_born, ("born_in_nl",)),
+}
+
+
+def register_subsample(
+    name: str,
+    mask: Callable[[pd.DataFrame], pd.Series],
+    columns: Iterable[str] = ()
+) -> None:
+    """
+    Add a named subsample filter.
+
+    ``mask`` must be a module-level function so it can be sent to the
+    worker processes.
+    """
+    SUBSAMPLES[name] = (mask, tuple(columns))
+
+
+# =============================================================================
+# Registry
+# =============================================================================
+
+SPEC_REGISTRY: "OrderedDict[str, SensitivitySpec]" = OrderedDict()
+
+
+def register_spec(spec: SensitivitySpec) -> SensitivitySpec:
+    """
+    Add (or replace) a specification in the registry.
+
+    Parameters
+    ----------
+    spec : SensitivitySpec
+        Specification to register
+
+    Returns
+    -------
+    SensitivitySpec
+        The registered specification
+    """
+    if spec.subsample not in SUBSAMPLES:
+        raise ValueError(f"Unknown subsample '{spec.subsample}' in spec '{spec.name}'")
+    SPEC_REGISTRY[spec.name] = spec
+    return spec
+
+
+def default_specs() -> List[SensitivitySpec]:
+    """
+    The standard robustness checks.
+
+    1. Base model (DV_single)
+    2. 2-item composite DV
+    3. 3-item composite DV
+    4. Dutch-born only subsample
+    5. Income ratio model
+    6. Wealth interaction
+    """
+    return [
+        SensitivitySpec("Base (DV_single)"),
+        SensitivitySpec("2-item composite", dv="DV_2item_scaled"),
+        SensitivitySpec("3-item composite", dv="DV_3item_scaled"),
+        # born_in_nl is constant in this subsample
+        SensitivitySpec("Dutch-born only", subsample="dutch_born",
+                        controls=SENSITIVITY_CONTROLS[:-1], min_n=101),
+        SensitivitySpec("Income ratio (high/low)", predictors=("b_income_ratio",),
+                        key_var="b_income_ratio"),
+        SensitivitySpec("With wealth interaction",
+                        predictors=("b_perc_low40_hh * wealth_index",),
+                        extra_terms=(("  -> Interaction term",
+                                      "b_perc_low40_hh:wealth_index"),)),
+    ]
+
+
+for _spec in default_specs():
+    register_spec(_spec)
+
+
+# =============================================================================
+# Execution
+# =============================================================================
+
+def prepare_sample(data: pd.DataFrame, spec: SensitivitySpec) -> pd.DataFrame:
+    """
+    Complete cases of the spec's subsample with a contiguous index.
+
+    Row positions come from the shared sample manager of ``data``, so
+    specifications with the same variables and subsample reuse one sample.
+    """
+    mask, _ = SUBSAMPLES[spec.subsample]
+    return sample_manager(data).frame(spec.variables(data), subsample=mask)
+
+
+def run_spec(spec: SensitivitySpec, data: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    Fit one specification.
+
+    Parameters
+    ----------
+    spec : SensitivitySpec
+        Specification
+    data : pd.DataFrame
+        Full analysis data
+
+    Returns
+    -------
+    list of dict
+        Result rows (key coefficient first, then any extra terms); empty if
+        the subsample is below ``spec.min_n``
+    """
+    from .analyze import _fit_mixed, _extract_key_coef
+
+    df = prepare_sample(data, spec)
+    if len(df) < spec.min_n:
+        return []
+
+    model = _fit_mixed(spec.formula(data), df)
+    rows = [_extract_key_coef(model, spec.name, var=spec.key_var)]
+    for label, term in spec.extra_terms:
+        row = _extract_key_coef(model, label, var=term)
+        if not np.isnan(row["coefficient"]):
+            rows.append(row)
+    return rows
+
+
+def _run_in_worker(data: pd.DataFrame, spec: SensitivitySpec) -> List[Dict[str, Any]]:
+    return run_spec(spec, data)
+
+
+def run_specs(
+    data: pd.DataFrame,
+    specs: Optional[Iterable[SensitivitySpec]] = None,
+    jobs: Optional[int] = SENSITIVITY_JOBS
+) -> pd.DataFrame:
+    """
+    Fit specifications and collect their key coefficients.
+
+    Specifications whose columns are missing from ``data`` are skipped.
+    With more than one job, fits run in a process pool that receives the
+    data once per worker; rows are printed as they complete and returned
+    in specification order.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        Full analysis data
+    specs : iterable of SensitivitySpec, optional
+        Specifications to fit (default: the registry)
+    jobs : int, optional
+        Worker processes (None = all cores, 1 = sequential)
+
+    Returns
+    -------
+    pd.DataFrame
+        Columns specification, N, coefficient, SE, significant
+    """
+    specs = list(SPEC_REGISTRY.values() if specs is None else specs)
+    runnable = []
+    for spec in specs:
+        missing = [c for c in spec.required_columns(data) if c not in data.columns]
+        if missing:
+            print(f"  Skipping {spec.name}: missing {', '.join(missing)}")
+        else:
+            runnable.append(spec)
+
+    jobs = resolve_jobs(jobs, len(runnable))
+    rows_by_spec: Dict[int, List[Dict[str, Any]]] = {}
+
+    if jobs == 1:
+        for i, spec in enumerate(runnable):
+            print(f"  {i + 1}. {spec.name}...")
+            try:
+                rows_by_spec[i] = run_spec(spec, data)
+            except Exception as e:
+                print(f"    Error: {e}")
+    else:
+        print(f"  Fitting {len(runnable)} specifications on {jobs} workers...")
+        with SharedStatePool(data, jobs) as pool:
+            futures = {pool.submit(_run_in_worker, spec): i
+                       for i, spec in enumerate(runnable)}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    rows_by_spec[i] = future.result()
+                except Exception as e:
+                    print(f"  {i + 1}. {runnable[i].name}: Error: {e}")
+                    continue
+                for row in rows_by_spec[i]:
+                    print(f"  {i + 1}. {row['specification'].strip()}: "
+                          f"b={row['coefficient']:.3f} (SE={row['SE']:.3f}, N={row['N']})")
+
+    rows = [row for i in sorted(rows_by_spec) for row in rows_by_spec[i]]
+    return pd.DataFrame(rows, columns=["specification", "N", "coefficient", "SE", "significant"])
@@ -4,27 +4,91 @@
 """
 Functions for creating geographic IDs, recoding variables, and standardization.
 
+Classes:
+    ContextScaler: Stored means and SDs of the context variables
+    RunningMoments: Column means and SDs accumulated over row batches
+    ContextMoments: ContextScaler fitted batch by batch (out-of-core mode)
+
 Functions:
     create_geo_ids: Create hierarchical geographic identifiers
+    parse_geo_ids: Integer geographic codes from CBS code strings
+    geo_id_strings: Zero-padded string view of integer geographic codes
     prepare_admin_by_level: Split admin data by geographic level
     recode_survey_variables: Create DVs and recode demographics
     standardize_context_vars: Z-score standardize neighborhood variables
+    fit_context_scaler: Scaler for the merged data's context variables
+    transform_analysis_data: Recode, indices, names and standardization in one stage
 """
 
+import json
 import pandas as pd
 import numpy as np
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Optional, Sequence, Tuple
 
 import sys
 sys.path.insert(0, str(Path(__file__).parent.parent))
-from config import SURVEY_YEAR
+from config import (
+    SURVEY_YEAR, ADMIN_INDICATORS, STANDARDIZE_WEIGHTED, STANDARDIZE_LEVEL,
+    GEO_NAMES_DIR
+)
 
 
 # =============================================================================
 # Geographic ID Creation
 # =============================================================================
 
+# Digits of the CBS code at each level. Geographic IDs are integer codes
+# (nullable Int32): wijk and gemeente codes are prefixes of the buurt code,
+# so wijk_id = buurt_id // 100 and gemeente_id = buurt_id // 10000.
+GEO_ID_DIGITS = {"buurt_id": 8, "wijk_id": 6, "gemeente_id": 4}
+GEO_ID_DTYPE = "Int32"
+
+
+def parse_geo_ids(codes: pd.Series) -> pd.Series:
+    """
+    Integer geographic codes from CBS code strings or numbers.
+
+    Accepts "01490000", "BU01490000", 1490000 or 1490000.0; anything else
+    (and non-integral numbers) becomes <NA>.
+
+    Parameters
+    ----------
+    codes : pd.Series
+        Codes as strings or numbers
+
+    Returns
+    -------
+    pd.Series
+        Int32 codes
+    """
+    if not pd.api.types.is_numeric_dtype(codes):
+        codes = codes.astype("string").str.strip().str.replace(r"^(BU|WK|GM)", "", regex=True)
+    numeric = pd.to_numeric(codes, errors="coerce")
+    numeric = numeric.where(numeric % 1 == 0)
+    return numeric.astype(GEO_ID_DTYPE)
+
+
+def geo_id_strings(ids: pd.Series, column: str = "buurt_id") -> pd.Series:
+    """
+    Zero-padded string view of integer geographic codes (for display).
+
+    Parameters
+    ----------
+    ids : pd.Series
+        Integer codes
+    column : str
+        Level of the codes ("buurt_id", "wijk_id" or "gemeente_id")
+
+    Returns
+    -------
+    pd.Series
+        Strings such as "01490000" (<NA> where the code is missing)
+    """
+    return ids.astype(GEO_ID_DTYPE).astype("string").str.zfill(GEO_ID_DIGITS[column])
+
+
 def create_geo_ids(survey: pd.DataFrame) -> pd.DataFrame:
     """
     Create standardized geographic codes from Buurtcode.
@@ -34,6 +98,9 @@ def create_geo_ids(survey: pd.DataFrame) -> pd.DataFrame:
     - Wijk (district): first 6 digits
     - Gemeente (municipality): first 4 digits
 
+    Codes are stored as Int32 (see GEO_ID_DIGITS); use geo_id_strings()
+    for the zero-padded form.
+
     Parameters
     ----------
     survey : pd.DataFrame
@@ -48,23 +115,10 @@ def create_geo_ids(survey: pd.DataFrame) -> pd.DataFrame:
 
     df = survey.copy()
 
-    # Ensure Buurtcode is string, pad to 8 digits
-    df["buurt_id"] = (
-        df["Buurtcode"]
-        .astype(str)
-        .str.replace(r"\.0$", "", regex=True)  # Remove decimal if present
-        .str.zfill(8)
-    )
-
-    # Handle missing values
-    df.loc[df["Buurtcode"].isna(), "buurt_id"] = np.nan
-
-    # Create wijk (6 digits) and gemeente (4 digits) codes
-    df["wijk_id"] = df["buurt_id"].str[:6]
-    df["gemeente_id"] = df["buurt_id"].str[:4]
-
-    # Set to NaN where buurt_id is NaN
-    df.loc[df["buurt_id"].isna(), ["wijk_id", "gemeente_id"]] = np.nan
+    # Wijk and gemeente codes are the leading 6 and 4 of the 8 digits
+    df["buurt_id"] = parse_geo_ids(df["Buurtcode"])
+    df["wijk_id"] = df["buurt_id"] // 100
+    df["gemeente_id"] = df["buurt_id"] // 10000
 
     # Report
     n_valid = df["buurt_id"].notna().sum()
@@ -80,6 +134,10 @@ def create_geo_ids(survey: pd.DataFrame) -> pd.DataFrame:
 # Admin Data Preparation
 # =============================================================================
 
+# Region code prefix -> (level, variable prefix)
+ADMIN_LEVELS = {"BU": ("buurt", "b_"), "WK": ("wijk", "w_"), "GM": ("gemeente", "g_")}
+
+
 def prepare_admin_by_level(admin: pd.DataFrame) -> Dict[str, pd.DataFrame]:
     """
     Split admin data into separate DataFrames by geographic level.
@@ -89,6 +147,11 @@ def prepare_admin_by_level(admin: pd.DataFrame) -> Dict[str, pd.DataFrame]:
     - Wijk: w_*
     - Gemeente: g_*
 
+    Rows are classified by code prefix once; the frame of indicators is
+    sorted by level and each level table is a row slice of it (no per-level
+    copies). Level tables are indexed by their integer ID ("region_id") and
+    keep the ID as a column for joining.
+
     Parameters
     ----------
     admin : pd.DataFrame
@@ -101,8 +164,6 @@ def prepare_admin_by_level(admin: pd.DataFrame) -> Dict[str, pd.DataFrame]:
     """
     print("Preparing admin data by geographic level...")
 
-    admin = admin.copy()
-
     # Find the region code column
     region_col = None
     for col in ["region_code", "Codering_3", "WijkenEnBuurten"]:
@@ -113,86 +174,48 @@ def prepare_admin_by_level(admin: pd.DataFrame) -> Dict[str, pd.DataFrame]:
     if region_col is None:
         raise ValueError("Cannot identify region code column in admin data")
 
-    # Create region_type from the code prefix (BU/WK/GM)
-    admin["region_code_clean"] = admin[region_col].astype(str).str.strip()
-    admin["region_type"] = admin["region_code_clean"].str[:2].map({
-        "BU": "Buurt",
-        "WK": "Wijk",
-        "GM": "Gemeente"
-    })
-    admin["region_id"] = admin["region_code_clean"].str[2:].str.strip()
-
-    # Map CBS column names to standard names
-    # Based on actual CBS 84286NED column names (2018+)
-    col_rename = {
-        "AantalInwoners_5": "pop_total",
-        "k_65JaarOfOuder_12": "pop_over_65",
-        "WestersTotaal_17": "pop_west",
-        "NietWestersTotaal_18": "pop_nonwest",
-        "Bevolkingsdichtheid_33": "pop_dens",
-        "GemiddeldeWoningwaarde_35": "avg_home_value",
-        "GemiddeldInkomenPerInkomensontvanger_68": "avg_inc_recip",
-        "GemiddeldInkomenPerInwoner_69": "avg_inc_pers",
-        "k_40PersonenMetLaagsteInkomen_70": "perc_low40_pers",
-        "k_20PersonenMetHoogsteInkomen_71": "perc_high20_pers",
-        "k_40HuishoudensMetLaagsteInkomen_73": "perc_low40_hh",
-        "k_20HuishoudensMetHoogsteInkomen_74": "perc_high20_hh",
-        "HuishoudensMetEenLaagInkomen_75": "perc_low_inc_hh",
-        "HuishoudensTot110VanSociaalMinimum_77": "perc_soc_min_hh",
-    }
-
-    # Rename columns that exist
-    admin = admin.rename(columns={k: v for k, v in col_rename.items() if k in admin.columns})
-
-    # Variables to keep (common indicators)
-    indicator_vars = [
-        "pop_total", "pop_over_65", "pop_west", "pop_nonwest", "pop_dens",
-        "avg_home_value", "avg_inc_recip", "avg_inc_pers",
-        "perc_low40_pers", "perc_high20_pers", "perc_low40_hh", "perc_high20_hh",
-        "perc_low_inc_hh", "perc_soc_min_hh"
-    ]
-
-    # Filter to available indicators
-    available_indicators = [v for v in indicator_vars if v in admin.columns]
+    # Map CBS column names to standard names, keep only the indicators
+    renamed = {k: v for k, v in ADMIN_INDICATORS.items() if k in admin.columns}
+    available_indicators = [v for v in ADMIN_INDICATORS.values()
+                            if v in admin.columns or v in renamed.values()]
+    source_cols = {v: k for k, v in renamed.items()}
     print(f"  Available indicators: {len(available_indicators)}")
 
-    result = {}
-
-    for level, prefix, id_length in [
-        ("Buurt", "b_", 8),
-        ("Wijk", "w_", 6),
-        ("Gemeente", "g_", 4)
-    ]:
-        # Filter to this level
-        level_data = admin[admin["region_type"] == level].copy()
+    # Classify every row once: level code from the BU/WK/GM prefix, integer ID
+    codes = admin[region_col].astype("string").str.strip()
+    level_code = pd.Categorical(codes.str[:2], categories=list(ADMIN_LEVELS)).codes
+    region_id = parse_geo_ids(codes).to_numpy(dtype="int64", na_value=-1)
 
-        if len(level_data) == 0:
-            print(f"  Warning: No {level} data found")
-            result[level.lower()] = pd.DataFrame()
-            continue
+    # First row per (level, ID); unclassified rows and missing IDs dropped
+    keep = (level_code >= 0) & (region_id >= 0)
+    key = level_code.astype("int64") * 10**8 + region_id
+    keep &= ~pd.Series(key).duplicated().to_numpy()
+    rows = np.flatnonzero(keep)
+    rows = rows[np.argsort(level_code[rows], kind="stable")]
 
-        # Create ID column with correct length
-        id_col = f"{level.lower()}_id"
-        level_data[id_col] = level_data["region_id"].str.zfill(id_length)
+    # One gather of the indicator columns, grouped by level
+    indicators = admin[[source_cols.get(var, var) for var in available_indicators]].take(rows)
+    indicators.columns = available_indicators
+    indicators.index = pd.Index(region_id[rows].astype("int32"), name="region_id")
+    bounds = np.searchsorted(level_code[rows], np.arange(len(ADMIN_LEVELS) + 1))
 
-        # Select and rename columns with prefix
-        cols_to_keep = [id_col]
-        rename_dict = {}
+    result = {}
 
-        for var in available_indicators:
-            if var in level_data.columns:
-                new_name = f"{prefix}{var}"
-                rename_dict[var] = new_name
-                cols_to_keep.append(new_name)
+    for k, (level, prefix) in enumerate(ADMIN_LEVELS.values()):
+        id_col = f"{level}_id"
+        level_data = indicators.iloc[bounds[k]:bounds[k + 1]]
 
-        level_data = level_data.rename(columns=rename_dict)
-        level_data = level_data[[id_col] + list(rename_dict.values())]
+        if len(level_data) == 0:
+            print(f"  Warning: No {level.capitalize()} data found")
+            result[level] = pd.DataFrame()
+            continue
 
-        # Drop duplicates
-        level_data = level_data.drop_duplicates(subset=[id_col])
+        # Integer ID column (same coding as create_geo_ids) and prefixed indicators
+        level_data = level_data.add_prefix(prefix)
+        level_data.insert(0, id_col, pd.array(level_data.index, dtype=GEO_ID_DTYPE))
 
-        result[level.lower()] = level_data
-        print(f"  {level}: {len(level_data)} units")
+        result[level] = level_data
+        print(f"  {level.capitalize()}: {len(level_data)} units")
 
     return result
 
@@ -201,7 +224,34 @@ def prepare_admin_by_level(admin: pd.DataFrame) -> Dict[str, pd.DataFrame]:
 # Variable Recoding
 # =============================================================================
 
-def recode_survey_variables(data: pd.DataFrame) -> pd.DataFrame:
+# Survey codes -> labels of the categorical recodes
+EMPLOYMENT_LABELS = {
+    1: "Employed",
+    2: "Self-employed",
+    3: "Unemployed",
+    4: "Student",
+    5: "Retired",
+    6: "Homemaker",
+    7: "Disabled",
+    8: "Other"
+}
+OCCUPATION_LABELS = {
+    1: "Modern professional",
+    2: "Clerical",
+    3: "Senior manager",
+    4: "Technical",
+    5: "Semi-routine manual",
+    6: "Routine manual",
+    7: "Middle manager",
+    8: "Traditional professional"
+}
+
+
+def recode_survey_variables(
+    data: pd.DataFrame,
+    moments: Optional[Dict[str, Tuple[float, float]]] = None,
+    categories: Optional[Dict[str, Sequence[str]]] = None
+) -> pd.DataFrame:
     """
     Recode survey variables and create analysis-ready measures.
 
@@ -215,6 +265,12 @@ def recode_survey_variables(data: pd.DataFrame) -> pd.DataFrame:
     ----------
     data : pd.DataFrame
         Merged survey data
+    moments : dict, optional
+        (mean, sd) of "age_raw" and "educyrs" for the z-scores (default:
+        from ``data``; the out-of-core mode passes whole-population values)
+    categories : dict, optional
+        Categories of "employment_status" and "occupation" (default: the
+        observed labels)
 
     Returns
     -------
@@ -223,7 +279,9 @@ def recode_survey_variables(data: pd.DataFrame) -> pd.DataFrame:
     """
     print("Recoding survey variables...")
 
-    df = data.copy()
+    # Shallow copy: only whole columns are (re)assigned below, so the input's
+    # columns are shared rather than duplicated (copy-on-write)
+    df = data.copy(deep=False)
 
     # -------------------------------------------------------------------------
     # Dependent Variables
@@ -233,7 +291,7 @@ def recode_survey_variables(data: pd.DataFrame) -> pd.DataFrame:
     dv_vars = ["gov_int", "red_inc_diff", "union_pref"]
     for var in dv_vars:
         if var in df.columns:
-            df.loc[df[var] == 8, var] = np.nan
+            df[var] = df[var].mask(df[var] == 8)
 
     # DV_single: Primary DV - redistribution support (red_inc_diff)
     # Scale from 1-7 to 0-100
@@ -261,48 +319,35 @@ def recode_survey_variables(data: pd.DataFrame) -> pd.DataFrame:
         df["sex"] = df["sex"].map({1: "Male", 2: "Female", 3: "Other"})
         df["sex"] = pd.Categorical(df["sex"], categories=["Male", "Female", "Other"])
 
+    moments = moments or {}
+    categories = categories or {}
+
     # Age (from birth year)
     if "birth_year" in df.columns:
         df["age_raw"] = SURVEY_YEAR - df["birth_year"]
         # Standardize
-        df["age"] = (df["age_raw"] - df["age_raw"].mean()) / df["age_raw"].std()
+        mean, sd = moments.get("age_raw", (df["age_raw"].mean(), df["age_raw"].std()))
+        df["age"] = (df["age_raw"] - mean) / sd
         print(f"  Age: mean={df['age_raw'].mean():.1f}, range={df['age_raw'].min():.0f}-{df['age_raw'].max():.0f}")
 
     # Education (standardized years)
     if "educyrs" in df.columns:
-        df["education"] = (df["educyrs"] - df["educyrs"].mean()) / df["educyrs"].std()
+        mean, sd = moments.get("educyrs", (df["educyrs"].mean(), df["educyrs"].std()))
+        df["education"] = (df["educyrs"] - mean) / sd
 
     # -------------------------------------------------------------------------
     # Employment
     # -------------------------------------------------------------------------
 
     if "work_status" in df.columns:
-        employment_map = {
-            1: "Employed",
-            2: "Self-employed",
-            3: "Unemployed",
-            4: "Student",
-            5: "Retired",
-            6: "Homemaker",
-            7: "Disabled",
-            8: "Other"
-        }
-        df["employment_status"] = df["work_status"].map(employment_map)
-        df["employment_status"] = pd.Categorical(df["employment_status"])
+        df["employment_status"] = df["work_status"].map(EMPLOYMENT_LABELS)
+        df["employment_status"] = pd.Categorical(
+            df["employment_status"], categories=categories.get("employment_status"))
 
     if "work_type" in df.columns:
-        occupation_map = {
-            1: "Modern professional",
-            2: "Clerical",
-            3: "Senior manager",
-            4: "Technical",
-            5: "Semi-routine manual",
-            6: "Routine manual",
-            7: "Middle manager",
-            8: "Traditional professional"
-        }
-        df["occupation"] = df["work_type"].map(occupation_map)
-        df["occupation"] = pd.Categorical(df["occupation"])
+        df["occupation"] = df["work_type"].map(OCCUPATION_LABELS)
+        df["occupation"] = pd.Categorical(
+            df["occupation"], categories=categories.get("occupation"))
 
     # -------------------------------------------------------------------------
     # Migration background
@@ -358,9 +403,247 @@ def recode_survey_variables(data: pd.DataFrame) -> pd.DataFrame:
 # Standardization
 # =============================================================================
 
+# Context variable prefix -> ID column of its level (for area-level scaling)
+CONTEXT_PREFIXES = {"b_": "buurt_id", "w_": "wijk_id", "g_": "gemeente_id"}
+
+# Column dtypes that are standardized (float32 indicators are scaled in float64)
+_SCALED_DTYPES = [np.float64, np.float32, np.int64]
+
+
+@dataclass
+class ContextScaler:
+    """
+    Means and SDs of the context variables: z = (x - mean) / sd.
+
+    Fitted once on the analysis data, the parameters can be saved and used
+    to put dashboard queries or a new survey wave on the same scale.
+    Columns whose SD is zero or undefined are not part of the scaler.
+    """
+    means: pd.Series
+    sds: pd.Series
+    weighted: bool = False
+    level: str = "respondent"  # "respondent" or "area"
+
+    @classmethod
+    def fit(
+        cls,
+        data: pd.DataFrame,
+        prefixes: Sequence[str] = tuple(CONTEXT_PREFIXES),
+        weights: Optional[str] = None,
+        level: str = "respondent"
+    ) -> "ContextScaler":
+        """
+        Estimate means and SDs of all numeric ``prefixes`` columns in one pass.
+
+        Parameters
+        ----------
+        data : pd.DataFrame
+            Data with context variables
+        prefixes : sequence of str
+            Variable name prefixes to scale
+        weights : str, optional
+            Weight column (e.g. "weight"); unweighted if None
+        level : str
+            "respondent" (every row counts) or "area" (each buurt, wijk or
+            gemeente counts once, using the first row per ID)
+
+        Returns
+        -------
+        ContextScaler
+        """
+        return ContextMoments(prefixes, weights, level).update(data).scaler()
+
+    @property
+    def columns(self) -> list:
+        return list(self.means.index)
+
+    def transform(self, data: pd.DataFrame) -> pd.DataFrame:
+        """Standardize the scaler's columns present in ``data`` (others untouched)."""
+        cols = [c for c in self.columns if c in data.columns]
+        df = data.copy(deep=False)
+        if not cols:
+            return df
+        X = data[cols].to_numpy(dtype=np.float64, na_value=np.nan)
+        Z = np.asfortranarray((X - self.means[cols].to_numpy()) / self.sds[cols].to_numpy())
+        for j, col in enumerate(cols):
+            df[col] = Z[:, j]
+        return df
+
+    def inverse_transform(self, data: pd.DataFrame) -> pd.DataFrame:
+        """Back to the original units."""
+        cols = [c for c in self.columns if c in data.columns]
+        df = data.copy(deep=False)
+        for col in cols:
+            df[col] = data[col] * self.sds[col] + self.means[col]
+        return df
+
+    def save(self, path: Path):
+        """Write the parameters as JSON."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({
+            "weighted": self.weighted,
+            "level": self.level,
+            "means": self.means.to_dict(),
+            "sds": self.sds.to_dict(),
+        }, indent=2))
+
+    @classmethod
+    def load(cls, path: Path) -> "ContextScaler":
+        """Read parameters written by save()."""
+        params = json.loads(Path(path).read_text())
+        return cls(pd.Series(params["means"], dtype=float),
+                   pd.Series(params["sds"], dtype=float),
+                   weighted=params["weighted"], level=params["level"])
+
+
+class RunningMoments:
+    """
+    Column means and SDs ignoring missing values, accumulated over batches.
+
+    Batches are combined with the pairwise update of Chan et al., so the
+    result is the same (up to rounding) however the rows are split. With unit weights
+    the SD is the sample SD (ddof=1, as pandas' std); with weights the
+    variance is the weighted mean square deviation times n / (n - 1), n
+    being the number of non-missing values.
+
+    Parameters
+    ----------
+    n_columns : int
+        Number of columns
+    """
+
+    def __init__(self, n_columns: int):
+        self.n = np.zeros(n_columns)
+        self.sw = np.zeros(n_columns)
+        self.mean = np.zeros(n_columns)
+        self.m2 = np.zeros(n_columns)
+
+    def update(self, X: np.ndarray, w: Optional[np.ndarray] = None) -> "RunningMoments":
+        """Add a batch of rows (X: rows x columns, w: row weights)."""
+        if w is None:
+            w = np.ones(len(X))
+        valid = ~np.isnan(X) & ~np.isnan(w)[:, None]
+        W = np.where(valid, w[:, None], 0.0)
+        Xv = np.where(valid, X, 0.0)
+        batch = RunningMoments(X.shape[1])
+        batch.n = valid.sum(axis=0).astype(float)
+        batch.sw = W.sum(axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            batch.mean = np.where(batch.sw > 0, (W * Xv).sum(axis=0) / batch.sw, 0.0)
+        batch.m2 = (W * (Xv - batch.mean) ** 2).sum(axis=0)
+        return self.merge(batch)
+
+    def merge(self, other: "RunningMoments") -> "RunningMoments":
+        """Add the rows summarized by ``other`` (in place)."""
+        total = self.sw + other.sw
+        with np.errstate(divide="ignore", invalid="ignore"):
+            delta = other.mean - self.mean
+            mean = self.mean + delta * other.sw / total
+            m2 = self.m2 + other.m2 + delta ** 2 * self.sw * other.sw / total
+        # A column seen for the first time is taken as is (so a single
+        # batch gives exactly the one-pass result)
+        self.mean = np.where(self.sw == 0, other.mean, np.where(other.sw > 0, mean, self.mean))
+        self.m2 = np.where(self.sw == 0, other.m2, np.where(other.sw > 0, m2, self.m2))
+        self.n = self.n + other.n
+        self.sw = total
+        return self
+
+    def means(self) -> np.ndarray:
+        return np.where(self.sw > 0, self.mean, np.nan)
+
+    def sds(self) -> np.ndarray:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.sqrt(self.m2 / self.sw * self.n / (self.n - 1))
+
+
+class ContextMoments:
+    """
+    Moments of the context variables, fed one batch of rows at a time.
+
+    ContextScaler.fit() is one update(); the out-of-core mode updates once
+    per partition. With level="area", batches must not split an area (the
+    first row per ID is used within each batch), which holds for gemeente
+    partitions.
+
+    Parameters
+    ----------
+    prefixes : sequence of str
+        Variable name prefixes to scale
+    weights : str, optional
+        Weight column; unweighted if None
+    level : str
+        "respondent" or "area" (see ContextScaler.fit)
+    """
+
+    def __init__(
+        self,
+        prefixes: Sequence[str] = tuple(CONTEXT_PREFIXES),
+        weights: Optional[str] = None,
+        level: str = "respondent"
+    ):
+        if level not in ("respondent", "area"):
+            raise ValueError(f"Unknown scaling level: {level}")
+        self.prefixes = tuple(prefixes)
+        self.weights = weights
+        self.level = level
+        self.columns: Optional[list] = None
+        self._blocks: Dict[str, tuple] = {}
+
+    def update(self, data: pd.DataFrame) -> "ContextMoments":
+        """Add the rows of ``data``."""
+        if self.columns is None:
+            self.columns = [c for c in data.select_dtypes(include=_SCALED_DTYPES).columns
+                            if c.startswith(self.prefixes)]
+
+        if self.level == "respondent":
+            blocks = [("", self.columns, np.ones(len(data), dtype=bool))]
+        else:
+            blocks = []
+            for prefix in self.prefixes:
+                cols = [c for c in self.columns if c.startswith(prefix)]
+                if cols:
+                    ids = data[CONTEXT_PREFIXES[prefix]]
+                    first = (ids.notna() & ~ids.duplicated()).to_numpy()
+                    blocks.append((prefix, cols, first))
+
+        for name, cols, rows in blocks:
+            if name not in self._blocks:
+                self._blocks[name] = (cols, RunningMoments(len(cols)))
+            X = data[cols].to_numpy(dtype=np.float64, na_value=np.nan)[rows]
+            w = (data[self.weights].to_numpy(dtype=np.float64, na_value=np.nan)[rows]
+                 if self.weights else None)
+            self._blocks[name][1].update(X, w)
+        return self
+
+    def merge(self, other: "ContextMoments") -> "ContextMoments":
+        """Add the rows seen by ``other`` (e.g. another partition's moments)."""
+        if self.columns is None:
+            self.columns = other.columns
+        for name, (cols, moments) in other._blocks.items():
+            if name in self._blocks:
+                self._blocks[name][1].merge(moments)
+            else:
+                self._blocks[name] = (cols, moments)
+        return self
+
+    def scaler(self) -> ContextScaler:
+        """Scaler from the rows seen so far (columns with SD > 0)."""
+        means, sds = {}, {}
+        for cols, moments in self._blocks.values():
+            means.update(zip(cols, moments.means()))
+            sds.update(zip(cols, moments.sds()))
+
+        means, sds = pd.Series(means, dtype=float), pd.Series(sds, dtype=float)
+        keep = sds > 0
+        return ContextScaler(means[keep], sds[keep], weighted=self.weights is not None,
+                             level=self.level)
+
+
 def standardize_context_vars(
     data: pd.DataFrame,
-    prefixes: list = ["b_", "w_", "g_"]
+    prefixes: list = ["b_", "w_", "g_"],
+    scaler: Optional[ContextScaler] = None
 ) -> pd.DataFrame:
     """
     Z-score standardize neighborhood-level context variables.
@@ -371,6 +654,9 @@ def standardize_context_vars(
         Data with neighborhood variables
     prefixes : list
         Variable name prefixes to standardize (default: buurt, wijk, gemeente)
+    scaler : ContextScaler, optional
+        Stored parameters to apply; fitted on ``data`` (respondent level,
+        unweighted) if None
 
     Returns
     -------
@@ -379,22 +665,43 @@ def standardize_context_vars(
     """
     print("Standardizing context variables...")
 
-    df = data.copy()
+    if scaler is None:
+        scaler = ContextScaler.fit(data, prefixes)
+    df = scaler.transform(data)
 
-    standardized_count = 0
-    for col in df.columns:
-        if any(col.startswith(p) for p in prefixes):
-            if df[col].dtype in [np.float64, np.int64, float, int]:
-                mean_val = df[col].mean()
-                std_val = df[col].std()
-                if std_val > 0:
-                    df[col] = (df[col] - mean_val) / std_val
-                    standardized_count += 1
-
-    print(f"  Standardized {standardized_count} context variables")
+    print(f"  Standardized {len(scaler.columns)} context variables")
     return df
 
 
+def fit_context_scaler(
+    merged: pd.DataFrame,
+    weighted: bool = STANDARDIZE_WEIGHTED,
+    level: str = STANDARDIZE_LEVEL
+) -> ContextScaler:
+    """
+    Fit the scaler for the context variables of the merged data.
+
+    Covers the admin indicators and the inequality indices derived from them
+    (create_inequality_indices), i.e. every column standardized in phase 4.
+
+    Parameters
+    ----------
+    merged : pd.DataFrame
+        Survey merged with admin data
+    weighted : bool
+        Weight respondents by the survey weight
+    level : str
+        "respondent" or "area" (see ContextScaler.fit)
+
+    Returns
+    -------
+    ContextScaler
+    """
+    data = merged.assign(**_inequality_columns(merged))
+    weights = "weight" if weighted and "weight" in data.columns else None
+    return ContextScaler.fit(data, tuple(CONTEXT_PREFIXES), weights=weights, level=level)
+
+
 # =============================================================================
 # Inequality Indices
 # =============================================================================
@@ -419,29 +726,36 @@ def create_inequality_indices(data: pd.DataFrame) -> pd.DataFrame:
     """
     print("Creating inequality indices...")
 
-    df = data.copy()
-    indices_created = 0
+    df = data.copy(deep=False)
+    indices = _inequality_columns(df)
+    for col, values in indices.items():
+        df[col] = values
+
+    for prefix in ['b_', 'w_', 'g_']:
+        if f'{prefix}income_ratio' in indices:
+            print(f"  Created {prefix}income_polarization and {prefix}income_ratio")
+
+    print(f"  Created {len(indices)} inequality indices")
+    return df
+
+
+def _inequality_columns(data: pd.DataFrame) -> Dict[str, pd.Series]:
+    """Inequality index columns for every level with low40 and high20 shares."""
+    indices = {}
 
     for prefix in ['b_', 'w_', 'g_']:
         low40_col = f'{prefix}perc_low40_hh'
         high20_col = f'{prefix}perc_high20_hh'
 
-        if low40_col in df.columns and high20_col in df.columns:
+        if low40_col in data.columns and high20_col in data.columns:
             # Income polarization: Higher when both extremes are large
-            pol_col = f'{prefix}income_polarization'
-            df[pol_col] = df[low40_col] + df[high20_col]
-            indices_created += 1
+            indices[f'{prefix}income_polarization'] = data[low40_col] + data[high20_col]
 
             # Income ratio: Higher = more affluent relative to poor
             # Add small constant to avoid division by zero
-            ratio_col = f'{prefix}income_ratio'
-            df[ratio_col] = df[high20_col] / (df[low40_col].abs() + 0.01)
-            indices_created += 1
+            indices[f'{prefix}income_ratio'] = data[high20_col] / (data[low40_col].abs() + 0.01)
 
-            print(f"  Created {pol_col} and {ratio_col}")
-
-    print(f"  Created {indices_created} inequality indices")
-    return df
+    return indices
 
 
 # =============================================================================
@@ -450,83 +764,96 @@ def create_inequality_indices(data: pd.DataFrame) -> pd.DataFrame:
 
 def add_geographic_names_from_admin(
     data: pd.DataFrame,
-    admin_data: pd.DataFrame
+    admin_data: pd.DataFrame,
+    names_dir: Optional[Path] = GEO_NAMES_DIR
 ) -> pd.DataFrame:
     """
     Add geographic names (buurt_name, wijk_name, gemeente_name) to analysis data.
 
+    Names come from the integer-keyed name dictionary (src/geonames.py),
+    built once per CBS vintage and memory-mapped afterwards.
+
     Parameters
     ----------
     data : pd.DataFrame
         Analysis data with buurt_id, wijk_id, gemeente_id
     admin_data : pd.DataFrame
         Raw CBS admin data with WijkenEnBuurten and gemeente_name columns
+    names_dir : Path, optional
+        Directory of stored name dictionaries (None = build in memory)
 
     Returns
     -------
     pd.DataFrame
-        Data with added name columns
+        Data with added name columns (categorical)
     """
+    from .geonames import load_name_dictionary
+
     print("\nAdding geographic names...")
 
-    df = data.copy()
+    df = data.copy(deep=False)
 
     # Check if admin data has required columns
     if 'region_code' not in admin_data.columns and 'Codering_3' not in admin_data.columns:
         print("  Warning: Cannot find region code column in admin data")
         return df
+    if 'WijkenEnBuurten' not in admin_data.columns:
+        return df
 
-    # Use region_code or create it
-    admin = admin_data.copy()
-    if 'region_code' not in admin.columns:
-        for col in ['Codering_3', 'WijkenEnBuurten']:
-            if col in admin.columns:
-                admin['region_code'] = admin[col].astype(str).str.strip()
-                break
-
-    # Create lookups for each level
-    name_col = 'WijkenEnBuurten' if 'WijkenEnBuurten' in admin.columns else None
-    gemeente_name_col = 'gemeente_name' if 'gemeente_name' in admin.columns else None
-
-    # Buurt names
-    if name_col:
-        buurt_rows = admin[admin['region_code'].str.startswith('BU', na=False)].copy()
-        if len(buurt_rows) > 0:
-            buurt_rows['buurt_id'] = buurt_rows['region_code'].str[2:].str.strip()
-            buurt_rows['buurt_name'] = buurt_rows[name_col].str.strip()
-            buurt_lookup = buurt_rows[['buurt_id', 'buurt_name']].drop_duplicates('buurt_id')
-
-            df['buurt_id'] = df['buurt_id'].astype(str).str.strip()
-            df = df.merge(buurt_lookup, on='buurt_id', how='left')
-            n_matched = df['buurt_name'].notna().sum()
-            print(f"  Buurt names: {n_matched}/{len(df)} matched")
-
-    # Wijk names
-    if name_col:
-        wijk_rows = admin[admin['region_code'].str.startswith('WK', na=False)].copy()
-        if len(wijk_rows) > 0:
-            wijk_rows['wijk_id'] = wijk_rows['region_code'].str[2:].str.strip()
-            wijk_rows['wijk_name'] = wijk_rows[name_col].str.strip()
-            wijk_lookup = wijk_rows[['wijk_id', 'wijk_name']].drop_duplicates('wijk_id')
-
-            df['wijk_id'] = df['wijk_id'].astype(str).str.strip()
-            df = df.merge(wijk_lookup, on='wijk_id', how='left')
-            n_matched = df['wijk_name'].notna().sum()
-            print(f"  Wijk names: {n_matched}/{len(df)} matched")
-
-    # Gemeente names (from buurt rows or gemeente rows)
-    if gemeente_name_col and 'gemeente_name' not in df.columns:
-        # Get from buurt rows (they have gemeente_name)
-        if name_col:
-            buurt_rows = admin[admin['region_code'].str.startswith('BU', na=False)].copy()
-            if len(buurt_rows) > 0 and gemeente_name_col in buurt_rows.columns:
-                buurt_rows['gemeente_id'] = buurt_rows['region_code'].str[2:6].str.strip()
-                buurt_rows['gemeente_name'] = buurt_rows[gemeente_name_col].str.strip()
-                gemeente_lookup = buurt_rows[['gemeente_id', 'gemeente_name']].drop_duplicates('gemeente_id')
-
-                df['gemeente_id'] = df['gemeente_id'].astype(str).str.strip()
-                df = df.merge(gemeente_lookup, on='gemeente_id', how='left')
-                n_matched = df['gemeente_name'].notna().sum()
-                print(f"  Gemeente names: {n_matched}/{len(df)} matched")
+    names = load_name_dictionary(admin_data, names_dir)
+
+    for level in ["buurt", "wijk", "gemeente"]:
+        name_col = f"{level}_name"
+        if len(names.levels[level][0]) == 0 or name_col in df.columns:
+            continue
+        df[name_col] = names.lookup(df[f"{level}_id"], level)
+        n_matched = df[name_col].notna().sum()
+        print(f"  {level.capitalize()} names: {n_matched}/{len(df)} matched")
 
     return df
+
+
+# =============================================================================
+# Fused Transform Stage
+# =============================================================================
+
+def transform_analysis_data(
+    merged: pd.DataFrame,
+    admin_data: pd.DataFrame,
+    scaler: Optional[ContextScaler] = None,
+    names_dir: Optional[Path] = GEO_NAMES_DIR,
+    moments: Optional[Dict[str, Tuple[float, float]]] = None,
+    categories: Optional[Dict[str, Sequence[str]]] = None
+) -> pd.DataFrame:
+    """
+    Recode, create inequality indices, add names and standardize in one stage.
+
+    Equivalent to chaining recode_survey_variables, create_inequality_indices,
+    add_geographic_names_from_admin and standardize_context_vars. Each step
+    only adds or replaces whole columns of a shallow copy, so under
+    copy-on-write the merged data is shared, not copied, and peak memory is
+    about one frame plus the new columns.
+
+    Parameters
+    ----------
+    merged : pd.DataFrame
+        Survey merged with admin data (merge_survey_admin)
+    admin_data : pd.DataFrame
+        Raw CBS admin data with names
+    scaler : ContextScaler, optional
+        Standardization parameters (fit_context_scaler); fitted on the data
+        if None
+    names_dir : Path, optional
+        Directory of stored name dictionaries (None = build in memory)
+    moments, categories : dict, optional
+        Whole-population recode parameters (see recode_survey_variables)
+
+    Returns
+    -------
+    pd.DataFrame
+        Analysis-ready data
+    """
+    df = recode_survey_variables(merged, moments, categories)
+    df = create_inequality_indices(df)
+    df = add_geographic_names_from_admin(df, admin_data, names_dir)
+    return standardize_context_vars(df, scaler=scaler)